@@ -0,0 +1,41 @@
+"""Benchmark the commonmark parser against the line based scanner."""
+import glob
+import sys
+import timeit
+
+from src import markdown as md
+
+SAMPLE_GLOB = "resources/sample_md_reflections/**/*.md"
+
+
+def load_documents(pattern: str = SAMPLE_GLOB):
+    """Read the sample reflections into a list of strings."""
+    return [
+        md.read_file(path) for path in glob.glob(pattern, recursive=True)
+    ]
+
+
+def time_parser(parser, documents, number=5, repeat=3) -> float:
+    """Return the best time in seconds to parse all documents once."""
+    timings = timeit.repeat(
+        lambda: [parser(document) for document in documents],
+        number=number,
+        repeat=repeat,
+    )
+    return min(timings) / number
+
+
+def run(pattern: str = SAMPLE_GLOB):
+    """Time both parsers and print the speedup of the scanner."""
+    documents = load_documents(pattern)
+    commonmark_time = time_parser(md.md_parser, documents)
+    scanner_time = time_parser(md.md_scanner, documents)
+    print(f"documents: {len(documents)}")
+    print(f"md_parser:  {commonmark_time * 1000:.2f} ms")
+    print(f"md_scanner: {scanner_time * 1000:.2f} ms")
+    print(f"speedup:    {commonmark_time / scanner_time:.1f}x")
+    return commonmark_time, scanner_time
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
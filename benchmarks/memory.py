@@ -0,0 +1,64 @@
+"""Compare the memory of the default and the compact corpus dataframes."""
+import sys
+
+import pandas as pd
+
+from benchmarks import synthetic as sy
+from src import constants as cts
+from src import session as ss
+from src import utils as ut
+
+
+def synthetic_corpus(json_lst):
+    """Raw and processed dataframes without the spaCy tokenizer."""
+    raw_df = pd.concat(
+        [pd.DataFrame(item) for item in json_lst], ignore_index=True)
+    main_df = raw_df.fillna("")
+    prompts = [column for column in main_df.columns
+               if column not in (cts.ASSIGNMENT, sy.STUDENT)]
+    main_df[cts.COMBINED] = [
+        "\n".join(answers) for answers in main_df[prompts].to_numpy()]
+    main_df[cts.NORMAL] = main_df[cts.COMBINED].str.lower()
+    main_df[cts.TOKEN] = main_df[cts.NORMAL].str.split()
+    return raw_df, main_df
+
+
+def object_df(df):
+    """Dataframe with python object strings, the default before pandas 3."""
+    return df.astype({
+        column: object for column in df.columns if column != cts.TOKEN})
+
+
+def megabytes(frames) -> float:
+    """Deep memory usage of dataframes in MB."""
+    return ss.frame_size(frames) / 2 ** 20
+
+
+def run(documents: int = 100000):
+    """Print the memory of each column with object, default and compact."""
+    # answers drawn from a pool keep the generation fast
+    raw_df, main_df = synthetic_corpus(sy.course_json_lst(
+        int(documents), assignments=20, students=500, pool=1000))
+    modes = {
+        "object": (object_df(raw_df), object_df(main_df)),
+        "default": (raw_df, main_df),
+        "compact": ut.compact_corpus(raw_df, main_df),
+    }
+    print(f"documents: {len(main_df)}, pandas {pd.__version__}")
+    print(f"{'column':<16}" + "".join(f"{mode + ' MB':>14}" for mode in modes))
+    for column in main_df.columns:
+        print(f"{column[:15]:<16}" + "".join(
+            f"{megabytes(frames[1][[column]]):>14.1f}"
+            for frames in modes.values()
+        ))
+    sizes = {mode: megabytes(frames) for mode, frames in modes.items()}
+    print(f"{'corpus':<16}" + "".join(
+        f"{size:>14.1f}" for size in sizes.values()))
+    print(f"compact saving: {1 - sizes['compact'] / sizes['object']:.0%} "
+          f"of object, {1 - sizes['compact'] / sizes['default']:.0%} "
+          "of default")
+    return sizes
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
@@ -0,0 +1,219 @@
+"""Time every stage of the analysis pipeline on synthetic reflections."""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime, timezone
+
+import pandas as pd
+
+try:
+    from importlib import metadata
+except ImportError:  # pragma: no cover
+    # python 3.7
+    import importlib_metadata as metadata
+
+from benchmarks import synthetic as sy
+from src import constants as cts
+from src import markdown as md
+from src import topic_modeling as tm
+from src import utils as ut
+
+SIZES = (100, 1000, 10000, 100000)
+STAGES = (
+    "collect_md",
+    "df_preprocess",
+    "frequency",
+    "sentiment",
+    "sim_pair",
+    "topic_model",
+    "tsne",
+    "make_summary_df",
+)
+PACKAGES = ("pandas", "numpy", "scipy", "spacy", "gensim", "textblob",
+            "scikit-learn")
+
+
+def timed(report: dict, stage: str, documents: int, function, *args):
+    """Run a stage and record its time, or its error."""
+    start = time.perf_counter()
+    try:
+        result = function(*args)
+    except Exception as err:  # pylint: disable=broad-except
+        report[stage] = {
+            "error": f"{type(err).__name__}: {err}",
+            "traceback": traceback.format_exc(),
+        }
+        return None
+    report[stage] = {
+        "seconds": round(time.perf_counter() - start, 6),
+        "documents": documents,
+    }
+    return result
+
+
+def collect_corpus(folders):
+    """Collected reflections of the assignment folders."""
+    return [md.collect_md(folder) for folder in folders]
+
+
+def time_pipeline(folders, documents: int, stages=STAGES) -> dict:
+    """Time the stages on the corpus of the folders.
+
+    The analyses are not run if collecting or preprocessing fails, nor is
+    tsne without a topic model.
+    """
+    report = {}
+    json_lst = timed(report, "collect_md", documents, collect_corpus,
+                     folders)
+    if "error" in report["collect_md"]:
+        return report
+    raw_df = pd.concat(
+        [pd.DataFrame(item) for item in json_lst], ignore_index=True)
+    main_df = raw_df.fillna("")
+    timed(report, "df_preprocess", documents, ut.df_preprocess, main_df)
+    if "error" in report["df_preprocess"]:
+        return report
+    assignments = list(main_df[cts.ASSIGNMENT].unique())
+    if "frequency" in stages:
+        timed(report, "frequency", documents, ut.make_freq_df,
+              assignments, main_df, cts.ASSIGNMENT, 50)
+    if "sentiment" in stages:
+        timed(report, "sentiment", documents, ut.make_senti_df, main_df)
+    if "sim_pair" in stages:
+        timed(report, "sim_pair", documents, lambda: [
+            ut.sim_pair(assignment, main_df, cts.ASSIGNMENT, sy.STUDENT,
+                        "tfidf")
+            for assignment in assignments
+        ])
+    if "topic_model" in stages or "tsne" in stages:
+        topics = timed(
+            report, "topic_model", documents, tm.topic_model,
+            main_df[cts.TOKEN].tolist(), 5, 4, list(main_df[cts.TOKEN_IDS]))
+        if topics is not None and "tsne" in stages:
+            overall_topic_df, lda_model, corpus = topics
+            timed(report, "tsne", documents, tm.tsne,
+                  lda_model, corpus, overall_topic_df, 500, 50)
+    if "make_summary_df" in stages:
+        timed(report, "make_summary_df", documents, lambda: [
+            ut.make_summary_df(assignment, raw_df, cts.ASSIGNMENT)
+            for assignment in assignments
+        ])
+    return report
+
+
+def environment() -> dict:
+    """Python, platform and package versions of the run."""
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": versions,
+    }
+
+
+# pylint: disable=too-many-arguments
+def run(sizes=SIZES, output="benchmark.json", stages=STAGES,
+        assignments=10, seed=0, label=None) -> dict:
+    """Time the pipeline at every size and write a JSON report."""
+    report = {
+        "label": label,
+        "created": datetime.now(timezone.utc).isoformat(),
+        **environment(),
+        "runs": [],
+    }
+    for documents in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            folders = sy.write_corpus(directory, documents, assignments, seed)
+            generated = time.perf_counter() - start
+            stages_report = time_pipeline(folders, documents, stages)
+        report["runs"].append({
+            "documents": documents,
+            "assignments": assignments,
+            "generate_seconds": round(generated, 6),
+            "stages": stages_report,
+        })
+        print(f"{documents} documents:")
+        for stage, result in stages_report.items():
+            if "error" in result:
+                print(f"  {stage:<16} {result['error']}")
+            else:
+                print(f"  {stage:<16} {result['seconds']:>10.3f} s")
+    with open(output, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"report written to {output}")
+    return report
+
+
+def compare(baseline: dict, report: dict):
+    """Print the ratio of the stage times of a report to a baseline."""
+    seconds = {
+        (run["documents"], stage): result["seconds"]
+        for run in baseline["runs"]
+        for stage, result in run["stages"].items()
+        if "seconds" in result
+    }
+    print(f"compared to {baseline.get('label') or baseline['created']}:")
+    for run in report["runs"]:
+        for stage, result in run["stages"].items():
+            before = seconds.get((run["documents"], stage))
+            if before and "seconds" in result:
+                print(f"  {run['documents']:>7} {stage:<16} "
+                      f"{result['seconds'] / before:>6.2f}x")
+
+
+def parse(args):
+    """Parse the sizes, stages and output of the benchmark."""
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in SIZES),
+        help="Comma separated numbers of documents of the corpora",
+    )
+    parser.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help="Comma separated stages to time, collect_md and df_preprocess "
+        "always run",
+    )
+    parser.add_argument(
+        "--assignments", type=int, default=10,
+        help="Number of assignments of a corpus")
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the generated text")
+    parser.add_argument(
+        "--label", default=None,
+        help="Label of the report, e.g. the release")
+    parser.add_argument(
+        "--output", default="benchmark.json", help="Path of the JSON report")
+    parser.add_argument(
+        "--compare", default=None,
+        help="JSON report of an earlier run to compare the times with")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    arguments = parse(sys.argv[1:])
+    current = run(
+        [int(size) for size in arguments.sizes.split(",")],
+        arguments.output,
+        arguments.stages.split(","),
+        arguments.assignments,
+        arguments.seed,
+        arguments.label,
+    )
+    if arguments.compare:
+        with open(arguments.compare, encoding="utf-8") as baseline_file:
+            compare(json.load(baseline_file), current)
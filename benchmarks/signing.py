@@ -0,0 +1,38 @@
+"""Benchmark the per-request overhead of signing Gator API requests."""
+import sys
+import timeit
+
+from src import get_handler as gh
+
+CONFIGS = {
+    "api_key": "api-key",
+    "endpoint": "https://example.execute-api.us-east-2.amazonaws.com/report",
+    "access_key": "access-key",
+    "secret_key": "secret-key",
+}
+
+
+def time_signing(sign, number=2000, repeat=5) -> float:
+    """Return the best time in seconds to sign one request."""
+    timings = timeit.repeat(
+        lambda: sign("lab1", True), number=number, repeat=repeat)
+    return min(timings) / number
+
+
+def run(number: int = 2000):
+    """Time a fresh signature per request against a shared signer."""
+    number = int(number)
+    fresh_time = time_signing(
+        lambda assignment, passbuild: gh.sign_request(
+            assignment, passbuild, **CONFIGS),
+        number,
+    )
+    shared_time = time_signing(gh.Signer(**CONFIGS).sign, number)
+    print(f"sign_request:  {fresh_time * 1e6:.1f} us/request")
+    print(f"shared Signer: {shared_time * 1e6:.1f} us/request")
+    print(f"speedup:       {fresh_time / shared_time:.1f}x")
+    return fresh_time, shared_time
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
@@ -0,0 +1,119 @@
+"""Synthetic reflections of a course, shared by the benchmarks."""
+import os
+import random
+
+from src import constants as cts
+
+STUDENT = "reflection by"
+# headings of the sample reflections in resources/sample_md_reflections
+PROMPTS = [
+    "What was the greatest technical challenge that your team faced and "
+    "how did you overcome it?",
+    "At a high level, what were the most important technical tasks that "
+    "you completed?",
+    "After completing this assignment, what is task that your team wants "
+    "to practice more? Why?",
+    "After completing this assignment, what is one learning experience "
+    "you have valued the most?",
+    "Challenges and Learning Experiences",
+    "Ethical Benefits and Implications",
+    "Team Work",
+]
+WORDS = (
+    "program function class method test coverage commit branch merge "
+    "review debug error exception python java markdown team member design "
+    "bug issue feature string integer array list loop variable output input "
+    "file docker gradle checkstyle compile run build terminal editor vim "
+    "algorithm data structure ethics harm privacy user agent arduino sensor"
+).split()
+SENTIMENT = (
+    "great helpful interesting fun valuable clear easy proud "
+    "difficult frustrating confusing hard tedious annoying wrong"
+).split()
+FILLERS = (
+    "the a to and of in that it was we i our with for this is on when "
+    "how but so then"
+).split()
+
+
+def make_sentence(rng: random.Random) -> str:
+    """Sentence of words with a few frequent ones, like written text."""
+    words = []
+    for _ in range(rng.randint(8, 20)):
+        pool = rng.choices((FILLERS, WORDS, SENTIMENT), (5, 4, 1))[0]
+        # earlier words of a pool are used more often
+        words.append(pool[int(rng.paretovariate(1.2)) % len(pool)])
+    return " ".join(words).capitalize() + "."
+
+
+def make_answer(rng: random.Random) -> str:
+    """Answer of a few sentences to a prompt."""
+    return " ".join(make_sentence(rng) for _ in range(rng.randint(1, 5)))
+
+
+# pylint: disable=too-many-arguments
+def course_json_lst(documents: int, assignments: int = 10, seed: int = 0,
+                    students=None, pool=None):
+    """Reflections of a course, one dictionary per assignment.
+
+    The dictionaries are those of collect_md, every assignment asks a few
+    of the prompts. The student names repeat after students reflections,
+    and with a pool the answers are drawn from that many generated ones,
+    which keeps the generation of large corpora fast.
+    """
+    rng = random.Random(seed)
+    answers = None
+    if pool:
+        answers = [make_answer(rng) for _ in range(pool)]
+    json_lst = []
+    for number in range(assignments):
+        count = documents // assignments + (
+            number < documents % assignments)
+        json_lst.append({
+            cts.ASSIGNMENT: [f"lab{number + 1}"] * count,
+            STUDENT: [
+                f"student{student % (students or count) + 1}"
+                for student in range(count)
+            ],
+            **{
+                prompt: rng.choices(answers, k=count) if answers else
+                [make_answer(rng) for _ in range(count)]
+                for prompt in rng.sample(PROMPTS, 5)
+            },
+        })
+    return json_lst
+
+
+def make_reflection(reflection: dict) -> str:
+    """Markdown reflection, like resources/reflection_template.md."""
+    lines = [
+        "# Assignment", "", reflection[cts.ASSIGNMENT], "",
+        "# Reflection by", "", reflection[STUDENT], "",
+    ]
+    for prompt, answer in reflection.items():
+        if prompt not in (cts.ASSIGNMENT, STUDENT):
+            lines.extend([f"## {prompt}", "", answer, ""])
+    return "\n".join(lines)
+
+
+def write_corpus(directory: str, documents: int, assignments: int = 10,
+                 seed: int = 0):
+    """Write a course of reflections, one folder per assignment.
+
+    Return the folders of the assignments.
+    """
+    folders = []
+    for item in course_json_lst(documents, assignments, seed):
+        names = item[cts.ASSIGNMENT]
+        if not names:
+            continue
+        folder = os.path.join(directory, names[0])
+        os.makedirs(folder, exist_ok=True)
+        folders.append(folder)
+        for position in range(len(names)):
+            reflection = {key: values[position]
+                          for key, values in item.items()}
+            path = os.path.join(folder, f"reflection{position + 1}.md")
+            with open(path, "w", encoding="utf-8") as md_file:
+                md_file.write(make_reflection(reflection))
+    return folders
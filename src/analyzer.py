@@ -4,13 +4,44 @@ from textblob import TextBlob
 import pandas as pd
 import re
 import string
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, Tuple
 import spacy
 from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 
+from . import constants as cts
+from . import hashing as hs
 from . import markdown as md
-
-PARSER = spacy.load("en_core_web_sm")
+from . import model_server as ms
+from . import profiling as pr
+
+# loaded on first use, unless a model server answers the requests
+PARSER = None
+BATCH_SIZE = 64
+
+
+def get_parser():
+    """Return the local spacy model, load it on first use."""
+    global PARSER  # pylint: disable=global-statement
+    if PARSER is None:
+        PARSER = spacy.load(cts.SPACY_MODEL)
+    return PARSER
+
+
+@pr.stage("spacy.lemmas", result_documents=len)
+def text_lemmas(texts: Iterable[str]) -> List[List[Tuple[str, bool]]]:
+    """Lemma and stop word flag of the tokens of each text.
+
+    The texts are sent in one batch to the model server when one is
+    configured, otherwise they are piped through the local model.
+    """
+    texts = list(texts)
+    remote = ms.remote_model()
+    if remote is not None:
+        return remote.lemmas(texts)
+    return [
+        [(word.lemma_, word.is_stop) for word in doc]
+        for doc in get_parser().pipe(texts, batch_size=BATCH_SIZE)
+    ]
 
 
 def normalize(data: str) -> str:
@@ -27,31 +58,53 @@ def normalize(data: str) -> str:
 
 def lemmatized_text(text):
     """Return lemmatized text."""
-    tokens = PARSER(text)
-    tokens = [
-        word.lemma_.strip()
-        for word in tokens if word.lemma_ != "-PRON-"
+    return lemmatized_texts([text])[0]
+
+
+def lemmatized_texts(texts: Iterable[str]) -> List[str]:
+    """Return the lemmatized texts, processed in batches."""
+    return [
+        " ".join(
+            lemma.strip() for lemma, _ in lemmas if lemma != "-PRON-"
+        )
+        for lemmas in text_lemmas(texts)
     ]
-    lem_text = " ".join(tokens)
-    return lem_text
 
 
 def tokenize(normalized_text: str) -> List[str]:
     """Break down text into a list of lemmatized tokens."""
+    return tokenize_texts([normalized_text])[0]
+
+
+def tokenize_texts(normalized_texts: Iterable[str]) -> List[List[str]]:
+    """Break down texts into lists of lemmatized tokens in batches."""
     # remove punctuation
-    normal_text = "".join(
-        c for c in normalized_text if c not in string.punctuation
-    )
-    tokens = PARSER(normal_text)
+    normal_texts = [
+        "".join(c for c in normalized_text if c not in string.punctuation)
+        for normalized_text in normalized_texts
+    ]
     # lemmatize tokens, remove pronoun and stop words
-    tokens = [
-        word.lemma_.strip()
-        for word in tokens
-        if word.lemma_ != "-PRON-"
-        and word.is_stop is False
-        and len(word.lemma_.strip()) > 1
+    return [
+        [
+            lemma.strip()
+            for lemma, is_stop in lemmas
+            if lemma != "-PRON-"
+            and is_stop is False
+            and len(lemma.strip()) > 1
+        ]
+        for lemmas in text_lemmas(normal_texts)
     ]
-    return tokens
+
+
+def preprocess_report(report: Dict[str, str]) -> Dict:
+    """Combine, normalize and tokenize the text of a cleaned report."""
+    # skip the first two items -- assignment and student name
+    processed = dict(report)
+    processed[cts.COMBINED] = "\n".join(
+        str(text) for text in list(report.values())[2:])
+    processed[cts.NORMAL] = normalize(processed[cts.COMBINED])
+    processed[cts.TOKEN] = tokenize(processed[cts.NORMAL])
+    return processed
 
 
 def compute_frequency(
@@ -73,12 +126,28 @@ def dir_frequency(dirname: str, amount=50) -> List[Tuple[str, int]]:
     return compute_frequency(tokenize(normalize(" ".join(md_list))), amount)
 
 
+def stream_tokens(texts: Iterable[str], chunk_size=hs.CHUNK_SIZE) -> \
+        Iterator[List[str]]:
+    """Tokens of every text, tokenized in chunks of a stream of texts."""
+    for chunk in hs.chunks(texts, chunk_size):
+        yield from tokenize_texts([normalize(text) for text in chunk])
+
+
+def hashed_dir_frequency(dirname: str, amount=50,
+                         n_features=hs.N_FEATURES) -> List[Tuple[str, int]]:
+    """Pipeline of dir_frequency in bounded memory, with feature hashing."""
+    stats = hs.HashingStats(n_features).fit(
+        stream_tokens(md.iter_md_text(dirname)))
+    return stats.most_common(amount)
+
+
 def sentence_tokenize(input_text):
     """Tokenize paragraph to a list of sentences."""
     sent_lst = []
-    sent_pipe = PARSER.create_pipe("sentencizer")
-    PARSER.add_pipe(sent_pipe)
-    doc = PARSER(input_text)
+    parser = get_parser()
+    sent_pipe = parser.create_pipe("sentencizer")
+    parser.add_pipe(sent_pipe)
+    doc = parser(input_text)
     for sent in doc.sents:
         sent_lst.append(sent.text)
     return sent_lst
@@ -86,21 +155,18 @@ def sentence_tokenize(input_text):
 
 def part_of_speech(input_text):
     """Part of speech tagging of sentence."""
-    doc = PARSER(input_text)
+    doc = get_parser()(input_text)
     pos_lst = []
     for word in doc:
         pos_lst.append((word.text, word.pos_))
     return pos_lst
 
 
-def compute_tfidf(data: List[str]) -> None:
+def compute_tfidf(data: List[str]):
     """Compute the TFIDF."""
     tfidf_vectorizer = TfidfVectorizer()
     # make data iterable for TFIDF
     tfs = tfidf_vectorizer.fit_transform([" ".join(data)])
-    feature_names = tfidf_vectorizer.get_feature_names()
-    for col in tfs.nonzero()[1]:
-        print(feature_names[col], " - ", tfs[0, col])
     return tfs, tfidf_vectorizer
 
 
@@ -113,26 +179,50 @@ def compute_count_vectorize(data):
 
 def named_entity_recognization(input_text):
     """Named entity within an input string of text."""
-    doc = PARSER(input_text)
     ent_lst = []
-    for entity in doc.ents:
-        print(entity, entity.label_)
-        ent_lst.append((str(entity), entity.label_))
+    for start, end, label in text_entities([input_text])[0]:
+        print(input_text[start:end], label)
+        ent_lst.append((input_text[start:end], label))
     # spacy.displacy.serve(doc, style="ent")
     # display in jupyter notebook
     # displacy.render(about_interest_doc, style='dep', jupyter=True)
     return ent_lst
 
 
+@pr.stage("spacy.entities", result_documents=len)
+def text_entities(texts: Iterable[str]) -> List[List[Tuple[int, int, str]]]:
+    """Start, end and label of the named entities of each text."""
+    texts = list(texts)
+    remote = ms.remote_model()
+    if remote is not None:
+        return remote.entities(texts)
+    return [
+        [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+        for doc in get_parser().pipe(texts, batch_size=BATCH_SIZE)
+    ]
+
+
+def entity_spans(input_text: str) -> Dict:
+    """Named entities of the text in the manual format of displacy."""
+    return {
+        "text": input_text,
+        "ents": [
+            {"start": start, "end": end, "label": label}
+            for start, end, label in text_entities([input_text])[0]
+        ],
+        "title": None,
+    }
+
+
 def get_nlp(input_text):
     """Return the spacy nlp object."""
-    doc = PARSER(input_text)
+    doc = get_parser()(input_text)
     return doc
 
 
 def noun_phrase(input_text):
     """Extract noun phrases of the document in a list."""
-    doc = PARSER(input_text)
+    doc = get_parser()(input_text)
     n_phrase_lst = []
     for chunk in doc.noun_chunks:
         n_phrase_lst.append(str(chunk))
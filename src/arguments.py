@@ -16,19 +16,21 @@ def parse(args):
         "--directory",
         required=False,
         type=str,
-        help="Directory with mardown documents to analyze",
+        help="Directory with mardown documents to analyze \
+(comma separated for batch)",
     )
     parser.add_argument(
         "--function",
         required=False,
         type=str,
-        help="Function to analyze (frequency/summary)",
+        help="Function to analyze (frequency/summary/course/batch/export)",
     )
     parser.add_argument(
         "--assignment",
         required=False,
         type=str,
-        help="The name of assignment to get from AWS",
+        help="The name of assignment to get from AWS \
+(comma separated for course)",
     )
     parser.add_argument(
         "--passBuild",
@@ -37,7 +39,66 @@ def parse(args):
         default="true",
         help="Whether to get only passed build reports",
     )
+    parser.add_argument(
+        "--output",
+        required=False,
+        type=str,
+        default="gatorminer_batch",
+        help="Output directory of the batch analysis, \
+or corpus file of the export",
+    )
+    parser.add_argument(
+        "--jobs",
+        required=False,
+        type=int,
+        default=1,
+        help="Number of worker processes of the batch analysis",
+    )
+    parser.add_argument(
+        "--analyses",
+        required=False,
+        type=str,
+        default="frequency,sentiment,similarity,topics,summary",
+        help="Comma separated analyses of the batch analysis",
+    )
+    parser.add_argument(
+        "--format",
+        required=False,
+        type=str,
+        choices=["parquet", "json"],
+        default=None,
+        help="Output format of the batch analysis \
+(parquet when pyarrow is installed)",
+    )
+    parser.add_argument(
+        "--hashing",
+        required=False,
+        action="store_true",
+        help="Count the frequency with feature hashing in bounded memory",
+    )
+    parser.add_argument(
+        "--profile",
+        required=False,
+        action="store_true",
+        help="Print the time, calls and documents of every stage",
+    )
+    parser.add_argument(
+        "--profile-log",
+        required=False,
+        type=str,
+        default=None,
+        help="JSON lines file to log every timed stage to",
+    )
 
     # parse the arguments and return the finished result
     arguments_finished = parser.parse_args(args)
+    if (arguments_finished.function in ("batch", "export")
+            and not arguments_finished.directory
+            and not arguments_finished.assignment):
+        parser.error(
+            f"--function {arguments_finished.function} needs --directory "
+            "or --assignment")
+    if (arguments_finished.function == "course"
+            and not arguments_finished.assignment):
+        parser.error("--function course needs --assignment")
     return arguments_finished
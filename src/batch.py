@@ -0,0 +1,329 @@
+"""Headless batch analysis of many directories or assignments."""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from . import constants as cts
+from . import get_handler as gh
+from . import json_util as ju
+from . import markdown as md
+from . import profiling as pr
+from . import topic_modeling as tm
+from . import utils as ut
+from . import vocabulary as vb
+
+try:
+    import pyarrow
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+MANIFEST = "batch.json"
+MANIFEST_VERSION = 1
+RAW = "raw"
+CORPUS = "corpus"
+ANALYSES = ("frequency", "sentiment", "similarity", "topics", "summary")
+FORMATS = ("parquet", "json")
+NUM_TOPICS = 5
+NUM_WORDS = 5
+
+
+def default_format() -> str:
+    """Parquet when pyarrow is installed, json lines otherwise."""
+    return "parquet" if pyarrow is not None else "json"
+
+
+def ingest_paths(paths: Sequence[str]) -> List[Dict[str, List]]:
+    """Read markdown directories, course trees, archives and reports."""
+    json_lst = []
+    for path in paths:
+        if md.is_archive(path):
+            json_lst.append(md.collect_md_archive(path))
+        elif ju.is_report_path(path):
+            json_lst.append(list(ju.stream_reports(path)))
+        else:
+            json_lst.extend(md.collect_md_tree(path))
+    return json_lst
+
+
+def ingest_aws(assignments: Sequence[str], passbuild) -> List[List[Dict]]:
+    """Fetch and md parse the reports of assignments from aws."""
+    cache_configs = gh.cache_config()
+    configs = gh.auth_config(offline=cache_configs["offline"])
+    return [
+        ju.clean_report(response)
+        for response in gh.get_requests(
+            assignments, passbuild, **configs, **cache_configs)
+    ]
+
+
+def split_assignments(json_lst) -> List[Tuple[str, pd.DataFrame]]:
+    """Split the documents into one raw dataframe per assignment."""
+    raw_df = pd.concat(
+        [pd.DataFrame(item) for item in json_lst], ignore_index=True)
+    assign_id = raw_df.columns[0]
+    return [
+        (
+            str(assignment),
+            raw_df[raw_df[assign_id] == assignment].dropna(
+                axis="columns", how="all"),
+        )
+        for assignment in raw_df[assign_id].unique()
+    ]
+
+
+def frequency_df(main_df, assign_id, amount=50) -> pd.DataFrame:
+    """Word frequency of the whole assignment."""
+    freq_df = pd.DataFrame(
+        vb.most_common(vb.token_ids(main_df), amount),
+        columns=["word", "freq"],
+    )
+    freq_df.insert(0, assign_id, main_df[assign_id].iloc[0])
+    return freq_df
+
+
+def sentiment_df(main_df, assign_id, stu_id) -> pd.DataFrame:
+    """Polarized words and sentiment of every document."""
+    senti_df = ut.make_senti_df(main_df)
+    return senti_df[
+        [assign_id, stu_id, cts.POSITIVE, cts.NEGATIVE, cts.SENTI]]
+
+
+def similarity_df(main_df, assign_id, stu_id) -> pd.DataFrame:
+    """TF-IDF similarity between the documents of each pair of students.
+
+    An assignment without pairs has no rows but the same columns and
+    dtypes, so that every partition has the same schema.
+    """
+    assignment = main_df[assign_id].iloc[0]
+    if main_df[stu_id].nunique() < 2:
+        return pd.DataFrame({
+            assign_id: pd.Series([], dtype=str),
+            "similarity": pd.Series([], dtype=np.float64),
+            "doc_1": pd.Series([], dtype=str),
+            "doc_2": pd.Series([], dtype=str),
+        })
+    df_sim = ut.sim_pair(assignment, main_df, assign_id, stu_id, "tfidf")
+    df_sim = df_sim.drop(columns="pair")
+    df_sim.insert(0, assign_id, assignment)
+    return df_sim
+
+
+def topics_df(main_df, assign_id, stu_id) -> pd.DataFrame:
+    """Dominant topic of every document."""
+    topic_df, _, _ = tm.topic_model(
+        main_df[cts.TOKEN].tolist(),
+        num_topics=NUM_TOPICS,
+        num_words=NUM_WORDS,
+        token_ids=vb.token_ids(main_df),
+    )
+    topic_df.insert(0, "Student", main_df[stu_id].tolist())
+    topic_df.insert(0, assign_id, main_df[assign_id].tolist())
+    return topic_df
+
+
+def summary_df(raw_df, assign_id) -> pd.DataFrame:
+    """Summary of the answers of every document."""
+    return ut.make_summary_df(
+        raw_df[assign_id].iloc[0], raw_df, assign_id)
+
+
+def partition_path(output, dataset, assignment, file_format) -> str:
+    """Path of the partition of an assignment in a dataset."""
+    extension = cts.JSON_EXT if file_format == "json" else cts.PARQUET_EXT
+    return os.path.join(
+        output, dataset, f"{cts.ASSIGNMENT}={quote(assignment, safe='')}",
+        "part-0" + extension,
+    )
+
+
+def write_frame(frame: pd.DataFrame, path: str, file_format: str):
+    """Write a dataframe as parquet or as json lines."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if file_format == "parquet":
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_json(
+            path, orient="records", lines=True, force_ascii=False)
+
+
+def read_frame(path: str, file_format: str) -> pd.DataFrame:
+    """Read a dataframe written by write_frame."""
+    if file_format == "parquet":
+        frame = pd.read_parquet(path)
+        for column in frame.columns:
+            # parquet lists are read back as numpy arrays
+            if len(frame) and isinstance(frame[column].iloc[0], np.ndarray):
+                frame[column] = frame[column].map(list)
+        return frame
+    return pd.read_json(
+        path, orient="records", lines=True, dtype=False, convert_dates=False)
+
+
+def analyze_assignment(
+        assignment: str, raw_df: pd.DataFrame, output: str,
+        analyses: Sequence[str], file_format: str) -> Dict:
+    """Preprocess and analyze one assignment and write the results."""
+    start = time.perf_counter()
+    raw_df = raw_df.reset_index(drop=True)
+    assign_id, stu_id = raw_df.columns[0], raw_df.columns[1]
+    main_df = raw_df.fillna("")
+    ut.df_preprocess(main_df)
+    results: Dict[str, Callable[[], pd.DataFrame]] = {
+        RAW: lambda: raw_df,
+        # token ids are only valid in the process of the vocabulary
+        CORPUS: lambda: main_df.drop(columns=cts.TOKEN_IDS),
+        "frequency": lambda: frequency_df(main_df, assign_id),
+        "sentiment": lambda: sentiment_df(main_df, assign_id, stu_id),
+        "similarity": lambda: similarity_df(main_df, assign_id, stu_id),
+        "topics": lambda: topics_df(main_df, assign_id, stu_id),
+        "summary": lambda: summary_df(raw_df, assign_id),
+    }
+    for dataset in (RAW, CORPUS) + tuple(analyses):
+        write_frame(
+            results[dataset](),
+            partition_path(output, dataset, assignment, file_format),
+            file_format,
+        )
+    return {
+        "name": assignment,
+        "documents": len(raw_df),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+# pylint: disable=too-many-arguments
+@pr.stage("batch.run", documents=pr.first_count)
+def run_batch(
+        json_lst, output: str, analyses: Sequence[str] = ANALYSES,
+        jobs: int = 1, file_format: str = None, sources: Sequence = ()
+) -> Dict:
+    """Analyze every assignment of the documents with a worker pool.
+
+    Each dataset is written as one partition per assignment, e.g.
+    output/frequency/assignment=lab1/part-0.parquet, and output/batch.json
+    lists the assignments so that the corpus can be loaded again.
+    """
+    file_format = file_format or default_format()
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown output format {file_format}")
+    if file_format == "parquet" and pyarrow is None:
+        raise ImportError("Parquet output needs the pyarrow package.")
+    unknown = set(analyses) - set(ANALYSES)
+    if unknown:
+        raise ValueError(f"Unknown analyses {', '.join(sorted(unknown))}")
+    assignments = split_assignments(json_lst)
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(
+                    analyze_assignment, assignment, raw_df, output,
+                    analyses, file_format,
+                )
+                for assignment, raw_df in assignments
+            ]
+            results = [future.result() for future in futures]
+    else:
+        results = [
+            analyze_assignment(
+                assignment, raw_df, output, analyses, file_format)
+            for assignment, raw_df in assignments
+        ]
+    for result in results:
+        logging.info(
+            "Analyzed %s documents of %s in %.1fs",
+            result["documents"], result["name"], result["seconds"],
+        )
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "created": time.time(),
+        "format": file_format,
+        "sources": list(sources),
+        "analyses": list(analyses),
+        "assignments": results,
+    }
+    os.makedirs(output, exist_ok=True)
+    with open(os.path.join(output, MANIFEST), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def is_batch_output(path: str) -> bool:
+    """Return whether the path is the output directory of a batch run."""
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def load_manifest(path: str) -> Dict:
+    """Read the manifest of a batch output directory."""
+    with open(os.path.join(path, MANIFEST), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def load_dataset(path: str, dataset: str) -> pd.DataFrame:
+    """Read a dataset of every assignment of a batch output directory."""
+    manifest = load_manifest(path)
+    frames = [
+        read_frame(
+            partition_path(path, dataset, item["name"], manifest["format"]),
+            manifest["format"],
+        )
+        for item in manifest["assignments"]
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_analysis(paths: Sequence[str], dataset: str) -> \
+        Optional[pd.DataFrame]:
+    """Read an analysis of batch output directories, None if one lacks it."""
+    if not paths or not all(is_batch_output(path) for path in paths):
+        return None
+    if any(dataset not in load_manifest(path).get("analyses", ())
+           for path in paths):
+        return None
+    return pd.concat(
+        [load_dataset(path, dataset) for path in paths], ignore_index=True)
+
+
+def assignment_rows(frame: pd.DataFrame, assign_id: str,
+                    assignment: str) -> pd.DataFrame:
+    """Rows of an assignment in an analysis, without its unused columns."""
+    rows = frame[frame[assign_id].astype(str) == str(assignment)]
+    return rows.dropna(axis="columns", how="all").reset_index(drop=True)
+
+
+def top_frequency(freq_df: pd.DataFrame, assignments: Sequence[str],
+                  assign_id: str, amount: int) -> pd.DataFrame:
+    """Most frequent words of the assignments, like utils.make_freq_df.
+
+    The frequency analysis keeps the most frequent words in order, so its
+    first rows are the most frequent words for any smaller amount.
+    """
+    frames = [pd.DataFrame(columns=["assignments", "word", "freq"])]
+    for assignment in assignments:
+        rows = assignment_rows(freq_df, assign_id, assignment).head(amount)
+        frames.append(pd.DataFrame({
+            "assignments": assignment,
+            "word": rows["word"].tolist(),
+            "freq": rows["freq"].tolist(),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_corpus(paths: Sequence[str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Load the raw and processed corpus of batch output directories."""
+    raw_df = pd.concat(
+        [load_dataset(path, RAW) for path in paths], ignore_index=True)
+    main_df = pd.concat(
+        [load_dataset(path, CORPUS) for path in paths], ignore_index=True)
+    # same columns as a corpus preprocessed at once
+    main_df = main_df.reindex(
+        columns=list(raw_df.columns) + [cts.COMBINED, cts.NORMAL, cts.TOKEN])
+    main_df[raw_df.columns] = main_df[raw_df.columns].fillna("")
+    vb.add_token_ids(main_df)
+    return raw_df, main_df
@@ -10,12 +10,19 @@ REPORT_KEYS = (REPORT_ASSIGNMENT, REPORT_REFLECTION)
 
 # Extensions
 JSON_EXT = ".json"
+NDJSON_EXT = ".ndjson"
+JSONL_EXT = ".jsonl"
+REPORT_EXTS = (JSON_EXT, NDJSON_EXT, JSONL_EXT)
 PYTHON_EXT = ".py"
 TXT_EXT = ".txt"
 MD_EXT = ".md"
+ARROW_EXT = ".arrow"
+PARQUET_EXT = ".parquet"
+CORPUS_EXTS = (ARROW_EXT, PARQUET_EXT)
 
 # Dataframe
 TOKEN = "tokens"
+TOKEN_IDS = "token_ids"
 NORMAL = "normalized"
 ASSIGNMENT = "assignment"
 SENTI = "sentiment"
@@ -25,8 +32,15 @@ COMBINED = "combined"
 POSITIVE = "Positive words"
 NEGATIVE = "Negative words"
 
+# Models
+SPACY_MODEL = "en_core_web_sm"
+
 # Path
 IMG_DIR = f"resources{os.path.sep}images"
+MANIFEST_FILE = ".gatorminer_manifest"
+INDEX_FILE = ".gatorminer_index"
+INDEX_EXT = ".index"
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gatorminer")
 
 # Style
 HTML_WRAPPER = """<div style="overflow-x: auto; border: 1px solid \
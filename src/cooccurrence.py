@@ -0,0 +1,151 @@
+"""Word co-occurrence network of the reflections."""
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from . import profiling as pr
+from . import vocabulary as vb
+
+# words of a sliding window
+WINDOW = 10
+EDGES = 50
+LAYOUT_ITERATIONS = 100
+# end of a sentence, lines are the ends of the answers and of list items
+SENTENCE_END = re.compile(r"[.!?;]+(?:\s|$)|\n+")
+
+
+def split_sentences(texts: Iterable[str]) -> List[str]:
+    """Non-empty sentences of every text, in order."""
+    return [
+        sentence.strip()
+        for text in texts
+        for sentence in SENTENCE_END.split(str(text))
+        if sentence.strip()
+    ]
+
+
+def context_matrix(local_arrays: Sequence[np.ndarray],
+                   num_terms: int) -> sparse.csr_matrix:
+    """Binary documents by terms matrix, from local ids."""
+    lengths = np.array([len(ids) for ids in local_arrays], dtype=np.int64)
+    rows = np.repeat(np.arange(len(local_arrays), dtype=np.int64), lengths)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32),
+         (rows, vb.concatenate(local_arrays))),
+        shape=(len(local_arrays), num_terms),
+    )
+    matrix.sum_duplicates()
+    # a context counts once per term
+    matrix.data[:] = 1
+    return matrix
+
+
+def window_counts(local_arrays: Sequence[np.ndarray], num_terms: int,
+                  window: int) -> sparse.csr_matrix:
+    """Number of times two terms are less than window tokens apart.
+
+    The window slides over every document, so the pairs are counted at each
+    offset from 1 to window - 1 at once over the whole corpus. Only the
+    pairs of two different terms above the diagonal are kept.
+    """
+    lengths = [len(ids) for ids in local_arrays]
+    all_ids = vb.concatenate(local_arrays).astype(np.int64)
+    documents = np.repeat(np.arange(len(local_arrays)), lengths)
+    counts = sparse.csr_matrix((num_terms, num_terms), dtype=np.float32)
+    for offset in range(1, min(window, len(all_ids))):
+        # the window does not cross the end of a document
+        starts = np.flatnonzero(documents[:-offset] == documents[offset:])
+        first, second = all_ids[starts], all_ids[starts + offset]
+        distinct = first != second
+        counts = counts + sparse.csr_matrix(
+            (np.ones(int(distinct.sum()), dtype=np.float32),
+             (np.minimum(first, second)[distinct],
+              np.maximum(first, second)[distinct])),
+            shape=(num_terms, num_terms),
+        )
+    return counts
+
+
+@pr.stage("cooccurrence.matrix", documents=pr.first_count)
+def cooccurrence_matrix(id_arrays: Sequence[np.ndarray],
+                        window: Optional[int] = WINDOW) -> \
+        Tuple[np.ndarray, sparse.csr_matrix]:
+    """Vocabulary ids and the co-occurrence counts of every pair of terms.
+
+    With a window, the counts are those of a sliding window of that many
+    tokens. Without one, every document is a context, e.g. a reflection or
+    a sentence, and the counts are the number of documents that have both
+    terms: the product of the transposed context matrix and the context
+    matrix. Only the pairs above the diagonal are kept.
+    """
+    words, local_arrays = vb.local_ids(id_arrays)
+    if window is None:
+        contexts = context_matrix(local_arrays, len(words))
+        counts = sparse.triu(contexts.T @ contexts, k=1, format="csr")
+    else:
+        counts = window_counts(local_arrays, len(words), window)
+    counts.eliminate_zeros()
+    return words, counts
+
+
+def top_edges(words: np.ndarray, counts: sparse.csr_matrix,
+              amount: int = EDGES,
+              vocabulary: vb.Vocabulary = vb.VOCABULARY) -> pd.DataFrame:
+    """Most frequent pairs of terms as source, target and weight."""
+    pairs = counts.tocoo()
+    # ties are ordered by the ids of the words
+    order = np.lexsort((pairs.col, pairs.row, -pairs.data))[:amount]
+    return pd.DataFrame({
+        "source": vocabulary.decode(words[pairs.row[order]]),
+        "target": vocabulary.decode(words[pairs.col[order]]),
+        "weight": pairs.data[order].astype(np.int64),
+    })
+
+
+def spring_layout(edges: pd.DataFrame,
+                  iterations: int = LAYOUT_ITERATIONS,
+                  seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Force-directed positions of the terms of the edges.
+
+    Return the terms with their x, y and degree, and the edges with the
+    positions of their ends.
+    """
+    terms = pd.unique(pd.concat([edges["source"], edges["target"]]))
+    position = {term: index for index, term in enumerate(terms)}
+    sources = edges["source"].map(position).to_numpy(dtype=np.int64)
+    targets = edges["target"].map(position).to_numpy(dtype=np.int64)
+    size = len(terms)
+    adjacency = np.zeros((size, size))
+    if len(edges):
+        weights = edges["weight"].to_numpy(dtype=np.float64)
+        adjacency[sources, targets] = weights / weights.max()
+        adjacency[targets, sources] = adjacency[sources, targets]
+    # Fruchterman-Reingold on the few terms of the top edges
+    points = np.random.default_rng(seed).random((size, 2))
+    distance = 1 / np.sqrt(max(size, 1))
+    temperature = 0.1
+    for _ in range(iterations):
+        delta = points[:, np.newaxis, :] - points[np.newaxis, :, :]
+        length = np.linalg.norm(delta, axis=-1).clip(min=0.01)
+        force = distance ** 2 / length ** 2 \
+            - adjacency * length / distance
+        displacement = (delta * force[:, :, np.newaxis]).sum(axis=1)
+        moved = np.linalg.norm(displacement, axis=-1).clip(min=0.01)
+        points += displacement * (
+            np.minimum(moved, temperature) / moved)[:, np.newaxis]
+        temperature -= 0.1 / (iterations + 1)
+    nodes = pd.DataFrame({
+        "term": terms,
+        "x": points[:, 0],
+        "y": points[:, 1],
+        "degree": np.bincount(
+            np.concatenate([sources, targets]), minlength=size),
+    })
+    links = edges.assign(
+        x=points[sources, 0], y=points[sources, 1],
+        x2=points[targets, 0], y2=points[targets, 1],
+    )
+    return nodes, links
@@ -0,0 +1,252 @@
+"""Columnar corpus files that reload a preprocessed corpus quickly."""
+import json
+import os
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import constants as cts
+from . import profiling as pr
+from . import vocabulary as vb
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+
+METADATA_KEY = b"gatorminer"
+CORPUS_VERSION = 1
+# the assignment and student columns are dictionary encoded
+KEY_COLUMNS = 2
+
+
+def require_pyarrow():
+    """Raise an error when pyarrow is not installed."""
+    if pa is None:
+        raise ImportError("Corpus files need the pyarrow package.")
+
+
+def is_corpus_file(path) -> bool:
+    """Return whether the path is an arrow or parquet corpus file."""
+    return (
+        isinstance(path, str)
+        and path.lower().endswith(cts.CORPUS_EXTS)
+        and os.path.isfile(path)
+    )
+
+
+def corpus_path(path: str) -> str:
+    """Path of a corpus file, arrow unless a corpus extension is given."""
+    if path.lower().endswith(cts.CORPUS_EXTS):
+        return path
+    return path + cts.ARROW_EXT
+
+
+def string_array(values: pd.Series) -> "pa.Array":
+    """Arrow string array of a raw column, missing answers are null."""
+    return pa.array(
+        [None if pd.isna(value) else str(value) for value in values],
+        type=pa.string(),
+    )
+
+
+def corpus_table(raw_df: pd.DataFrame, main_df: pd.DataFrame) -> "pa.Table":
+    """Arrow table of the raw answers and the preprocessed text.
+
+    The raw columns keep their missing values so that both dataframes can
+    be rebuilt from one table, the assignment and student columns are
+    dictionary encoded and the tokens are stored as list arrays.
+    """
+    require_pyarrow()
+    arrays = {}
+    for position, name in enumerate(raw_df.columns):
+        array = string_array(raw_df[name])
+        if position < KEY_COLUMNS:
+            array = array.dictionary_encode()
+        arrays[str(name)] = array
+    arrays[cts.COMBINED] = pa.array(
+        main_df[cts.COMBINED].tolist(), type=pa.string())
+    arrays[cts.NORMAL] = pa.array(
+        main_df[cts.NORMAL].tolist(), type=pa.string())
+    arrays[cts.TOKEN] = pa.array(
+        [list(tokens) for tokens in main_df[cts.TOKEN]],
+        type=pa.list_(pa.string()),
+    )
+    metadata = {
+        "version": CORPUS_VERSION,
+        "raw_columns": [str(name) for name in raw_df.columns],
+    }
+    return pa.table(arrays).replace_schema_metadata(
+        {METADATA_KEY: json.dumps(metadata).encode("utf-8")})
+
+
+def write_table(table: "pa.Table", sink):
+    """Write the table to a file path or an output stream as arrow ipc."""
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+@pr.stage("corpus_file.write", documents=lambda _, main_df, *__: len(main_df))
+def write_corpus(raw_df, main_df, path: str) -> str:
+    """Export the corpus to an arrow, or parquet, file and return its path.
+
+    Arrow files are written uncompressed so that they can be memory-mapped.
+    """
+    path = corpus_path(path)
+    table = corpus_table(raw_df, main_df)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.lower().endswith(cts.PARQUET_EXT):
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(path, "wb") as sink:
+            write_table(table, sink)
+    return path
+
+
+def corpus_bytes(raw_df, main_df) -> bytes:
+    """Content of the arrow corpus file, e.g. for a download."""
+    sink = pa.BufferOutputStream()
+    write_table(corpus_table(raw_df, main_df), sink)
+    return sink.getvalue().to_pybytes()
+
+
+def read_table(path: str, memory_map: bool = True) -> "pa.Table":
+    """Read the table of a corpus file, memory-mapped by default."""
+    require_pyarrow()
+    if path.lower().endswith(cts.PARQUET_EXT):
+        return pq.read_table(path, memory_map=memory_map)
+    source = pa.memory_map(path) if memory_map else pa.OSFile(path)
+    return pa.ipc.open_file(source).read_all()
+
+
+def token_ids(column: "pa.ChunkedArray",
+              vocabulary: vb.Vocabulary = vb.VOCABULARY) -> \
+        Tuple[int, List[np.ndarray]]:
+    """Generation of the vocabulary and token ids of a list column.
+
+    Every distinct token is encoded once, and the id arrays are cut from
+    the ids of the dictionary indices of all the tokens.
+    """
+    generation = vocabulary.generation
+    if len(column) == 0:
+        return generation, []
+    array = column.combine_chunks()
+    tokens = array.flatten().dictionary_encode()
+    indices = tokens.indices.to_numpy(zero_copy_only=False)
+    generation, (dictionary_ids,) = vb.encode_current(
+        vocabulary, [tokens.dictionary.to_pylist()])
+    lengths = pc.list_value_length(array).fill_null(0).to_numpy()
+    bounds = np.cumsum(lengths)[:-1]
+    return generation, np.split(dictionary_ids[indices], bounds)
+
+
+def token_lists(column: "pa.ChunkedArray"):
+    """Token lists of a list column, still in the arrow buffers.
+
+    The lists of the rows that a page selects become python lists when it
+    reads them, older pandas without arrow arrays convert them all now.
+    """
+    arrow_array = getattr(pd.arrays, "ArrowExtensionArray", None)
+    if arrow_array is None:  # pragma: no cover
+        return pd.Series(column.to_pylist(), dtype=object)
+    return pd.Series(arrow_array(column))
+
+
+def table_corpus(table: "pa.Table") -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Raw and processed dataframes of a corpus table.
+
+    The tokens stay in the memory-mapped table, only their ids are made.
+    """
+    metadata = json.loads(table.schema.metadata[METADATA_KEY])
+    if metadata["version"] != CORPUS_VERSION:
+        raise ValueError(
+            f"Unsupported corpus file version {metadata['version']}")
+    raw_columns = metadata["raw_columns"]
+    generation, ids = token_ids(table.column(cts.TOKEN))
+    raw_df = pd.DataFrame({
+        name: table.column(name).to_pandas().astype(object)
+        for name in raw_columns
+    })
+    processed = pd.DataFrame(
+        {
+            cts.COMBINED: table.column(cts.COMBINED).to_pandas(),
+            cts.NORMAL: table.column(cts.NORMAL).to_pandas(),
+            cts.TOKEN: token_lists(table.column(cts.TOKEN)),
+            cts.TOKEN_IDS: pd.Series(ids, dtype=object),
+        },
+        index=raw_df.index,
+    )
+    main_df = pd.concat([raw_df.fillna(""), processed], axis=1)
+    if vb.VOCABULARY.generation == generation:
+        # without the generation, ids of a reset vocabulary are encoded again
+        main_df.attrs[vb.GENERATION] = generation
+    return raw_df, main_df
+
+
+@pr.stage("corpus_file.read", result_documents=lambda frames: len(frames[1]))
+def read_corpus(path: str, memory_map: bool = True) -> \
+        Tuple[pd.DataFrame, pd.DataFrame]:
+    """Read the raw and processed dataframes of a corpus file."""
+    return table_corpus(read_table(path, memory_map))
+
+
+def load_corpus(paths: Sequence[str], memory_map: bool = True) -> \
+        Tuple[pd.DataFrame, pd.DataFrame]:
+    """Read and concatenate the corpora of several corpus files."""
+    corpora = [read_corpus(path, memory_map) for path in paths]
+    if len(corpora) == 1:
+        return corpora[0]
+    raw_df = pd.concat([raw for raw, _ in corpora], ignore_index=True)
+    main_df = pd.concat([main for _, main in corpora], ignore_index=True)
+    # same columns as a corpus preprocessed at once
+    main_df = main_df.reindex(columns=list(raw_df.columns) + [
+        cts.COMBINED, cts.NORMAL, cts.TOKEN, cts.TOKEN_IDS])
+    main_df[raw_df.columns] = main_df[raw_df.columns].fillna("")
+    generations = {main.attrs.get(vb.GENERATION) for _, main in corpora}
+    if generations == {vb.VOCABULARY.generation}:
+        # the ids of every file are those of the current vocabulary
+        main_df.attrs[vb.GENERATION] = generations.pop()
+    else:
+        vb.add_token_ids(main_df)
+    return raw_df, main_df
+
+
+def file_signature(paths: Sequence[str]) -> List[Tuple[str, int, int]]:
+    """Path, size and modification time of files, to detect changes."""
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((path, stat.st_size, stat.st_mtime_ns))
+    return signature
+
+
+def is_generated(name: str) -> bool:
+    """Whether a file name is a manifest, index or temporary file."""
+    return name.startswith((cts.MANIFEST_FILE, cts.INDEX_FILE)) or \
+        name.endswith((cts.INDEX_EXT, ".tmp"))
+
+
+def tree_signature(paths: Sequence[str]) -> List[Tuple[str, int, int]]:
+    """Signature of the files of paths, directories included.
+
+    Only the directories are listed and the files stated, nothing is read.
+    The manifests and indexes written next to the documents by earlier
+    versions are left out, so that writing them does not change the
+    signature.
+    """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, directories, names in os.walk(path):
+            directories.sort()
+            files.extend(
+                os.path.join(root, name) for name in sorted(names)
+                if not is_generated(name))
+    return file_signature(files)
@@ -0,0 +1,186 @@
+"""Embedded sqlite index to filter a corpus by assignment and student."""
+import itertools
+import sqlite3
+import threading
+import weakref
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE reflections (
+    position INTEGER PRIMARY KEY,
+    assignment TEXT,
+    student TEXT
+);
+CREATE INDEX reflections_assignment ON reflections (assignment, student);
+CREATE INDEX reflections_student ON reflections (student);
+CREATE TABLE headings (
+    assignment TEXT,
+    position INTEGER,
+    heading TEXT,
+    PRIMARY KEY (assignment, position)
+);
+"""
+# parameters of a query, SQLITE_MAX_VARIABLE_NUMBER of older sqlite builds
+MAX_VARIABLES = 999
+
+
+def key_batches(values: Iterable, size: int = MAX_VARIABLES) -> List[List]:
+    """Assignments or students as strings, in batches of query parameters."""
+    values = [str(value) for value in values]
+    return [values[start:start + size]
+            for start in range(0, len(values), size)]
+
+
+def placeholders(values: Sequence) -> str:
+    """Parameter markers of an IN clause with the values."""
+    return ", ".join("?" * len(values))
+
+
+def heading_rows(raw_df: pd.DataFrame, assign_id) -> Iterable:
+    """Assignment, position and name of the columns each assignment uses."""
+    used = raw_df.notna().groupby(
+        raw_df[assign_id].astype(str).to_numpy()).any()
+    for assignment, row in zip(used.index, used.to_numpy()):
+        for position in np.flatnonzero(row):
+            yield assignment, int(position), str(raw_df.columns[position])
+
+
+class CorpusStore:
+    """Assignment and student of every row of a corpus in sqlite.
+
+    The rows of a selection are found with an index lookup instead of a
+    scan of the whole corpus. The dataframes stay in memory, the selected
+    rows and only the requested columns are taken from a dataframe with
+    the rows of the indexed corpus, e.g. the raw or processed corpus.
+
+    Given the raw corpus, the heading columns that the reflections of each
+    assignment answer are indexed as well, so that a selection of the raw
+    corpus can take the columns of its assignments without scanning their
+    cells. The other frames, e.g. the processed corpus whose missing
+    answers are empty strings, have their own missing values.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, main_df: pd.DataFrame, assign_id, stu_id,
+                 raw_df: pd.DataFrame = None, path: str = ":memory:"):
+        """Index the assignment and student columns of the corpus."""
+        self.assign_id = assign_id
+        self.stu_id = stu_id
+        self.size = len(main_df)
+        # columns that may be missing, the others are always used
+        self._names = [] if raw_df is None else list(raw_df.columns)
+        self.raw_columns = frozenset(self._names)
+        # the headings describe the missing answers of this frame only
+        self._raw_df = None if raw_df is None else weakref.ref(raw_df)
+        # streamlit reruns the script, and jobs run, on other threads
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("DROP TABLE IF EXISTS reflections")
+            self._connection.execute("DROP TABLE IF EXISTS headings")
+            self._connection.executescript(SCHEMA)
+            self._connection.executemany(
+                "INSERT INTO reflections VALUES (?, ?, ?)",
+                zip(
+                    range(self.size),
+                    main_df[assign_id].astype(str),
+                    main_df[stu_id].astype(str),
+                ),
+            )
+            if raw_df is not None:
+                self._connection.executemany(
+                    "INSERT INTO headings VALUES (?, ?, ?)",
+                    heading_rows(raw_df, assign_id),
+                )
+
+    def rows(self, assignments: Optional[Sequence] = None,
+             students: Optional[Sequence] = None) -> np.ndarray:
+        """Positions of the rows of the assignments and students.
+
+        None selects every assignment, or student, an empty sequence none.
+        """
+        filters = []
+        for column, values in (
+                ("assignment", assignments), ("student", students)):
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            # both filters of a query share the parameters
+            filters.append((column, key_batches(values, MAX_VARIABLES // 2)))
+        positions = []
+        with self._lock:
+            # one query per batch of each filter, an empty one selects none
+            for batches in itertools.product(
+                    *(batches for _, batches in filters)):
+                query = "SELECT position FROM reflections"
+                if batches:
+                    query += " WHERE " + " AND ".join(
+                        f"{column} IN ({placeholders(batch)})"
+                        for (column, _), batch in zip(filters, batches))
+                params = [value for batch in batches for value in batch]
+                positions.extend(
+                    position for position, in self._connection.execute(
+                        query, params))
+        return np.unique(np.array(positions, dtype=np.int64))
+
+    # pylint: disable=too-many-arguments
+    def select(self, frame: pd.DataFrame,
+               assignments: Optional[Sequence] = None,
+               students: Optional[Sequence] = None,
+               columns: Optional[Sequence] = None,
+               dropna: bool = False) -> pd.DataFrame:
+        """Rows of the assignments and students, with the given columns.
+
+        With dropna, the columns without any answer in the selected rows
+        are dropped, like utils.return_assignment does. Those of the indexed
+        raw corpus are found with the headings of the assignments.
+        """
+        if len(frame) != self.size:
+            raise ValueError("The dataframe does not match the indexed corpus")
+        if (dropna and students is None and self._raw_df is not None
+                and frame is self._raw_df()):
+            # the indexed headings of the assignments replace the scan
+            used = set(self.headings(assignments))
+            columns = [
+                column
+                for column in (frame.columns if columns is None else columns)
+                if column in used or column not in self.raw_columns
+            ]
+            dropna = False
+        if columns is not None:
+            frame = frame[list(columns)]
+        selected = frame.take(self.rows(assignments, students))
+        if dropna:
+            selected = selected.dropna(axis="columns", how="all")
+        return selected
+
+    def headings(self, assignments: Optional[Sequence] = None) -> List:
+        """Columns of the raw corpus that the assignments use, in order."""
+        query = "SELECT DISTINCT position FROM headings"
+        if assignments is None:
+            batches = [[]]
+        else:
+            if isinstance(assignments, str):
+                assignments = [assignments]
+            batches = key_batches(assignments)
+        positions = set()
+        with self._lock:
+            for batch in batches:
+                where = (f" WHERE assignment IN ({placeholders(batch)})"
+                         if batch else "")
+                positions.update(
+                    position for position, in self._connection.execute(
+                        query + where, batch))
+        return [self._names[position] for position in sorted(positions)]
+
+    def close(self):
+        """Close the database."""
+        self._connection.close()
+
+    def __len__(self) -> int:
+        """Number of indexed rows."""
+        return self.size
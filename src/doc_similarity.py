@@ -2,6 +2,13 @@
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+from . import profiling as pr
+
+# smooth idf of a word in only one of the two documents of a pair
+PAIR_IDF = 1 + np.log(3 / 2)
+# pairs compared between two progress reports
+SIMILARITY_CHUNK = 256
+
 
 def create_pair(key_lst):
     """Create non-repetitive pairs from two lists."""
@@ -31,10 +38,64 @@ def tfidf_cosine_similarity(pair):
     return cosine_similarity
 
 
+def tfidf_pair_similarities(counts) -> np.ndarray:
+    """TF-IDF cosine similarity of every pair of documents.
+
+    counts is the sparse document-term count matrix. Like
+    tfidf_cosine_similarity, the idf is fitted on the two documents of each
+    pair: 1 for the words of both and PAIR_IDF for the others.
+    """
+    counts = counts.tocsr()
+    squared = counts.multiply(counts).tocsr()
+    present = (counts > 0).astype(np.float64)
+    dot = (counts @ counts.T).toarray()
+    total = np.asarray(squared.sum(axis=1)).ravel()
+    # squared counts of each document that the other one shares
+    shared = (squared @ present.T).toarray()
+    # norm of the first document of the pair (row, column)
+    norms = np.sqrt(
+        PAIR_IDF ** 2 * total[:, None] - (PAIR_IDF ** 2 - 1) * shared)
+    denominator = norms * norms.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        similarity = np.where(denominator > 0, dot / denominator, 0.0)
+    return similarity
+
+
 def spacy_doc_similarity(nlp, pair):
     """Compute document similarity with spacy built-in method."""
-    doc_1, doc_2 = pair
-    doc_1 = nlp(doc_1)
-    doc_2 = nlp(doc_2)
-    similarity = doc_1.similarity(doc_2)
-    return similarity
+    return spacy_similarities(nlp, [pair])[0]
+
+
+@pr.stage("spacy.similarity",
+          documents=lambda _, pairs, *__, **___: pr.count(pairs))
+def spacy_similarities(nlp, pairs, on_chunk=None):
+    """Compute the similarity of many pairs with spacy built-in method.
+
+    The nlp is a spacy model or the remote model of the model server, which
+    computes the similarities of a chunk of pairs in one batch. on_chunk is
+    called with the number of compared pairs before every chunk.
+    """
+    pairs = list(pairs)
+    docs = {}
+    similarities = []
+    for start in range(0, len(pairs), SIMILARITY_CHUNK):
+        if on_chunk is not None:
+            on_chunk(start)
+        chunk = pairs[start:start + SIMILARITY_CHUNK]
+        if hasattr(nlp, "similarities"):
+            similarities.extend(nlp.similarities(chunk))
+            continue
+        similarities.extend(local_similarities(nlp, chunk, docs))
+    return similarities
+
+
+def local_similarities(nlp, pairs, docs):
+    """Similarity of the pairs, docs holds the processed documents."""
+    similarities = []
+    for doc_1, doc_2 in pairs:
+        # each document is processed once for all of its pairs
+        for text in (doc_1, doc_2):
+            if text not in docs:
+                docs[text] = nlp(text)
+        similarities.append(docs[doc_1].similarity(docs[doc_2]))
+    return similarities
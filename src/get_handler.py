@@ -1,29 +1,73 @@
 """Send GET request to AWS to retrieve data."""
 import sys
 import os
+import asyncio
+import codecs
 import datetime
+import functools
 import hashlib
 import hmac
 import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from . import arguments
+from . import constants as cts
+from . import json_util as ju
+from . import profiling as pr
 # import arguments
 
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
 # REQUEST VALUES
 METHOD = "GET"
 SERVICE = "execute-api"
 REGION = "us-east-2"
 
+# CONNECTION VALUES
+# (connect, read) timeouts in seconds
+TIMEOUT = (5, 60)
+MAX_WORKERS = 8
+# signers kept for the credentials of the latest requests
+MAX_SIGNERS = 16
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+CHUNK_SIZE = 1 << 16
+
+# CACHE VALUES
+# seconds a cached response is served without asking the endpoint
+CACHE_TTL = 3600
+CACHE_VERSION = 1
+
 
-def auth_config():
-    """Authorization configuration."""
+def auth_config(offline=False):
+    """Authorization configuration.
+
+    Offline replay only reads the cache, so no credentials are required.
+    """
     api_key = os.environ.get("GATOR_API_KEY")
     endpoint = os.environ.get("GATOR_ENDPOINT")
     # Read AWS access key from env. variables or configuration file
     access_key = os.environ.get("AWS_ACCESS_KEY_ID")
     secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
 
+    if offline:
+        return {
+            "api_key": api_key or "",
+            "endpoint": endpoint or "",
+            "access_key": access_key or "",
+            "secret_key": secret_key or "",
+        }
     if access_key is None:
         raise EnvironmentError("No aws access key is given.")
     if secret_key is None:
@@ -41,6 +85,53 @@ def auth_config():
     }
 
 
+def cache_config():
+    """Response cache configuration from env. variables."""
+    return {
+        "cache_dir": os.environ.get("GATOR_CACHE_DIR", cts.CACHE_DIR),
+        "ttl": float(os.environ.get("GATOR_CACHE_TTL", CACHE_TTL)),
+        "offline": os.environ.get("GATOR_OFFLINE", "").lower()
+        in ("1", "true", "yes"),
+    }
+
+
+def cache_path(cache_dir, assignment, passbuild):
+    """Path of the cached response of an assignment."""
+    key = hashlib.sha256(
+        f"{assignment}\n{str(passbuild)}".encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, key + cts.JSON_EXT)
+
+
+def load_cached(path):
+    """Load a cached response entry, None when missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as infile:
+            entry = json.load(infile)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or entry.get("version") != CACHE_VERSION:
+        return None
+    return entry
+
+
+def save_cached(entry, path):
+    """Atomically write a cached response entry.
+
+    Every writer has its own temporary file, so that concurrent fetches of
+    an assignment do not write into the same file.
+    """
+    try:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=directory, suffix=".tmp",
+                delete=False) as outfile:
+            json.dump(entry, outfile)
+        os.replace(outfile.name, path)
+    except OSError as err:
+        print("Could not write the response cache:", err)
+
+
 def sign(key, msg):
     """Key derivation functions from AWS."""
     return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
@@ -55,122 +146,238 @@ def get_signature_key(key, date_stamp, region_name, service_name):
     return k_signing
 
 
+def create_session(
+        pool_size=MAX_WORKERS, retries=RETRIES, backoff_factor=BACKOFF_FACTOR):
+    """Create a session with a connection pool and retry with backoff."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 # pylint: disable=too-many-arguments
-# pylint: disable=too-many-locals
 def get_request(
-        assignment, passbuild, api_key, endpoint, access_key, secret_key):
-    """Create and sign request."""
-    # Create a date for headers and the credential string
-    time = datetime.datetime.utcnow()
-    amzdate = time.strftime("%Y%m%dT%H%M%SZ")
-    # Date w/o time, used in credential scope
-    datestamp = time.strftime("%Y%m%d")
-
-    host, stage, method = endpoint.replace("https://", "").split("/")
-    canonical_uri = "/" + stage + "/" + method
-
-    # query
-    request_parameters = f"assignment={assignment}&passBuild={str(passbuild)}"
-    # Create the canonical query string
-    canonical_querystring = request_parameters
-
-    # Create the canonical headers and signed headers. Header names
-    # must be trimmed and lowercase, and sorted in code point order from
-    # low to high. Note that there is a trailing \n.
-    canonical_headers = (
-        "host:"
-        + host
-        + "\n"
-        + "x-amz-date:"
-        + amzdate
-        + "\n"
-        + "x-api-key:"
-        + api_key
-        + "\n"
-    )
+        assignment, passbuild, api_key, endpoint, access_key, secret_key,
+        session=None, timeout=TIMEOUT, cache_dir=None, ttl=CACHE_TTL,
+        offline=False, signer=None):
+    """Create and sign request.
+
+    A signer can be shared between requests to reuse its signing key.
+    With a cache_dir, responses younger than ttl seconds are served from
+    disk and older ones are revalidated with a conditional request. Offline
+    replay only serves cached responses.
+    """
+    if signer is None:
+        signer = get_signer(api_key, endpoint, access_key, secret_key)
+    if cache_dir is None:
+        if offline:
+            raise Exception("Offline replay needs a response cache")
+        request_url, headers = signer.sign(assignment, passbuild)
+        return send_request(request_url, headers, session, timeout)
+    path = cache_path(cache_dir, assignment, passbuild)
+    entry = load_cached(path)
+    if offline:
+        if entry is None:
+            raise Exception(f"No cached response for {assignment} \
+(passBuild={str(passbuild)}) to replay offline")
+        return entry["body"]
+    if entry is not None and time.time() - entry["fetched"] < ttl:
+        return entry["body"]
+    request_url, headers = signer.sign(assignment, passbuild)
+    if entry is not None:
+        # validators are not signed, the endpoint may ignore them
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    response = fetch_response(request_url, headers, session, timeout)
+    if response.status_code == 304 and entry is not None:
+        entry["fetched"] = time.time()
+        save_cached(entry, path)
+        return entry["body"]
+    result = decode_response(response)
+    save_cached({
+        "version": CACHE_VERSION,
+        "assignment": assignment,
+        "passBuild": str(passbuild),
+        "fetched": time.time(),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "body": result,
+    }, path)
+    return result
+
+
+# pylint: disable=too-many-arguments
+@pr.stage("aws.get_requests", documents=pr.first_count)
+def get_requests(
+        assignments, passbuild, api_key, endpoint, access_key, secret_key,
+        max_workers=MAX_WORKERS, session=None, timeout=TIMEOUT,
+        cache_dir=None, ttl=CACHE_TTL, offline=False):
+    """Fetch several assignments concurrently over one pooled session.
 
+    Return the responses in the order of the given assignments.
+    """
+    if session is None and not offline:
+        session = create_session(pool_size=max_workers)
+    # the signer of the credentials derives the signing key once a day
+    signer = get_signer(api_key, endpoint, access_key, secret_key)
+    workers = max(1, min(max_workers, len(assignments)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            lambda assignment: get_request(
+                assignment, passbuild, api_key, endpoint, access_key,
+                secret_key, session=session, timeout=timeout,
+                cache_dir=cache_dir, ttl=ttl, offline=offline,
+                signer=signer,
+            ),
+            assignments,
+        ))
+
+
+class Signer:
+    """Reusable AWS Signature Version 4 signer for Gator API requests.
+
+    The parts of the canonical request that do not depend on the
+    assignment are built once, and the derived signing key is cached per
+    date, region and service, so one signer can be shared by every request
+    of a batch, also across threads.
+    """
+
+    algorithm = "AWS4-HMAC-SHA256"
     # Create the list of signed headers. This lists the headers
     # in the canonical_headers list, delimited with ";" and in alpha order.
     signed_headers = "host;x-amz-date;x-api-key"
-
     # Create payload hash (hash of the request body content). For GET
     # requests, the payload is an empty string ("").
     payload_hash = hashlib.sha256(("").encode("utf-8")).hexdigest()
 
-    # Combine elements to create canonical request
-    canonical_request = (
-        METHOD
-        + "\n"
-        + canonical_uri
-        + "\n"
-        + canonical_querystring
-        + "\n"
-        + canonical_headers
-        + "\n"
-        + signed_headers
-        + "\n"
-        + payload_hash
-    )
+    # pylint: disable=too-many-arguments
+    def __init__(
+            self, api_key, endpoint, access_key, secret_key,
+            region=REGION, service=SERVICE):
+        """Prepare the request independent parts of the signature."""
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.service = service
+        url = urlsplit(endpoint)
+        self.host = url.netloc
+        self.canonical_uri = url.path
+        self._keys = {}
 
-    # print(canonical_request)
+    def signing_key(self, datestamp) -> bytes:
+        """Return the signing key of a date, derived once per date."""
+        cache_key = (datestamp, self.region, self.service)
+        key = self._keys.get(cache_key)
+        if key is None:
+            key = get_signature_key(
+                self.secret_key, datestamp, self.region, self.service)
+            # the key only changes once a day, drop the keys of past days
+            self._keys = {cache_key: key}
+        return key
 
-    # CREATE THE STRING TO SIGN
-    # Match the algorithm to the hashing algorithm you use, either SHA-1 or
-    # SHA-256 (recommended)
-    algorithm = "AWS4-HMAC-SHA256"
-    credential_scope = (
-        datestamp + "/" + REGION + "/" + SERVICE + "/" + "aws4_request"
-    )
-    string_to_sign = (
-        algorithm
-        + "\n"
-        + amzdate
-        + "\n"
-        + credential_scope
-        + "\n"
-        + hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
-    )
+    def sign(
+            self, assignment, passbuild, request_time=None
+    ) -> Tuple[str, Dict[str, str]]:
+        """Sign the request of an assignment, return the url and headers."""
+        # Create a date for headers and the credential string
+        if request_time is None:
+            request_time = datetime.datetime.utcnow()
+        amzdate = request_time.strftime("%Y%m%dT%H%M%SZ")
+        # Date w/o time, used in credential scope
+        datestamp = amzdate[:8]
 
-    # CALCULATE THE SIGNATURE
-    # Create the signing key using the function defined above.
-    signing_key = get_signature_key(secret_key, datestamp, REGION, SERVICE)
-
-    # Sign the string_to_sign using the signing_key
-    signature = hmac.new(
-        signing_key, (string_to_sign).encode("utf-8"), hashlib.sha256
-    ).hexdigest()
-
-    # ADD SIGNING INFORMATION TO THE REQUEST
-    # The signing information can be either in a query string value or in
-    # a header named Authorization
-    authorization_header = (
-        algorithm
-        + " "
-        + "Credential="
-        + access_key
-        + "/"
-        + credential_scope
-        + ", "
-        + "SignedHeaders="
-        + signed_headers
-        + ", "
-        + "Signature="
-        + signature
-    )
+        # query, which is also the canonical query string
+        request_parameters = (
+            f"assignment={assignment}&passBuild={str(passbuild)}")
+
+        # Create the canonical headers, header names are trimmed, lowercase
+        # and sorted in code point order. Note that there is a trailing \n.
+        # Combine elements to create canonical request
+        canonical_request = (
+            f"{METHOD}\n{self.canonical_uri}\n{request_parameters}\n"
+            f"host:{self.host}\nx-amz-date:{amzdate}\n"
+            f"x-api-key:{self.api_key}\n\n"
+            f"{self.signed_headers}\n{self.payload_hash}"
+        )
+
+        # CREATE THE STRING TO SIGN
+        credential_scope = (
+            f"{datestamp}/{self.region}/{self.service}/aws4_request")
+        string_to_sign = (
+            f"{self.algorithm}\n{amzdate}\n{credential_scope}\n"
+            + hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+        )
+
+        # CALCULATE THE SIGNATURE
+        signature = hmac.new(
+            self.signing_key(datestamp),
+            string_to_sign.encode("utf-8"),
+            hashlib.sha256,
+        ).hexdigest()
+
+        # ADD SIGNING INFORMATION TO THE REQUEST
+        # headers include "host", "x-amz-date", and "Authorization"
+        # The 'host' header is added automatically by the Python 'requests'
+        # library
+        headers = {
+            "x-api-key": self.api_key,
+            "x-amz-date": amzdate,
+            "Authorization": (
+                f"{self.algorithm} "
+                f"Credential={self.access_key}/{credential_scope}, "
+                f"SignedHeaders={self.signed_headers}, "
+                f"Signature={signature}"
+            ),
+        }
+
+        request_url = self.endpoint + "?" + request_parameters
+        return request_url, headers
 
-    # headers include "host", "x-amz-date", and "Authorization"
-    # The 'host' header is added automatically by the Python 'requests' library
-    headers = {
-        "x-api-key": api_key,
-        "x-amz-date": amzdate,
-        "Authorization": authorization_header,
-    }
 
-    request_url = endpoint + "?" + request_parameters
+@functools.lru_cache(maxsize=MAX_SIGNERS)
+def get_signer(api_key, endpoint, access_key, secret_key) -> Signer:
+    """Signer of the credentials, shared by every request of the process."""
+    return Signer(api_key, endpoint, access_key, secret_key)
 
+
+# pylint: disable=too-many-arguments
+def sign_request(
+        assignment, passbuild, api_key, endpoint, access_key, secret_key
+) -> Tuple[str, Dict[str, str]]:
+    """Create and sign request, return the request url and headers."""
+    return get_signer(api_key, endpoint, access_key, secret_key).sign(
+        assignment, passbuild)
+
+
+def send_request(request_url, headers, session=None, timeout=TIMEOUT):
+    """Send a signed request and return the decoded json response."""
+    return decode_response(
+        fetch_response(request_url, headers, session, timeout))
+
+
+def fetch_response(request_url, headers, session=None, timeout=TIMEOUT):
+    """Send a signed request and return the checked response."""
     # SEND THE REQUEST
     try:
-        response = requests.get(request_url, headers=headers)
+        if session is None:
+            response = requests.get(
+                request_url, headers=headers, timeout=timeout)
+        else:
+            response = session.get(
+                request_url, headers=headers, timeout=timeout)
         response.raise_for_status()
     except requests.exceptions.HTTPError as errh:
         print(f"Http Error: {errh}")
@@ -184,15 +391,131 @@ def get_request(
     except requests.exceptions.RequestException as err:
         print("RequestException:", err)
         raise Exception(f"RequestException: {err}") from err
-    if not response.json():
+    return response
+
+
+def decode_response(response):
+    """Decode the json body of a response."""
+    result = response.json()
+    if not result:
         raise Exception("The response is empty, the requested \
 assignment might not be in the database")
-    return response.json()
+    return result
+
+
+# pylint: disable=too-many-arguments
+async def stream_reports_async(
+        session, assignment, passbuild, api_key, endpoint, access_key,
+        secret_key, retries=RETRIES, backoff_factor=BACKOFF_FACTOR,
+        signer=None,
+) -> AsyncIterator[Dict]:
+    """Stream the raw reports of an assignment, decoded as they arrive.
+
+    Failed requests are retried with backoff until the first report of the
+    response body has been yielded.
+    """
+    if signer is None:
+        signer = get_signer(api_key, endpoint, access_key, secret_key)
+    count = 0
+    for attempt in range(retries + 1):
+        request_url, headers = signer.sign(assignment, passbuild)
+        try:
+            async with session.get(request_url, headers=headers) as response:
+                if response.status in RETRY_STATUS and attempt < retries:
+                    await asyncio.sleep(backoff_factor * 2 ** attempt)
+                    continue
+                response.raise_for_status()
+                decoder = codecs.getincrementaldecoder("utf-8")()
+                stream = ju.JsonValueStream()
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    for report in stream.feed(decoder.decode(chunk)):
+                        count += 1
+                        yield report
+                reports = stream.feed(decoder.decode(b"", final=True)) + \
+                    stream.close()
+                for report in reports:
+                    count += 1
+                    yield report
+                break
+        except aiohttp.ClientResponseError as errh:
+            print(f"Http Error: {errh}")
+            raise Exception(f"Http Error: {errh}") from errh
+        except aiohttp.ClientConnectionError as errc:
+            if count or attempt == retries:
+                print("Error Connecting:", errc)
+                raise Exception(f"Connecting Error: {errc}") from errc
+            await asyncio.sleep(backoff_factor * 2 ** attempt)
+        except asyncio.TimeoutError as errt:
+            print("Timeout Error:", errt)
+            raise Exception(f"Timeout Error: {errt}") from errt
+    if not count:
+        raise Exception("The response is empty, the requested \
+assignment might not be in the database")
+
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-locals
+async def report_pipeline(
+        assignments, passbuild, api_key, endpoint, access_key, secret_key,
+        process: Callable = None, max_workers=MAX_WORKERS, timeout=TIMEOUT,
+) -> List[List[Dict]]:
+    """Fetch, clean and process the reports of many assignments at once.
+
+    Each report is md parsed and processed in a worker thread as soon as it
+    is decoded, while the other responses are still streaming. Return the
+    processed reports of every assignment in the given order.
+    """
+    if aiohttp is None:
+        raise ImportError("The asyncio client needs the aiohttp package.")
+    loop = asyncio.get_running_loop()
+    results = {assignment: [] for assignment in assignments}
+    signer = get_signer(api_key, endpoint, access_key, secret_key)
+
+    def handle(report):
+        cleaned = ju.clean_item(report)
+        return process(cleaned) if process is not None else cleaned
+
+    async def fetch(session, executor, assignment):
+        async for report in stream_reports_async(
+                session, assignment, passbuild, api_key, endpoint,
+                access_key, secret_key, signer=signer):
+            results[assignment].append(
+                loop.run_in_executor(executor, handle, report))
+
+    connector = aiohttp.TCPConnector(limit=max_workers)
+    client_timeout = aiohttp.ClientTimeout(
+        sock_connect=timeout[0], sock_read=timeout[1])
+    # one worker keeps the parsing order and the event loop responsive
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        async with aiohttp.ClientSession(
+                connector=connector, timeout=client_timeout) as session:
+            await asyncio.gather(*(
+                fetch(session, executor, assignment)
+                for assignment in results
+            ))
+        return [
+            list(await asyncio.gather(*results[assignment]))
+            for assignment in assignments
+        ]
+
+
+# pylint: disable=too-many-arguments
+@pr.stage("aws.fetch_course", documents=pr.first_count)
+def fetch_course(
+        assignments, passbuild, api_key, endpoint, access_key, secret_key,
+        process: Callable = None, max_workers=MAX_WORKERS):
+    """Run the asyncio report pipeline for a whole course."""
+    return asyncio.run(report_pipeline(
+        assignments, passbuild, api_key, endpoint, access_key, secret_key,
+        process=process, max_workers=max_workers,
+    ))
 
 
 if __name__ == "__main__":
     get_arguments = arguments.parse(sys.argv[1:])
     arg_assignment = get_arguments.assignment
     arg_passbuild = get_arguments.passBuild
-    configs = auth_config()
-    print(json.dumps(get_request(arg_assignment, arg_passbuild, **configs)))
+    cache_configs = cache_config()
+    configs = auth_config(offline=cache_configs["offline"])
+    print(json.dumps(get_request(
+        arg_assignment, arg_passbuild, **configs, **cache_configs)))
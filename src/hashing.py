@@ -0,0 +1,125 @@
+"""Feature hashing statistics of corpora too large for a vocabulary."""
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.utils import murmurhash3_32
+
+N_FEATURES = 2 ** 18
+CHUNK_SIZE = 1000
+# tokens remembered for the reverse lookup of a feature
+NAMES_PER_FEATURE = 3
+
+
+def chunks(items: Iterable, size: int = CHUNK_SIZE) -> Iterator[List]:
+    """Lists of at most size consecutive items."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class HashingStats:
+    """Term and document frequency of token streams in fixed memory.
+
+    Tokens are hashed into n_features buckets instead of being added to a
+    vocabulary, so the counts take the same memory for any corpus. The
+    documents are read in chunks from an iterable, e.g. a generator, and
+    only a few tokens of every bucket are kept to name the features.
+    """
+
+    def __init__(self, n_features: int = N_FEATURES):
+        """Start with empty counts."""
+        self.n_features = n_features
+        self.documents = 0
+        self.term_counts = np.zeros(n_features, dtype=np.int64)
+        self.document_frequency = np.zeros(n_features, dtype=np.int64)
+        self.names: Dict[int, List[str]] = {}
+
+    def feature(self, token: str) -> int:
+        """Bucket of a token, stable across processes."""
+        return murmurhash3_32(token, positive=True) % self.n_features
+
+    def transform(self, documents: Sequence[Sequence[str]]) -> \
+            sparse.csr_matrix:
+        """Sparse documents by features count matrix of a chunk."""
+        return self._count(documents)[0]
+
+    def _count(self, documents: Sequence[Sequence[str]]) -> \
+            Tuple[sparse.csr_matrix, Dict[str, int]]:
+        """Count matrix and features of the distinct tokens of a chunk."""
+        features: Dict[str, int] = {}
+        columns, lengths = [], []
+        for tokens in documents:
+            for token in tokens:
+                column = features.get(token)
+                if column is None:
+                    column = features[token] = self.feature(token)
+                columns.append(column)
+            lengths.append(len(tokens))
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(columns), dtype=np.int64), (rows, columns)),
+            shape=(len(lengths), self.n_features),
+        )
+        matrix.sum_duplicates()
+        return matrix, features
+
+    def update(self, documents: Sequence[Sequence[str]]) -> None:
+        """Add the counts of a chunk of documents."""
+        matrix, features = self._count(documents)
+        self.documents += matrix.shape[0]
+        self.term_counts += np.asarray(matrix.sum(axis=0)).reshape(-1)
+        self.document_frequency += np.bincount(
+            matrix.indices, minlength=self.n_features)
+        for token, column in features.items():
+            names = self.names.setdefault(column, [])
+            if len(names) < NAMES_PER_FEATURE and token not in names:
+                names.append(token)
+
+    def fit(self, documents: Iterable[Sequence[str]],
+            chunk_size: int = CHUNK_SIZE) -> "HashingStats":
+        """Add the counts of a stream of documents, chunk by chunk."""
+        for chunk in chunks(documents, chunk_size):
+            self.update(chunk)
+        return self
+
+    def feature_name(self, column: int) -> str:
+        """Tokens seen in a feature, several if their hashes collide."""
+        return "/".join(self.names.get(column, [f"#{column}"]))
+
+    def idf(self) -> np.ndarray:
+        """Smoothed inverse document frequency, as sklearn computes it."""
+        return np.log(
+            (1 + self.documents) / (1 + self.document_frequency)) + 1
+
+    def tfidf(self, documents: Sequence[Sequence[str]]) -> \
+            sparse.csr_matrix:
+        """L2 normalized TF-IDF matrix of a chunk, with the corpus idf."""
+        matrix = self.transform(documents).astype(np.float64)
+        matrix = matrix.multiply(self.idf()).tocsr()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)))
+        norms[norms == 0] = 1
+        return matrix.multiply(1 / norms).tocsr()
+
+    def top(self, scores: np.ndarray, amount: int) -> \
+            List[Tuple[str, float]]:
+        """Names and scores of the highest scoring features."""
+        columns = np.flatnonzero(scores)
+        # ties are ordered by feature
+        ranked = columns[np.lexsort((columns, -scores[columns]))][:amount]
+        return [
+            (self.feature_name(column), scores[column].item())
+            for column in ranked
+        ]
+
+    def most_common(self, amount: int = 50) -> List[Tuple[str, int]]:
+        """Most frequent features, like Counter.most_common."""
+        return self.top(self.term_counts, amount)
+
+    def top_tfidf(self, amount: int = 50) -> List[Tuple[str, float]]:
+        """Features with the highest corpus term frequency times idf."""
+        return self.top(self.term_counts * self.idf(), amount)
@@ -0,0 +1,134 @@
+"""Background jobs for long running analyses."""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional, Set
+
+MAX_WORKERS = 2
+
+
+class JobCancelled(Exception):
+    """Raised inside a job that has been cancelled."""
+
+
+class Job:
+    """Handle of a background job shared by the sessions waiting on it.
+
+    The job function receives the handle to report its progress and to
+    stop early once it is cancelled.
+    """
+
+    def __init__(self, key: Hashable):
+        """Create the handle of a job that has not started yet."""
+        self.key = key
+        self.progress = 0.0
+        self.message = ""
+        self.future: Optional[Future] = None
+        self.waiters: Set[Hashable] = set()
+        self._cancelled = threading.Event()
+
+    def report(self, progress: float, message: str = ""):
+        """Report the progress between 0 and 1, stop if cancelled."""
+        self.check()
+        self.progress = min(max(progress, 0.0), 1.0)
+        self.message = message
+
+    def check(self):
+        """Raise JobCancelled when the job has been cancelled."""
+        if self._cancelled.is_set():
+            raise JobCancelled(f"Job {self.key} was cancelled")
+
+    def cancel(self):
+        """Cancel the job, a running job stops at its next report."""
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the job has been cancelled."""
+        return self._cancelled.is_set()
+
+    def done(self) -> bool:
+        """Whether the job has finished, failed or been cancelled."""
+        return self.future is not None and self.future.done()
+
+    def result(self, timeout: float = None):
+        """Wait for and return the result of the job."""
+        return self.future.result(timeout)
+
+
+class JobRunner:
+    """Run jobs in worker threads, once for all identical requests."""
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        """Start the worker threads."""
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="gatorminer-job")
+        self._jobs: Dict[Hashable, Job] = {}
+        self._waiting: Dict[Hashable, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+            self, key: Hashable, func: Callable[[Job], object],
+            waiter: Hashable = None) -> Job:
+        """Run func(job) in the background, reuse the identical job.
+
+        The waiter, e.g. a session and its page, stops waiting on the job
+        it waited on before. A job that nobody waits on is cancelled, a
+        finished job is kept until its waiters are released.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.cancelled or (
+                    job.done() and job.future.exception() is not None):
+                job = Job(key)
+                self._jobs[key] = job
+                job.future = self._executor.submit(self._run, job, func)
+            if waiter is not None:
+                previous = self._waiting.get(waiter)
+                if previous is not None and previous is not job:
+                    self._release(previous, waiter)
+                self._waiting[waiter] = job
+                job.waiters.add(waiter)
+            return job
+
+    def _run(self, job: Job, func: Callable[[Job], object]):
+        """Run the job function, forget the job when nobody waits on it."""
+        try:
+            job.check()
+            result = func(job)
+            job.progress = 1.0
+            return result
+        except JobCancelled:
+            logging.info("Cancelled job %s", job.key)
+            raise
+        finally:
+            with self._lock:
+                if not job.waiters and self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+
+    def _release(self, job: Job, waiter: Hashable):
+        """Stop waiting on the job, must hold the lock."""
+        job.waiters.discard(waiter)
+        if not job.waiters:
+            if not job.done():
+                job.cancel()
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+    def release(self, waiter: Hashable):
+        """Stop waiting on the current job of the waiter."""
+        with self._lock:
+            job = self._waiting.pop(waiter, None)
+            if job is not None:
+                self._release(job, waiter)
+
+    def running(self) -> int:
+        """Number of jobs that are queued or running."""
+        with self._lock:
+            return sum(not job.done() for job in self._jobs.values())
+
+
+# shared by all the sessions of the streamlit server
+RUNNER = JobRunner()
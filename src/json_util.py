@@ -1,10 +1,23 @@
 """Json utility functions."""
 import os
 import json
+import re
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
 
 from . import markdown as md
 from . import constants as cts
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# reports turned into a dataframe at once
+REPORT_CHUNK = 1000
+
 
 def get_json_files(dir_path):
     """Get JSON files in a directory."""
@@ -22,12 +35,255 @@ def get_json_files(dir_path):
 
 def clean_report(raw_json_lst):
     """Filter out unwanted key items and updated with md parsing."""
-    clean_json = []
-    for item in raw_json_lst:
-        filtered = {
-            k.lower(): v for k, v in item.items() if k in cts.REPORT_KEYS}
-        md_dict = md.md_parser(filtered[cts.REPORT_REFLECTION.lower()])
-        filtered.update(md_dict)
-        del filtered[cts.REPORT_REFLECTION]
-        clean_json.append(filtered)
-    return clean_json
+    return list(iter_clean_reports(raw_json_lst))
+
+
+def iter_clean_reports(raw_reports: Iterable[Dict], fast=False) -> \
+        Iterator[Dict]:
+    """Lazily filter and md parse reports, one report at a time."""
+    for item in raw_reports:
+        yield clean_item(item, fast)
+
+
+def clean_item(item: Dict, fast=False) -> Dict:
+    """Filter out unwanted key items of one report and md parse it."""
+    filtered = {
+        k.lower(): v for k, v in item.items() if k in cts.REPORT_KEYS}
+    md_dict = md.get_parser(fast)(filtered[cts.REPORT_REFLECTION.lower()])
+    filtered.update(md_dict)
+    del filtered[cts.REPORT_REFLECTION]
+    return filtered
+
+
+def reports_frame(reports: Iterable[Dict],
+                  chunk_size: int = REPORT_CHUNK) -> pd.DataFrame:
+    """Dataframe of a stream of reports, built one chunk at a time.
+
+    Only the reports of one chunk are held as dicts, the others are
+    already in the columns of the dataframes of their chunks.
+    """
+    iterator = iter(reports)
+    frames = []
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        frames.append(pd.DataFrame(chunk))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_json_loads(fast=True) -> Callable:
+    """Return orjson.loads when it is installed and fast is set."""
+    if fast and orjson is not None:
+        return orjson.loads
+    return json.loads
+
+
+def is_report_file(path: str) -> bool:
+    """Check if a path has a json or ndjson report extension."""
+    return str(path).endswith(cts.REPORT_EXTS)
+
+
+def is_report_path(path: str) -> bool:
+    """Check if a path is a report file or a directory of report files."""
+    if os.path.isfile(path):
+        return is_report_file(path)
+    if os.path.isdir(path):
+        names = os.listdir(path)
+        return any(is_report_file(name) for name in names) and not any(
+            md.is_md_file(name) for name in names)
+    return False
+
+
+# next character of interest after a value starts, in a value, in a string
+# and after a number or literal
+NON_SPACE = re.compile(r"\S")
+CONTAINER_MARK = re.compile(r'["\[\]{}]')
+STRING_MARK = re.compile(r'["\\]')
+SCALAR_END = re.compile(r'[\s,\[\]{}"]')
+
+
+class JsonValueStream:
+    """Incremental splitter of a text stream of json values.
+
+    Values may be whitespace separated (NDJSON) or the elements of top level
+    arrays, which are returned one by one; nested arrays are values. The
+    text is scanned once from a saved offset for the end of the current
+    value, which is only decoded once it is complete.
+    """
+
+    def __init__(self, loads: Callable = json.loads):
+        """Start before the first value."""
+        self.loads = loads
+        self.buffer = ""
+        # scan offset, start of the current value and its open brackets
+        self.pos = 0
+        self.start = None
+        self.stack: List[str] = []
+        self.in_string = False
+        # what the open top level array expects next: the first value or
+        # its end, a value, or a separator, None outside of an array
+        self.array: Optional[str] = None
+
+    def feed(self, text: str) -> List:
+        """Add the next text of the stream, return the completed values."""
+        cut = self.pos if self.start is None else self.start
+        self.buffer = self.buffer[cut:] + text
+        self.pos -= cut
+        if self.start is not None:
+            self.start -= cut
+        values = []
+        while self._scan(values):
+            pass
+        return values
+
+    def close(self) -> List:
+        """End the stream, return its last value.
+
+        Raise ValueError when a value or a top level array is incomplete.
+        """
+        values = []
+        if self.start is not None:
+            if self.stack or self.in_string:
+                raise ValueError("Incomplete json value at the end")
+            values.append(self._decode(len(self.buffer)))
+        if self.array is not None:
+            raise ValueError("Unclosed json array at the end")
+        return values
+
+    def _decode(self, end: int):
+        """Decode the current value, which ends at end."""
+        value = self.loads(self.buffer[self.start:end])
+        self.start = None
+        self.pos = end
+        return value
+
+    # pylint: disable=too-many-return-statements,too-many-branches
+    def _scan(self, values: List) -> bool:
+        """Scan to the next mark, False once the buffer needs more text."""
+        buffer = self.buffer
+        if self.in_string:
+            match = STRING_MARK.search(buffer, self.pos)
+            if match is None:
+                self.pos = len(buffer)
+                return False
+            if match.group() == "\\":
+                if match.end() == len(buffer):
+                    # the escaped character is in the next text
+                    self.pos = match.start()
+                    return False
+                self.pos = match.end() + 1
+                return True
+            self.in_string = False
+            self.pos = match.end()
+            if not self.stack:
+                values.append(self._decode(self.pos))
+            return True
+        if self.start is not None and not self.stack:
+            # a number or a literal, which may continue in the next text
+            match = SCALAR_END.search(buffer, self.pos)
+            if match is None:
+                self.pos = len(buffer)
+                return False
+            values.append(self._decode(match.start()))
+            return True
+        if self.start is not None:
+            match = CONTAINER_MARK.search(buffer, self.pos)
+            if match is None:
+                self.pos = len(buffer)
+                return False
+            self.pos = match.end()
+            char = match.group()
+            if char == '"':
+                self.in_string = True
+            elif char in "[{":
+                self.stack.append(char)
+            else:
+                self.stack.pop()
+                if not self.stack:
+                    values.append(self._decode(self.pos))
+            return True
+        match = NON_SPACE.search(buffer, self.pos)
+        if match is None:
+            self.pos = len(buffer)
+            return False
+        self.pos = match.start()
+        char = match.group()
+        if self.array is None and char == "[":
+            self.array = "first"
+        elif self.array == "separator" and char in "],":
+            self.array = "value" if char == "," else None
+        elif self.array == "first" and char == "]":
+            self.array = None
+        elif self.array == "separator":
+            raise json.JSONDecodeError(
+                "Expecting ',' delimiter", buffer, self.pos)
+        elif char in "],":
+            raise json.JSONDecodeError(
+                f"Unexpected {char!r} between json values", buffer, self.pos)
+        else:
+            if self.array is not None:
+                self.array = "separator"
+            self.start = self.pos
+            if char in "[{":
+                self.stack.append(char)
+            elif char == '"':
+                self.in_string = True
+        self.pos += 1
+        return True
+
+
+def iter_json_values(file, chunk_size=1 << 16, loads=json.loads) -> Iterator:
+    """Incrementally decode a stream of json values from a text file.
+
+    Only the values of one chunk are kept in memory at a time.
+    """
+    stream = JsonValueStream(loads)
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            yield from stream.close()
+            return
+        yield from stream.feed(chunk)
+
+
+def iter_json_reports(path: str, fast_json=True, chunk_size=1 << 16) -> \
+        Iterator[Dict]:
+    """Stream the raw reports of a json, json array or ndjson file.
+
+    The reports are decoded with orjson when it is installed and fast_json
+    is set, json files are split into reports incrementally.
+    """
+    loads = get_json_loads(fast_json)
+    if str(path).endswith((cts.NDJSON_EXT, cts.JSONL_EXT)):
+        with open(path, "rb") as file:
+            for line in file:
+                if line.strip():
+                    yield loads(line)
+    else:
+        with open(path, encoding="utf8") as file:
+            yield from iter_json_values(file, chunk_size, loads)
+
+
+def iter_report_files(path: str, fast_json=True) -> Iterator[Dict]:
+    """Stream the raw reports of a report file or a directory of them."""
+    if os.path.isdir(path):
+        with os.scandir(path) as entries:
+            files = sorted(
+                entry.path for entry in entries
+                if entry.is_file() and is_report_file(entry.name)
+            )
+    else:
+        files = [path]
+    for file in files:
+        yield from iter_json_reports(file, fast_json)
+
+
+def stream_reports(path: str, fast_json=True, fast=False) -> Iterator[Dict]:
+    """A generator pipeline from report files to cleaned reports.
+
+    fast_json selects the json decoder and fast the markdown parser.
+    """
+    return iter_clean_reports(iter_report_files(path, fast_json), fast)
@@ -1,11 +1,21 @@
 """Markdown parser."""
 import os
+import re
+import html
+import json
+import fnmatch
+import hashlib
 import logging
+import tarfile
+import tempfile
+import unicodedata
+import zipfile
 from io import StringIO
-from typing import Dict, List
+from typing import Dict, Iterator, List, Set, Tuple
 import commonmark
 import pandas as pd
 from . import constants as cts
+from . import profiling as pr
 
 
 # pylint: disable=logging-fstring-interpolation
@@ -17,6 +27,9 @@ logging.basicConfig(
 )
 
 
+MANIFEST_VERSION = 1
+
+
 def read_file(path: str) -> str:
     """Read file from path."""
     with open(path, encoding="utf8") as input_file:
@@ -26,15 +39,110 @@ def read_file(path: str) -> str:
 
 def get_file_names(directory_name: str) -> List[str]:
     """Uses os library to find all markdown files in given directory."""
-    file_list = []
-    for file in os.listdir(directory_name):
-        filename = os.fsdecode(file)
-        if filename.endswith(cts.MD_EXT) or filename.endswith(cts.TXT_EXT):
-            file_list.append(os.path.join(directory_name, filename))
-        else:
-            continue
+    return [
+        entry.path
+        for entry in scan_md_files(directory_name, recursive=False)
+    ]
+
+
+def scan_md_files(
+        directory: str, include=None, exclude=None, recursive=True
+) -> Iterator[os.DirEntry]:
+    """Walk a directory tree once with os.scandir and yield md files.
+
+    Include and exclude are glob patterns matched against the path relative
+    to the directory with "/" separators, e.g. "lab*/*.md" or "drafts/*".
+    Hidden directories are skipped. Symlinked directories are followed
+    once, so that a link to a parent does not loop.
+    """
+    root_stat = os.stat(directory)
+    visited = {(root_stat.st_dev, root_stat.st_ino)}
+    stack = [(os.fspath(directory), "")]
+    while stack:
+        current, prefix = stack.pop()
+        with os.scandir(current) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        subdirectories = []
+        for entry in entries:
+            relative = prefix + os.fsdecode(entry.name)
+            if entry.is_dir():
+                if (
+                    recursive
+                    and not entry.name.startswith(".")
+                    and not _matches_glob(relative, exclude)
+                    and not _matches_glob(relative + "/", exclude)
+                ):
+                    stat = entry.stat()
+                    if (stat.st_dev, stat.st_ino) in visited:
+                        continue
+                    visited.add((stat.st_dev, stat.st_ino))
+                    subdirectories.append((entry.path, relative + "/"))
+            elif (
+                is_md_file(relative)
+                and (not include or _matches_glob(relative, include))
+                and not _matches_glob(relative, exclude)
+            ):
+                yield entry
+        # keep files in sorted order, depth first
+        stack.extend(reversed(subdirectories))
+
+
+def _matches_glob(path: str, patterns) -> bool:
+    """Check if a relative path matches any of the glob patterns."""
+    return any(fnmatch.fnmatch(path, pattern) for pattern in patterns or ())
+
+
+def is_md_file(filename: str) -> bool:
+    """Check if a file name has a markdown or text extension."""
+    return filename.endswith(cts.MD_EXT) or filename.endswith(cts.TXT_EXT)
+
+
+def is_archive(path: str) -> bool:
+    """Check if a path is a zip or tar archive."""
+    return os.path.isfile(path) and (
+        zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+    )
 
-    return file_list
+
+def iter_archive(path: str) -> Iterator[Tuple[str, bytes]]:
+    """Stream the names and contents of md files in a zip or tar archive.
+
+    Only one member is held in memory at a time and nothing is extracted.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_md_member(info.filename):
+                    with archive.open(info) as member:
+                        yield info.filename, member.read()
+    else:
+        # stream mode reads the (compressed) tar sequentially
+        with tarfile.open(path, mode="r|*") as archive:
+            for info in archive:
+                if info.isfile() and _is_md_member(info.name):
+                    member = archive.extractfile(info)
+                    yield info.name, member.read()
+
+
+def _is_md_member(name: str) -> bool:
+    """Check if an archive member is a md file and not os metadata."""
+    basename = os.path.basename(name)
+    return (
+        is_md_file(basename)
+        and not basename.startswith("._")
+        and not name.startswith("__MACOSX/")
+    )
+
+
+def collect_md_archive(
+        path: str, is_clean=True, fast=False) -> Dict[str, List[str]]:
+    """A pipeline to collect all the md files in an archive to a dict."""
+    parser = get_parser(fast)
+    main_md_dict = None
+    for _, data in iter_archive(path):
+        individual_dict = parser(decode_text(data), is_clean)
+        main_md_dict = merge_dict(main_md_dict, individual_dict, False)
+    return main_md_dict
 
 
 def merge_dict(dict_1, dict_2: Dict[str, str], preserve: bool) -> \
@@ -59,25 +167,190 @@ def merge_dict(dict_1, dict_2: Dict[str, str], preserve: bool) -> \
     return dict_1
 
 
-def collect_md(directory: str, is_clean=True) -> Dict[str, List[str]]:
+def md_documents(md_dict) -> int:
+    """Number of reflections of a collected dictionary."""
+    return len(next(iter(md_dict.values()), [])) if md_dict else 0
+
+
+@pr.stage("markdown.collect_md", result_documents=md_documents)
+def collect_md(
+        directory: str, is_clean=True, fast=False) -> Dict[str, List[str]]:
     """A pipeline to collect all the md files in a directory to a dict."""
     file_names = get_file_names(directory)
+    parser = get_parser(fast)
     main_md_dict = None
     for file in file_names:
-        individual_dict = md_parser(read_file(file), is_clean)
+        individual_dict = parser(read_file(file), is_clean)
         main_md_dict = merge_dict(main_md_dict, individual_dict, False)
     return main_md_dict
 
 
-def collect_md_text(directory: str, is_clean=True) -> List[str]:
+def decode_text(data: bytes) -> str:
+    """Decode file content the same way as read_file."""
+    text = data.decode("utf8")
+    # translate newlines like open() does in text mode
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def load_manifest(path: str) -> Dict:
+    """Load a manifest of parsed files, empty if missing or unreadable."""
+    try:
+        with open(path, encoding="utf8") as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError) as err:
+        logging.info(f"Cannot load manifest {path}: {err}")
+        return {}
+
+
+def default_manifest_path(directory: str) -> str:
+    """Path of the manifest of a directory, in the cache directory.
+
+    The manifest is keyed by the absolute path of the directory, so that
+    nothing is written into the submissions.
+    """
+    digest = hashlib.sha256(
+        os.path.abspath(directory).encode("utf-8")).hexdigest()
+    return os.path.join(cts.CACHE_DIR, "manifests", digest + cts.JSON_EXT)
+
+
+def save_manifest(manifest: Dict, path: str) -> None:
+    """Atomically write a manifest, ignore an unwritable cache directory."""
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                "w", encoding="utf8", dir=directory or None, suffix=".tmp",
+                delete=False) as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(manifest_file.name, path)
+    except OSError as err:
+        logging.warning(f"Cannot save manifest {path}: {err}")
+
+
+# pylint: disable=too-many-arguments
+def update_manifest(
+        directory: str, manifest: Dict, is_clean=True, fast=False,
+        include=None, exclude=None, recursive=False,
+) -> Tuple[Dict, bool]:
+    """Parse only the new or changed files of a directory into a manifest.
+
+    Files are matched by size and mtime first and by content hash second,
+    deleted files are dropped. The files of a manifest written with other
+    options or the other parser are all parsed again. Return the manifest
+    and whether it changed.
+    """
+    if (
+        manifest.get("version") != MANIFEST_VERSION
+        or manifest.get("is_clean") != is_clean
+        or manifest.get("fast") != bool(fast)
+    ):
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "is_clean": is_clean,
+            "fast": bool(fast),
+        }
+    old_files = manifest.get("files", {})
+    parser = get_parser(fast)
+    files = {}
+    changed = False
+    for file_entry in scan_md_files(directory, include, exclude, recursive):
+        file = file_entry.path
+        name = os.path.relpath(file, directory)
+        stat = file_entry.stat()
+        entry = old_files.get(name)
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+        ):
+            files[name] = entry
+            continue
+        with open(file, "rb") as input_file:
+            data = input_file.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if entry is not None and entry["sha256"] == digest:
+            md_dict = entry["md_dict"]
+        else:
+            md_dict = parser(decode_text(data), is_clean)
+        files[name] = {
+            "path": file,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest,
+            "md_dict": md_dict,
+        }
+        changed = True
+    # deleted files
+    changed = changed or files.keys() != old_files.keys()
+    manifest["files"] = files
+    return manifest, changed
+
+
+@pr.stage("markdown.collect_md_incremental",
+          result_documents=md_documents)
+def collect_md_incremental(
+        directory: str, is_clean=True, fast=False, manifest_path=None
+) -> Dict[str, List[str]]:
+    """Collect md files like collect_md, reusing a persisted manifest."""
+    if manifest_path is None:
+        manifest_path = default_manifest_path(directory)
+    manifest, changed = update_manifest(
+        directory, load_manifest(manifest_path), is_clean, fast
+    )
+    if changed:
+        save_manifest(manifest, manifest_path)
+    main_md_dict = None
+    for entry in manifest["files"].values():
+        main_md_dict = merge_dict(main_md_dict, entry["md_dict"], False)
+    return main_md_dict
+
+
+# pylint: disable=too-many-arguments
+@pr.stage("markdown.collect_md_tree", result_documents=lambda items: sum(
+    md_documents(item) for item in items))
+def collect_md_tree(
+        directory: str, is_clean=True, fast=False, include=None,
+        exclude=None, assignment_from_dir=False, manifest_path=None,
+) -> List[Dict[str, List[str]]]:
+    """Collect a course tree of md files to one dict per assignment folder.
+
+    The tree is traversed once and only new or changed files are parsed.
+    With assignment_from_dir the folder name is used as assignment name.
+    """
+    if manifest_path is None:
+        manifest_path = default_manifest_path(directory)
+    manifest, changed = update_manifest(
+        directory, load_manifest(manifest_path), is_clean, fast,
+        include, exclude, recursive=True,
+    )
+    if changed:
+        save_manifest(manifest, manifest_path)
+    folders = {}
+    for name, entry in manifest["files"].items():
+        folder = os.path.dirname(name)
+        md_dict = entry["md_dict"]
+        if assignment_from_dir:
+            assignment = os.path.basename(
+                folder or os.path.abspath(directory))
+            md_dict = {cts.ASSIGNMENT: assignment, **{
+                k: v for k, v in md_dict.items() if k != cts.ASSIGNMENT}}
+        folders[folder] = merge_dict(folders.get(folder), md_dict, False)
+    return list(folders.values())
+
+
+def iter_md_text(directory: str, is_clean=True, fast=False) -> \
+        Iterator[str]:
+    """Text of the md files of a directory, parsed one at a time."""
+    parser = get_parser(fast)
+    for file in get_file_names(directory):
+        individual_dict = parser(read_file(file), is_clean)
+        yield " ".join(individual_dict.values())
+
+
+def collect_md_text(directory: str, is_clean=True, fast=False) -> List[str]:
     """A pipeline to collect all md files in a directory to a list of text."""
-    file_names = get_file_names(directory)
-    main_md_list = []
-    for file in file_names:
-        individual_dict = md_parser(read_file(file), is_clean)
-        md_text = " ".join(individual_dict.values())
-        main_md_list.append(md_text)
-    return main_md_list
+    return list(iter_md_text(directory, is_clean, fast))
 
 
 def md_parser(input_md: str, is_clean=True) -> Dict[str, str]:
@@ -105,12 +378,491 @@ def md_parser(input_md: str, is_clean=True) -> Dict[str, str]:
     return md_dict
 
 
-def import_uploaded_files(paths: List) -> Dict[str, List[str]]:
+# patterns for the line based scanner, following the CommonMark spec
+LINE_RE = re.compile(r"\r\n|\n|\r")
+ATX_RE = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*))?$")
+FENCE_RE = re.compile(r"^( {0,3})(`{3,}|~{3,})(.*)$")
+FENCE_CLOSE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})[ \t]*$")
+SETEXT_RE = re.compile(r"^ {0,3}(?:=+|-+)[ \t]*$")
+THEMATIC_RE = re.compile(
+    r"^ {0,3}(?:(?:\*[ \t]*){3,}|(?:_[ \t]*){3,}|(?:-[ \t]*){3,})$"
+)
+LIST_RE = re.compile(r"^ {0,3}(?:([*+-])|(\d{1,9})[.)])(?:[ \t]+|$)")
+QUOTE_RE = re.compile(r"^ {0,3}> ?")
+HTML_BLOCK_RE = [
+    (re.compile(r"^ {0,3}<(?:script|pre|style)(?:\s|>|$)", re.I),
+     re.compile(r"</(?:script|pre|style)>", re.I)),
+    (re.compile(r"^ {0,3}<!--"), re.compile(r"-->")),
+    (re.compile(r"^ {0,3}<[?]"), re.compile(r"\?>")),
+    (re.compile(r"^ {0,3}<![A-Z]"), re.compile(r">")),
+    (re.compile(r"^ {0,3}<!\[CDATA\["), re.compile(r"\]\]>")),
+    (re.compile(
+        r"^ {0,3}</?(?:address|article|aside|base|basefont|blockquote|body|"
+        r"caption|center|col|colgroup|dd|details|dialog|dir|div|dl|dt|"
+        r"fieldset|figcaption|figure|footer|form|frame|frameset|h[1-6]|head|"
+        r"header|hr|html|iframe|legend|li|link|main|menu|menuitem|nav|"
+        r"noframes|ol|optgroup|option|p|param|section|source|summary|table|"
+        r"tbody|td|tfoot|th|thead|title|tr|track|ul)(?:\s|/?>|$)", re.I),
+     None),
+]
+TAG_NAME = r"[A-Za-z][A-Za-z0-9-]*"
+ATTRIBUTE = (
+    r"(?:\s+[a-zA-Z_:][a-zA-Z0-9:._-]*"
+    r"(?:\s*=\s*(?:[^\"'=<>`\x00-\x20]+|'[^']*'|\"[^\"]*\"))?)"
+)
+OPEN_TAG = rf"<{TAG_NAME}{ATTRIBUTE}*\s*/?>"
+CLOSE_TAG = rf"</{TAG_NAME}\s*>"
+HTML_LINE_RE = re.compile(rf"^ {{0,3}}(?:{OPEN_TAG}|{CLOSE_TAG})\s*$")
+HTML_TAG_RE = re.compile(
+    rf"{OPEN_TAG}|{CLOSE_TAG}|<!---->|<!--(?:-?[^>-])(?:-?[^-])*-->"
+    r"|<[?].*?[?]>|<![A-Z]+\s+[^>]*>|<!\[CDATA\[[\s\S]*?\]\]>",
+    re.I,
+)
+AUTOLINK_RE = re.compile(
+    r"<([A-Za-z][A-Za-z0-9.+-]{1,31}:[^<>\x00-\x20]*)>"
+    r"|<([a-zA-Z0-9.!#$%&'*+/=?^_`{|}~-]+@[a-zA-Z0-9]"
+    r"(?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?"
+    r"(?:\.[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)*)>"
+)
+ENTITY_RE = re.compile(
+    r"&(?:#x[a-f0-9]{1,6}|#[0-9]{1,7}|[a-z][a-z0-9]{1,31});", re.I
+)
+INLINE_LINK_RE = re.compile(
+    r"\(\s*(?:<(?:[^<>\n\\\x00]|\\.)*>|(?:[^\s()\\]|\\.|"
+    r"\((?:[^\s()\\]|\\.)*\))*)"
+    r"(?:\s+(?:\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'"
+    r"|\((?:\\.|[^()\\])*\)))?\s*\)"
+)
+REF_DEF_RE = re.compile(
+    r"^\[((?:[^\[\]\\]|\\.){1,999})\]:[ \t]*\n?[ \t]*"
+    r"(?:<(?:[^<>\n\\]|\\.)*>|\S+)"
+    r"(?:(?:[ \t]+|[ \t]*\n[ \t]*)(?:\"(?:\\.|[^\"\\])*\""
+    r"|'(?:\\.|[^'\\])*'|\((?:\\.|[^()\\])*\)))?[ \t]*(?:\n|$)"
+)
+LABEL_RE = re.compile(r"\[((?:[^\[\]\\]|\\.){0,999})\]")
+TEXT_RE = re.compile(r"[^\n`\[\]\\!<&*_'\"]+")
+TICKS_RE = re.compile(r"`+")
+BLOCK_START = "#`~*+-_=<0123456789"
+ESCAPABLE = "!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~"
+
+
+def _indent(line: str) -> int:
+    """Return the width of the leading whitespace of a line."""
+    stripped = line.lstrip(" \t")
+    return len(line[:len(line) - len(stripped)].expandtabs(4))
+
+
+def _normalize_label(label: str) -> str:
+    """Normalize a link label for reference lookups."""
+    return " ".join(label.split()).lower()
+
+
+def _scan_blocks(input_md: str) -> Tuple[List[Tuple[str, str]], Set[str]]:
+    """Split markdown into (block type, content) pairs in a single pass.
+
+    Also return the labels of link reference definitions, which commonmark
+    drops from the paragraphs and uses to resolve reference links.
+    """
+    blocks = []
+    references = set()
+    para = []
+    code = None
+    fence = None
+    html_lines = None
+    html_end = None
+    list_indent = 0
+    prev_blank = False
+    para_quoted = False
+
+    def para_content():
+        content = "\n".join(para).strip()
+        definition = REF_DEF_RE.match(content)
+        while definition and definition.group(1).strip():
+            references.add(_normalize_label(definition.group(1)))
+            content = content[definition.end():]
+            definition = REF_DEF_RE.match(content)
+        return content
+
+    def close_para():
+        content = para_content()
+        if content:
+            blocks.append(("paragraph", content))
+        para.clear()
+
+    def close_code():
+        while code and not code[-1].strip():
+            code.pop()
+        blocks.append(("code_block", "".join(f"{ln}\n" for ln in code)))
+
+    def close_html():
+        while html_lines and not html_lines[-1].strip():
+            html_lines.pop()
+        blocks.append(("html_block", "\n".join(html_lines)))
+
+    lines = LINE_RE.split(input_md)
+    if len(lines) > 1 and lines[-1] == "":
+        # a final line ending does not start another line
+        lines.pop()
+    for line in lines:
+        if fence is not None:
+            closing = FENCE_CLOSE_RE.match(line)
+            if (
+                closing
+                and closing.group(1)[0] == fence[0]
+                and len(closing.group(1)) >= fence[1]
+            ):
+                blocks.append(
+                    ("code_block", "".join(f"{ln}\n" for ln in code)))
+                fence = code = None
+            else:
+                code.append(line[min(fence[2], _indent(line)):])
+            continue
+        if html_lines is not None:
+            if html_end is None and not line.strip():
+                close_html()
+                html_lines = None
+            else:
+                html_lines.append(line)
+                if html_end is not None and html_end.search(line):
+                    close_html()
+                    html_lines = None
+                continue
+        quoted = False
+        if QUOTE_RE.match(line) and _indent(line) < list_indent:
+            list_indent = 0
+        while QUOTE_RE.match(line):
+            line = line[QUOTE_RE.match(line).end():]
+            quoted = True
+        if quoted and not para_quoted:
+            close_para()
+        # a paragraph left by a block quote only continues lazily
+        lazy = bool(para) and para_quoted and not quoted
+        if code is not None:
+            if not line.strip() or _indent(line) >= 4:
+                code.append(line.expandtabs(4)[4:])
+                continue
+            close_code()
+            code = None
+        blank = not line.strip()
+        if blank:
+            close_para()
+            prev_blank = True
+            continue
+        # lines indented less than the list item content leave the list
+        outdented = _indent(line) < list_indent
+        if prev_blank and outdented:
+            list_indent = 0
+        prev_blank = False
+        if _indent(line) >= 4 and not para and not list_indent:
+            code = [line.expandtabs(4)[4:]]
+            continue
+        if line.lstrip()[0] not in BLOCK_START:
+            # fast path for plain paragraph text
+            if not para:
+                para_quoted = quoted
+            para.append(line.lstrip())
+            continue
+        heading = ATX_RE.match(line)
+        fenced = FENCE_RE.match(line)
+        if fenced and fenced.group(2)[0] == "`" and "`" in fenced.group(3):
+            fenced = None
+        listed = LIST_RE.match(line)
+        html_open = [
+            end for start, end in HTML_BLOCK_RE if start.match(line)]
+        if heading or fenced or html_open or THEMATIC_RE.match(line):
+            if outdented:
+                list_indent = 0
+        if heading:
+            close_para()
+            title = re.sub(r"^[ \t]*#+[ \t]*$", "", heading.group(2) or "")
+            title = re.sub(r"[ \t]+#+[ \t]*$", "", title)
+            blocks.append(("heading", title.strip()))
+        elif fenced:
+            close_para()
+            fence = (fenced.group(2)[0], len(fenced.group(2)),
+                     len(fenced.group(1)))
+            code = []
+        elif html_open or (
+                (not para or lazy) and HTML_LINE_RE.match(line)):
+            close_para()
+            html_lines = [line]
+            html_end = html_open[0] if html_open else None
+            if html_end is not None and html_end.search(line):
+                close_html()
+                html_lines = None
+        elif (
+            para and not outdented and not lazy and SETEXT_RE.match(line)
+            and para_content()
+        ):
+            blocks.append(("heading", para_content()))
+            para.clear()
+        elif THEMATIC_RE.match(line):
+            close_para()
+        elif listed and not (para and not lazy and (
+                not list_indent or not outdented) and (
+                line[listed.end():].strip() == ""
+                or listed.group(2) not in (None, "1"))):
+            close_para()
+            content = line[listed.end():]
+            if content.strip():
+                list_indent = len(line[:listed.end()].expandtabs(4))
+                para.append(content.lstrip())
+                para_quoted = quoted
+            else:
+                list_indent = len(line[:listed.end()].rstrip()) + 1
+        else:
+            if not para:
+                para_quoted = quoted
+            para.append(line.lstrip())
+    if fence is not None:
+        blocks.append(("code_block", "".join(f"{ln}\n" for ln in code)))
+    elif code is not None:
+        close_code()
+    if html_lines is not None:
+        close_html()
+    close_para()
+    return blocks, references
+
+
+def _is_punctuation(char: str) -> bool:
+    """Check if a character is ASCII or unicode punctuation."""
+    return char in ESCAPABLE or unicodedata.category(char).startswith("P")
+
+
+def _delimiter(text: str, start: int, end: int) -> Dict:
+    """Describe an emphasis delimiter run between start and end."""
+    before = text[start - 1] if start > 0 else "\n"
+    after = text[end] if end < len(text) else "\n"
+    after_space = after.isspace()
+    before_space = before.isspace()
+    after_punct = _is_punctuation(after)
+    before_punct = _is_punctuation(before)
+    left = not after_space and (
+        not after_punct or before_space or before_punct)
+    right = not before_space and (
+        not before_punct or after_space or after_punct)
+    if text[start] == "_":
+        can_open = left and (not right or before_punct)
+        can_close = right and (not left or after_punct)
+    else:
+        can_open = left
+        can_close = right
+    return {
+        "char": text[start],
+        "count": end - start,
+        "length": end - start,
+        "can_open": can_open,
+        "can_close": can_close,
+    }
+
+
+def _process_emphasis(nodes: List, delimiters: List, bottom: int) -> None:
+    """Drop the delimiter text of matched emphasis above bottom."""
+    index = bottom
+    while index < len(delimiters):
+        closer = delimiters[index]
+        if not closer["can_close"]:
+            index += 1
+            continue
+        position = index - 1
+        while position >= bottom:
+            opener = delimiters[position]
+            odd_match = (
+                (closer["can_open"] or opener["can_close"])
+                and closer["length"] % 3 != 0
+                and (opener["length"] + closer["length"]) % 3 == 0
+            )
+            if (
+                opener["char"] == closer["char"]
+                and opener["can_open"]
+                and not odd_match
+            ):
+                break
+            position -= 1
+        if position < bottom:
+            if closer["can_open"]:
+                index += 1
+            else:
+                del delimiters[index]
+            continue
+        used = 2 if opener["count"] >= 2 and closer["count"] >= 2 else 1
+        for delim in (opener, closer):
+            delim["count"] -= used
+            node = nodes[delim["node"]]
+            node[1] = node[1][:len(node[1]) - used]
+        del delimiters[position + 1:index]
+        index = position + 1
+        if opener["count"] == 0:
+            nodes[opener["node"]] = None
+            del delimiters[position]
+            index -= 1
+        if closer["count"] == 0:
+            nodes[closer["node"]] = None
+            del delimiters[index]
+    del delimiters[bottom:]
+
+
+# pylint: disable=too-many-branches
+# pylint: disable=too-many-statements
+def _scan_inlines(
+        text: str, references: Set[str] = frozenset()
+) -> List[Tuple[str, str]]:
+    """Split inline markdown into the literal nodes commonmark yields."""
+    nodes = []
+    delimiters = []
+    brackets = []
+    pos = 0
+    while pos < len(text):
+        char = text[pos]
+        if char == "\n":
+            # line break, drop the trailing spaces of the previous text
+            if nodes and nodes[-1] is not None and nodes[-1][0] == "text":
+                nodes[-1][1] = nodes[-1][1].rstrip(" ")
+            pos += 1
+            while pos < len(text) and text[pos] == " ":
+                pos += 1
+        elif char == "\\":
+            following = text[pos + 1:pos + 2]
+            if following == "\n":
+                pos += 1
+            elif following and following in ESCAPABLE:
+                nodes.append(["text", following])
+                pos += 2
+            else:
+                nodes.append(["text", "\\"])
+                pos += 1
+        elif char == "`":
+            ticks = TICKS_RE.match(text, pos).group()
+            after = pos + len(ticks)
+            closing = TICKS_RE.search(text, after)
+            while closing and closing.group() != ticks:
+                closing = TICKS_RE.search(text, closing.end())
+            if closing:
+                content = text[after:closing.start()].replace("\n", " ")
+                if content.lstrip(" ") and content[0] == content[-1] == " ":
+                    content = content[1:-1]
+                nodes.append(["code", content])
+                pos = closing.end()
+            else:
+                nodes.append(["text", ticks])
+                pos = after
+        elif char in "*_":
+            end = pos
+            while end < len(text) and text[end] == char:
+                end += 1
+            delim = _delimiter(text, pos, end)
+            nodes.append(["text", text[pos:end]])
+            if delim["can_open"] or delim["can_close"]:
+                delim["node"] = len(nodes) - 1
+                delimiters.append(delim)
+            pos = end
+        elif char == "[" or (char == "!" and text[pos + 1:pos + 2] == "["):
+            image = char == "!"
+            nodes.append(["text", "![" if image else "["])
+            brackets.append({
+                "node": len(nodes) - 1,
+                "image": image,
+                "active": True,
+                "delimiters": len(delimiters),
+                "start": pos + (2 if image else 1),
+            })
+            pos += 2 if image else 1
+        elif char == "]":
+            link = INLINE_LINK_RE.match(text, pos + 1)
+            if brackets and not link:
+                # reference links, either full, collapsed or shortcut
+                label = LABEL_RE.match(text, pos + 1)
+                if label and label.group(1):
+                    reference = label.group(1)
+                else:
+                    reference = text[brackets[-1]["start"]:pos]
+                if _normalize_label(reference) in references:
+                    link = label or re.compile("").match(text, pos + 1)
+            if brackets and brackets[-1]["active"] and link:
+                opener = brackets.pop()
+                nodes[opener["node"]] = None
+                _process_emphasis(nodes, delimiters, opener["delimiters"])
+                if not opener["image"]:
+                    for bracket in brackets:
+                        if not bracket["image"]:
+                            bracket["active"] = False
+                pos = link.end()
+            else:
+                if brackets:
+                    brackets.pop()
+                nodes.append(["text", "]"])
+                pos += 1
+        elif char == "<":
+            autolink = AUTOLINK_RE.match(text, pos)
+            tag = HTML_TAG_RE.match(text, pos)
+            if autolink:
+                nodes.append(["text", autolink.group(1) or autolink.group(2)])
+                pos = autolink.end()
+            elif tag:
+                nodes.append(["html_inline", tag.group()])
+                pos = tag.end()
+            else:
+                nodes.append(["text", "<"])
+                pos += 1
+        elif char == "&":
+            entity = ENTITY_RE.match(text, pos)
+            if entity:
+                nodes.append(["text", html.unescape(entity.group())])
+                pos = entity.end()
+            else:
+                nodes.append(["text", "&"])
+                pos += 1
+        elif char in "!'\"":
+            nodes.append(["text", char])
+            pos += 1
+        else:
+            run = TEXT_RE.match(text, pos)
+            nodes.append(["text", run.group()])
+            pos = run.end()
+    _process_emphasis(nodes, delimiters, 0)
+    return [(node[0], node[1]) for node in nodes if node is not None]
+
+
+def md_scanner(input_md: str, is_clean=True) -> Dict[str, str]:
+    """Scan a markdown file line by line into the same dict as md_parser."""
+    types = set()
+    if is_clean:
+        types = {"code_block", "code"}
+    md_dict = {}
+    cur_heading = ""
+    blocks, references = _scan_blocks(input_md)
+    for block_type, content in blocks:
+        if block_type in ("code_block", "html_block"):
+            nodes = [(block_type, content)]
+        else:
+            nodes = _scan_inlines(content, references)
+        if block_type == "heading":
+            # the first literal of the heading is the key name
+            cur_heading = nodes[0][1].lower() if nodes else ""
+            md_dict[cur_heading] = ""
+            nodes = nodes[1:]
+        for node_type, literal in nodes:
+            if literal.lower() != cur_heading and node_type not in types:
+                # add related text to the header
+                md_dict[cur_heading] += literal + " "
+    return md_dict
+
+
+def get_parser(fast: bool = False):
+    """Return the markdown parser, the line scanner when fast is set."""
+    if fast:
+        return md_scanner
+    return md_parser
+
+
+@pr.stage("markdown.import_uploaded_files", documents=pr.first_count)
+def import_uploaded_files(paths: List, fast=False) -> Dict[str, List[str]]:
     """Importing the individual files."""
+    parser = get_parser(fast)
     main_md_dict = None
     for path in paths:
         stringio = StringIO(path.getvalue().decode("utf-8"))
-        individual_dict = md_parser(stringio.read(), True)
+        individual_dict = parser(stringio.read(), True)
         main_md_dict = merge_dict(main_md_dict, individual_dict, True)
     return main_md_dict
 
@@ -0,0 +1,292 @@
+"""Shared spaCy model server for the processes of one machine."""
+import argparse
+import logging
+import os
+import secrets
+import socket
+import stat
+import sys
+import threading
+from multiprocessing.managers import BaseManager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from . import constants as cts
+
+ADDRESS_ENV = "GATOR_MODEL_SERVER"
+AUTHKEY_ENV = "GATOR_MODEL_AUTHKEY"
+# the socket and the generated key are only reachable by their owner
+RUNTIME_DIR = os.path.join(cts.CACHE_DIR, "run")
+DEFAULT_ADDRESS = os.path.join(RUNTIME_DIR, "models.sock")
+KEY_FILE = os.path.join(RUNTIME_DIR, "models.key")
+BATCH_SIZE = 64
+
+
+def load_model(name: str):
+    """Load a spacy model."""
+    # the clients only need spacy when no model server is running
+    import spacy  # pylint: disable=import-outside-toplevel
+
+    return spacy.load(name)
+
+
+class ModelService:
+    """Hold one copy of each spacy model and answer batched requests.
+
+    Only plain python values are sent back, so the clients never need to
+    load the models themselves.
+    """
+
+    def __init__(
+            self, preload: Sequence[str] = (),
+            loader: Callable = load_model):
+        """Load the preloaded models, the others are loaded on first use."""
+        self._loader = loader
+        self._models: Dict[str, object] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        for name in preload:
+            self._model(name)
+
+    def _model(self, name: str):
+        """Return the model and its lock, load the model once."""
+        with self._lock:
+            if name not in self._models:
+                logging.info("Loading spacy model %s", name)
+                self._models[name] = self._loader(name)
+                self._locks[name] = threading.Lock()
+            return self._models[name], self._locks[name]
+
+    def _pipe(self, texts: Sequence[str], name: str):
+        """Process the texts in batches with the model."""
+        nlp, lock = self._model(name)
+        with lock:
+            return list(nlp.pipe(texts, batch_size=BATCH_SIZE))
+
+    def models(self) -> List[str]:
+        """Names of the loaded models."""
+        with self._lock:
+            return list(self._models)
+
+    def lemmas(
+            self, texts: Sequence[str], name: str = cts.SPACY_MODEL
+    ) -> List[List[Tuple[str, bool]]]:
+        """Lemma and stop word flag of every token of the texts."""
+        return [
+            [(word.lemma_, word.is_stop) for word in doc]
+            for doc in self._pipe(texts, name)
+        ]
+
+    def entities(
+            self, texts: Sequence[str], name: str = cts.SPACY_MODEL
+    ) -> List[List[Tuple[int, int, str]]]:
+        """Start, end and label of the named entities of the texts."""
+        return [
+            [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+            for doc in self._pipe(texts, name)
+        ]
+
+    def vectors(
+            self, texts: Sequence[str], name: str = cts.SPACY_MODEL
+    ) -> List[List[float]]:
+        """Document vectors of the texts."""
+        return [doc.vector.tolist() for doc in self._pipe(texts, name)]
+
+    def similarities(
+            self, pairs: Sequence[Tuple[str, str]],
+            name: str = cts.SPACY_MODEL
+    ) -> List[float]:
+        """Similarity of the documents of each pair."""
+        texts = list(dict.fromkeys(text for pair in pairs for text in pair))
+        docs = dict(zip(texts, self._pipe(texts, name)))
+        return [
+            float(docs[doc_1].similarity(docs[doc_2]))
+            for doc_1, doc_2 in pairs
+        ]
+
+
+class RemoteModel:
+    """Client side stand-in for a model held by the model server."""
+
+    def __init__(self, service, name: str = cts.SPACY_MODEL):
+        """Wrap the proxy of the model service."""
+        self.service = service
+        self.name = name
+
+    def lemmas(self, texts: Sequence[str]) -> List[List[Tuple[str, bool]]]:
+        """Lemma and stop word flag of every token of the texts."""
+        return self.service.lemmas(list(texts), self.name)
+
+    def entities(self, texts: Sequence[str]) -> List[List[Tuple]]:
+        """Start, end and label of the named entities of the texts."""
+        return self.service.entities(list(texts), self.name)
+
+    def vectors(self, texts: Sequence[str]) -> List[List[float]]:
+        """Document vectors of the texts."""
+        return self.service.vectors(list(texts), self.name)
+
+    def similarities(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        """Similarity of the documents of each pair."""
+        return self.service.similarities(
+            [tuple(pair) for pair in pairs], self.name)
+
+
+class ServerManager(BaseManager):
+    """Manager that shares the model service of the server process."""
+
+
+class ClientManager(BaseManager):
+    """Manager that connects to the model server."""
+
+
+ClientManager.register("service")
+
+_REMOTE_MODELS: Dict[Tuple, Optional[RemoteModel]] = {}
+_REMOTE_LOCK = threading.Lock()
+
+
+def private_dir(path: str):
+    """Create the directory, readable by its owner only."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+
+def get_authkey(create: bool = False) -> Optional[bytes]:
+    """Authentication key shared by the server and its clients.
+
+    The key is GATOR_MODEL_AUTHKEY when set, otherwise the random key that
+    the server writes to a file of its owner. None when there is no key and
+    create is False.
+    """
+    key = os.environ.get(AUTHKEY_ENV)
+    if key:
+        return key.encode("utf-8")
+    try:
+        with open(KEY_FILE, "rb") as key_file:
+            return key_file.read().strip()
+    except FileNotFoundError:
+        if not create:
+            return None
+    private_dir(RUNTIME_DIR)
+    key = secrets.token_hex(32).encode("utf-8")
+    try:
+        descriptor = os.open(
+            KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # written by another server in the meantime
+        return get_authkey()
+    with os.fdopen(descriptor, "wb") as key_file:
+        key_file.write(key)
+    return key
+
+
+def connect(
+        address: str, name: str = cts.SPACY_MODEL, authkey: bytes = None
+) -> RemoteModel:
+    """Connect to the model server listening on the unix socket."""
+    authkey = authkey or get_authkey()
+    if authkey is None:
+        raise ValueError(
+            f"No key for the model server, set {AUTHKEY_ENV} or start the "
+            "server as the same user")
+    manager = ClientManager(address=address, authkey=authkey)
+    manager.connect()
+    # pylint: disable=no-member
+    return RemoteModel(manager.service(), name)
+
+
+def remote_model(name: str = cts.SPACY_MODEL) -> Optional[RemoteModel]:
+    """Return the model of the configured server, None without a server.
+
+    The connection is made once per process, when it fails the models are
+    loaded locally.
+    """
+    address = os.environ.get(ADDRESS_ENV)
+    if not address:
+        return None
+    key = (address, name)
+    with _REMOTE_LOCK:
+        if key not in _REMOTE_MODELS:
+            try:
+                _REMOTE_MODELS[key] = connect(address, name)
+            except (OSError, EOFError, ValueError) as err:
+                logging.warning(
+                    "Cannot connect to the model server at %s: %s",
+                    address, err)
+                _REMOTE_MODELS[key] = None
+        return _REMOTE_MODELS[key]
+
+
+def create_server(
+        address: str, preload: Sequence[str] = (cts.SPACY_MODEL,),
+        authkey: bytes = None, loader: Callable = load_model):
+    """Create the model server listening on a unix socket.
+
+    The socket is only usable by its owner, and a new directory of the
+    socket is private.
+    """
+    directory = os.path.dirname(os.path.abspath(address))
+    if not os.path.isdir(directory):
+        private_dir(directory)
+    remove_stale_socket(address)
+    authkey = authkey or get_authkey(create=True)
+    service = ModelService(preload, loader)
+    ServerManager.register("service", callable=lambda: service)
+    manager = ServerManager(address=address, authkey=authkey)
+    # no other user can connect between the bind and the chmod
+    umask = os.umask(0o177)
+    try:
+        server = manager.get_server()
+    finally:
+        os.umask(umask)
+    os.chmod(address, 0o600)
+    return server
+
+
+def remove_stale_socket(address: str):
+    """Remove the socket of a server that is no longer running.
+
+    Raise FileExistsError when the path is not a socket or a server still
+    listens on it.
+    """
+    try:
+        mode = os.lstat(address).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{address} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(address)
+    except ConnectionRefusedError:
+        # left behind by a previous server
+        os.remove(address)
+        return
+    finally:
+        probe.close()
+    raise FileExistsError(f"A model server already listens on {address}")
+
+
+def main(args):
+    """Serve the models until interrupted."""
+    parser = argparse.ArgumentParser(
+        description="Serve spacy models to the GatorMiner processes",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--socket",
+        default=os.environ.get(ADDRESS_ENV, DEFAULT_ADDRESS),
+        help="Path of the unix socket to listen on",
+    )
+    parser.add_argument(
+        "--model",
+        action="append",
+        help=f"Model to load at start (default {cts.SPACY_MODEL})",
+    )
+    arguments = parser.parse_args(args)
+    server = create_server(
+        arguments.socket, arguments.model or [cts.SPACY_MODEL])
+    print(f"Serving spacy models on {arguments.socket}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
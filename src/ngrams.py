@@ -0,0 +1,180 @@
+"""Sparse n-gram counts with phrase frequency and collocation scores."""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from . import vocabulary as vb
+
+MAX_ORDER = 3
+# n-grams seen fewer times in the corpus are pruned
+MIN_COUNT = 2
+MEASURES = ("frequency", "pmi", "likelihood")
+# keys from this value on do not fit in an int64
+KEY_LIMIT = 2 ** 63
+
+
+def ngram_keys(local_arrays: Sequence[np.ndarray], order: int,
+               num_terms: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Document and key of every n-gram of the documents.
+
+    The key of an n-gram is its local ids as digits in base num_terms, so
+    that the n-grams are counted with one sort instead of a dictionary.
+    The keys are int64, or python ints in an object array when the
+    n-grams of so many distinct tokens do not fit in an int64.
+    """
+    fits = num_terms ** order < KEY_LIMIT
+    lengths = [len(ids) for ids in local_arrays]
+    all_ids = vb.concatenate(local_arrays).astype(np.int64)
+    documents = np.repeat(np.arange(len(local_arrays)), lengths)
+    size = len(all_ids) - order + 1
+    if size <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # n-grams do not cross the end of a document
+    starts = np.flatnonzero(documents[:size] == documents[order - 1:])
+    keys = np.zeros(len(starts), dtype=np.int64 if fits else object)
+    for offset in range(order):
+        ids = all_ids[starts + offset]
+        keys = keys * num_terms + (ids if fits else ids.astype(object))
+    return documents[starts], keys
+
+
+def count_ngrams(local_arrays: Sequence[np.ndarray], order: int,
+                 num_terms: int, min_count: int = MIN_COUNT) -> \
+        Tuple[np.ndarray, sparse.csr_matrix]:
+    """Sorted keys of the frequent n-grams and their document counts."""
+    documents, keys = ngram_keys(local_arrays, order, num_terms)
+    unique, inverse, counts = np.unique(
+        keys, return_inverse=True, return_counts=True)
+    kept = counts >= min_count
+    columns = np.cumsum(kept) - 1
+    occurrences = kept[inverse]
+    matrix = sparse.csr_matrix(
+        (
+            np.ones(int(occurrences.sum()), dtype=np.int32),
+            (documents[occurrences], columns[inverse[occurrences]]),
+        ),
+        shape=(len(local_arrays), int(kept.sum())),
+    )
+    matrix.sum_duplicates()
+    return unique[kept], matrix
+
+
+def likelihood_ratio(joint, first, last, total) -> np.ndarray:
+    """Dunning log-likelihood ratio of the 2x2 contingency tables."""
+    observed = np.stack([
+        joint,
+        first - joint,
+        last - joint,
+        total - first - last + joint,
+    ]).astype(np.float64).clip(min=0)
+    rows = np.stack([first, first, total - first, total - first])
+    columns = np.stack([last, total - last, last, total - last])
+    expected = rows * columns / total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(
+            observed > 0, observed * np.log(observed / expected), 0)
+    return 2 * terms.sum(axis=0)
+
+
+class NgramCounts:
+    """Document n-gram count matrices of a corpus, built once.
+
+    A sparse matrix of documents by n-grams is kept for every order up to
+    max_order. The n-grams of two or more words that occur fewer than
+    min_count times in the corpus are pruned, which bounds the memory of
+    the matrices. The counts of a selection of documents are the sums of its
+    rows, and its collocations are scored on the contingency table of the
+    first words of an n-gram and its last word.
+    """
+
+    def __init__(self, id_arrays: Sequence[np.ndarray],
+                 max_order: int = MAX_ORDER, min_count: int = MIN_COUNT,
+                 vocabulary: vb.Vocabulary = vb.VOCABULARY):
+        """Count the n-grams of the token ids of every document."""
+        self.vocabulary = vocabulary
+        self.min_count = min_count
+        # vocabulary ids of the local ids
+        self.words, local_arrays = vb.local_ids(id_arrays)
+        self.num_terms = max(len(self.words), 1)
+        self.keys: Dict[int, np.ndarray] = {}
+        self.matrices: Dict[int, sparse.csr_matrix] = {}
+        for order in range(1, max_order + 1):
+            self.keys[order], self.matrices[order] = count_ngrams(
+                local_arrays, order, self.num_terms,
+                1 if order == 1 else min_count,
+            )
+
+    def counts(self, rows: Sequence[int], order: int) -> np.ndarray:
+        """Count of every n-gram in the documents of the rows."""
+        matrix = self.matrices[order]
+        return np.asarray(matrix[np.asarray(rows, dtype=np.int64)].sum(
+            axis=0)).reshape(-1)
+
+    def phrase(self, key: int, order: int) -> str:
+        """Words of the n-gram of a key."""
+        local = []
+        for _ in range(order):
+            key, local_id = divmod(int(key), self.num_terms)
+            local.append(self.words[local_id])
+        return " ".join(self.vocabulary.decode(local[::-1]))
+
+    def scores(self, rows: Sequence[int], order: int,
+               measure: str = "frequency") -> Tuple[np.ndarray, np.ndarray]:
+        """Columns of the n-grams in the documents and their scores.
+
+        The frequency counts every n-gram of the documents, pmi and
+        likelihood score those seen at least min_count times.
+        """
+        if measure not in MEASURES:
+            raise ValueError(f"Unknown measure {measure}")
+        joint = self.counts(rows, order)
+        if measure == "frequency" or order == 1:
+            columns = np.flatnonzero(joint)
+            return columns, joint[columns]
+        columns = np.flatnonzero(joint >= self.min_count)
+        keys = self.keys[order][columns]
+        # every prefix of a kept n-gram is frequent enough to be kept
+        prefixes = np.searchsorted(
+            self.keys[order - 1], keys // self.num_terms)
+        words = self.counts(rows, 1)
+        first = self.counts(rows, order - 1)[prefixes]
+        last = words[(keys % self.num_terms).astype(np.int64)]
+        total = words.sum()
+        joint = joint[columns]
+        if measure == "pmi":
+            return columns, np.log2(joint * total / (first * last))
+        return columns, likelihood_ratio(joint, first, last, total)
+
+    def top(self, rows: Sequence[int], order: int, amount: int = 50,
+            measure: str = "frequency") -> List[Tuple[str, float]]:
+        """Highest scoring n-grams of the documents, with their scores."""
+        columns, scores = self.scores(rows, order, measure)
+        # ties are ordered by the ids of the words
+        ranked = np.lexsort((columns, -scores))[:amount]
+        return [
+            (self.phrase(self.keys[order][columns[index]], order),
+             scores[index].item())
+            for index in ranked
+        ]
+
+    def __len__(self) -> int:
+        """Number of counted documents."""
+        return self.matrices[1].shape[0]
+
+
+# pylint: disable=too-many-arguments
+def phrase_df(counts: NgramCounts, groups: Dict[str, Sequence[int]],
+              group_column: str, order: int, amount: int = 10,
+              measure: str = "frequency") -> pd.DataFrame:
+    """Top n-grams of every group of rows, like the frequency dataframes."""
+    frames = []
+    for group, rows in groups.items():
+        group_df = pd.DataFrame(
+            counts.top(rows, order, amount, measure), columns=["word", "freq"])
+        group_df[group_column] = group
+        frames.append(group_df)
+    if not frames:
+        return pd.DataFrame(columns=["word", "freq", group_column])
+    return pd.concat(frames, ignore_index=True)
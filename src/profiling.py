@@ -0,0 +1,152 @@
+"""Wall time, call and document counters of the pipeline stages."""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+PROFILE_ENV = "GATOR_PROFILE"
+LOG_ENV = "GATOR_PROFILE_LOG"
+LOGGER = logging.getLogger("gatorminer.profile")
+
+
+class Profile:
+    """Totals of every stage, recorded only once enabled.
+
+    A disabled profile costs a stage call one attribute lookup. The times
+    of a stage include the stages it calls. With a log file, every call is
+    also written to it as a line of JSON.
+    """
+
+    def __init__(self):
+        """Start disabled with empty totals."""
+        self.enabled = False
+        self.stages: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._handler: Optional[logging.Handler] = None
+
+    def enable(self, log_path: Optional[str] = None):
+        """Start recording, and logging to the file if given."""
+        if log_path and self._handler is None:
+            self._handler = logging.FileHandler(log_path, encoding="utf-8")
+            self._handler.setFormatter(logging.Formatter("%(message)s"))
+            LOGGER.addHandler(self._handler)
+            LOGGER.setLevel(logging.INFO)
+            LOGGER.propagate = False
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording and close the log file."""
+        self.enabled = False
+        if self._handler is not None:
+            LOGGER.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+
+    def record(self, stage: str, seconds: float,
+               documents: Optional[int] = None):
+        """Add a call of a stage."""
+        with self._lock:
+            totals = self.stages.setdefault(
+                stage, {"calls": 0, "seconds": 0.0, "documents": 0})
+            totals["calls"] += 1
+            totals["seconds"] += seconds
+            totals["documents"] += documents or 0
+        if self._handler is not None:
+            LOGGER.info(json.dumps({
+                "time": time.time(),
+                "stage": stage,
+                "seconds": round(seconds, 6),
+                "documents": documents,
+                "thread": threading.current_thread().name,
+            }))
+
+    def summary(self) -> List[Dict]:
+        """Totals of every stage, the slowest first."""
+        with self._lock:
+            rows = [
+                {"stage": stage, **totals}
+                for stage, totals in self.stages.items()
+            ]
+        for row in rows:
+            row["seconds"] = round(row["seconds"], 6)
+            row["mean ms"] = round(row["seconds"] / row["calls"] * 1000, 3)
+        return sorted(rows, key=lambda row: -row["seconds"])
+
+    def format(self) -> str:
+        """Table of the totals of every stage."""
+        lines = [
+            f"{'stage':<32}{'calls':>8}{'documents':>12}{'seconds':>12}"
+            f"{'mean ms':>12}"
+        ]
+        for row in self.summary():
+            lines.append(
+                f"{row['stage']:<32}{row['calls']:>8}{row['documents']:>12}"
+                f"{row['seconds']:>12.3f}{row['mean ms']:>12.3f}"
+            )
+        return "\n".join(lines)
+
+    def reset(self):
+        """Drop the totals."""
+        with self._lock:
+            self.stages.clear()
+
+
+# shared by the modules of the process
+PROFILE = Profile()
+
+
+def count(items) -> Optional[int]:
+    """Number of documents of a sized argument, None for an iterator."""
+    try:
+        return len(items)
+    except TypeError:
+        return None
+
+
+def stage(name: str, documents: Optional[Callable[..., int]] = None,
+          result_documents: Optional[Callable[..., int]] = None):
+    """Decorator that records the calls of a function as a stage.
+
+    documents, called with the arguments of the function, or
+    result_documents, called with its result, gives the number of
+    documents of a call. The documents are only counted when the call
+    returns, the time of a call that raises is recorded without them.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILE.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                PROFILE.record(name, time.perf_counter() - start)
+                raise
+            seconds = time.perf_counter() - start
+            if documents is not None:
+                amount = documents(*args, **kwargs)
+            elif result_documents is not None and result is not None:
+                amount = result_documents(result)
+            else:
+                amount = None
+            PROFILE.record(name, seconds, amount)
+            return result
+        return wrapper
+    return decorator
+
+
+def first_count(*args, **_) -> Optional[int]:
+    """Number of documents of the first argument."""
+    return count(args[0]) if args else None
+
+
+def enable_from_env():
+    """Enable the profile if GATOR_PROFILE or GATOR_PROFILE_LOG is set."""
+    log_path = os.environ.get(LOG_ENV)
+    if log_path or os.environ.get(PROFILE_ENV, "").lower() in (
+            "1", "true", "yes"):
+        PROFILE.enable(log_path)
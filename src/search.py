@@ -0,0 +1,326 @@
+"""Inverted index and keyword-in-context search over reflections."""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import constants as cts
+from . import profiling as pr
+from . import vocabulary as vb
+
+INDEX_VERSION = 3
+# words shown on each side of a match
+WINDOW = 6
+# words of the raw answers, numbers alone are dropped like in normalize
+WORD = re.compile(r"\w+")
+NUMBER = re.compile(r"[0-9]+")
+
+# pylint: disable=logging-fstring-interpolation
+
+
+def answer_words(text: str) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Start and end offsets and lowercase form of the words of a text."""
+    starts, ends, words = [], [], []
+    for match in WORD.finditer(text):
+        word = match.group().lower()
+        if NUMBER.fullmatch(word):
+            continue
+        starts.append(match.start())
+        ends.append(match.end())
+        words.append(word)
+    return (np.array(starts, dtype=np.int32), np.array(ends, dtype=np.int32),
+            words)
+
+
+class InvertedIndex:
+    """Postings of every lemma: answer and the positions of its words.
+
+    The words of every answer are found in its raw text with their
+    character offsets, so that the snippets show the text as it was
+    written. A word is indexed under its lemma in the shared vocabulary
+    when the lemma is one of the tokens of the reflection in the corpus, so
+    that the hits agree with the other pages. The lemma of each distinct
+    word is looked up once, and the offsets and terms of the words of each
+    reflection are kept under a hash of its content, so that loading a
+    course again only indexes its new or changed reflections. The postings
+    are one array of (lemma, answer, position) sorted by lemma, so that the
+    postings of a lemma are a slice found with a binary search.
+    """
+
+    def __init__(self, vocabulary: vb.Vocabulary = vb.VOCABULARY):
+        """Start with an empty index."""
+        self.vocabulary = vocabulary
+        # lowercase word -> lemma, empty for the words that are not tokens
+        self.lemmas: Dict[str, str] = {}
+        # lemmas of the indexed words, referred to by their position
+        self.terms: List[str] = []
+        # content hash -> question, word offsets and terms of the answers
+        self.reflections: Dict[str, List[Tuple]] = {}
+        # assignment, student, question, text and word offsets of the answers
+        self._answers: List[Tuple] = []
+        self._postings = (
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32),
+            np.empty(0, dtype=np.int32))
+
+    # pylint: disable=too-many-arguments,too-many-locals
+    def build(self, raw_df: pd.DataFrame, main_df: pd.DataFrame, assign_id,
+              stu_id, lemmatize: Callable[[List[str]], List[str]]) -> int:
+        """Index the answers of the corpus.
+
+        main_df holds the tokens of the reflections of raw_df, row by row.
+        lemmatize returns the lemma of every word of a batch, empty for the
+        words that are not tokens. Only the reflections without an entry of
+        their content are indexed again. Return the number of reflections
+        indexed again or dropped.
+        """
+        questions = [
+            column for column in raw_df.columns if column not in (
+                assign_id, stu_id)
+        ]
+        rows = raw_df[[assign_id, stu_id] + questions].itertuples(
+            index=False, name=None)
+        keys, contents = [], []
+        for row, tokens in zip(rows, main_df[cts.TOKEN]):
+            answers = [
+                (question, str(text))
+                for question, text in zip(questions, row[2:])
+                if not pd.isna(text) and str(text).strip()
+            ]
+            keys.append(reflection_key(row[:2], answers, tokens))
+            contents.append((row[:2], answers, tokens))
+        new = {
+            key: content for key, content in zip(keys, contents)
+            if key not in self.reflections
+        }
+        words = {
+            key: [answer_words(text) for _, text in answers]
+            for key, (_, answers, _) in new.items()
+        }
+        new_words = sorted(
+            {word for found in words.values()
+             for _, _, answer in found for word in answer}
+            - self.lemmas.keys())
+        if new_words:
+            self.lemmas.update(zip(new_words, lemmatize(new_words)))
+        term_numbers = {term: number for number, term in enumerate(self.terms)}
+        for key, (_, answers, tokens) in new.items():
+            tokens = set(tokens)
+            entries = []
+            for (question, _), (starts, ends, answer) in zip(
+                    answers, words[key]):
+                numbers = []
+                for word in answer:
+                    lemma = self.lemmas[word]
+                    # only the lemmas among the tokens of the reflection
+                    if lemma and lemma in tokens:
+                        if lemma not in term_numbers:
+                            term_numbers[lemma] = len(self.terms)
+                            self.terms.append(lemma)
+                        numbers.append(term_numbers[lemma])
+                    else:
+                        numbers.append(-1)
+                entries.append((question, starts.tolist(), ends.tolist(),
+                                numbers))
+            self.reflections[key] = entries
+        dropped = self.reflections.keys() - set(keys)
+        for key in dropped:
+            del self.reflections[key]
+        # the vocabulary id of every term, the last one for the words that
+        # have none, whose number is -1
+        term_ids = np.array(
+            [self.vocabulary.ids.get(term, -1) for term in self.terms] + [-1],
+            dtype=np.int64)
+        answers, arrays = [], []
+        for key, ((assignment, student), texts, _) in zip(keys, contents):
+            for (question, text), (_, starts, ends, numbers) in zip(
+                    texts, self.reflections[key]):
+                answers.append((
+                    str(assignment), str(student), question, text,
+                    np.array(starts, dtype=np.int32),
+                    np.array(ends, dtype=np.int32)))
+                arrays.append(term_ids[np.array(numbers, dtype=np.int64)])
+        self._answers = answers
+        self._postings = postings(arrays)
+        return len(new) + len(dropped)
+
+    def matches(self, term: str) -> Dict[int, np.ndarray]:
+        """Word positions of a lemma in the answers that mention it."""
+        token_id = self.vocabulary.ids.get(term)
+        if token_id is None:
+            return {}
+        all_ids, answers, positions = self._postings
+        start, stop = np.searchsorted(all_ids, [token_id, token_id + 1])
+        answers, positions = answers[start:stop], positions[start:stop]
+        numbers, first = np.unique(answers, return_index=True)
+        return dict(zip(numbers.tolist(), np.split(positions, first[1:])))
+
+    def search(self, terms: Iterable[str], assignments=None,
+               window: int = WINDOW, limit: int = None) -> List[Dict]:
+        """Answers that mention every term, with a snippet of each match.
+
+        The terms are lemmas, like the tokens of the corpus. The hits are
+        sorted by assignment and student.
+        """
+        terms = list(dict.fromkeys(terms))
+        if not terms:
+            return []
+        found = self.matches(terms[0])
+        numbers = set(found)
+        for term in terms[1:]:
+            numbers &= set(self.matches(term))
+        if assignments is not None:
+            assignments = {str(assignment) for assignment in assignments}
+        hits = []
+        for number in sorted(numbers, key=lambda number: (
+                self._answers[number][0], self._answers[number][1], number)):
+            assignment, student, question, text, starts, ends = \
+                self._answers[number]
+            if assignments is not None and assignment not in assignments:
+                continue
+            positions = found[number].tolist()
+            hits.append({
+                "assignment": assignment,
+                "student": student,
+                "question": question,
+                "count": len(positions),
+                "snippets": [
+                    snippet(text, starts, ends, position, window)
+                    for position in positions
+                ],
+            })
+            if limit is not None and len(hits) >= limit:
+                break
+        return hits
+
+    def students(self, term: str, assignments=None) -> List[Tuple[str, str]]:
+        """Assignment and student of the reflections that mention a term."""
+        return sorted({
+            (hit["assignment"], hit["student"])
+            for hit in self.search([term], assignments, window=0)
+        })
+
+    def to_dict(self) -> Dict:
+        """Serializable lemmas, terms and word offsets of the reflections.
+
+        The texts stay in the corpus, they are taken from it by build.
+        """
+        return {
+            "version": INDEX_VERSION,
+            "lemmas": self.lemmas,
+            "terms": self.terms,
+            "reflections": self.reflections,
+        }
+
+    @classmethod
+    def from_dict(cls, content: Dict) -> "InvertedIndex":
+        """Index of serialized content, empty for another version."""
+        index = cls()
+        if content.get("version") == INDEX_VERSION:
+            index.lemmas = dict(content["lemmas"])
+            index.terms = list(content["terms"])
+            index.reflections = {
+                key: [tuple(entry) for entry in entries]
+                for key, entries in content["reflections"].items()
+            }
+        return index
+
+    def __len__(self) -> int:
+        """Number of indexed answers."""
+        return len(self._answers)
+
+
+def reflection_key(names: Sequence, answers: Sequence, tokens: Sequence) \
+        -> str:
+    """Hash of the assignment, student, answers and tokens of a reflection."""
+    return hashlib.sha256(json.dumps(
+        [[str(name) for name in names], answers, list(tokens)],
+        ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def postings(arrays: List[np.ndarray]) -> \
+        Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Lemma ids, answer numbers and positions, sorted by lemma id.
+
+    The words without a lemma, whose id is -1, are left out.
+    """
+    lengths = np.array([len(ids) for ids in arrays], dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    all_ids = (np.concatenate(arrays) if arrays
+               else np.empty(0, dtype=np.int64))
+    answers = np.repeat(np.arange(len(arrays), dtype=np.int32), lengths)
+    positions = (np.arange(len(all_ids), dtype=np.int64)
+                 - np.repeat(starts, lengths)).astype(np.int32)
+    kept = np.flatnonzero(all_ids >= 0)
+    # a stable sort keeps the answers and positions of a lemma in order
+    order = kept[np.argsort(all_ids[kept], kind="stable")]
+    return all_ids[order], answers[order], positions[order]
+
+
+def snippet(text: str, starts: np.ndarray, ends: np.ndarray, position: int,
+            window: int = WINDOW) -> Tuple[str, str, str]:
+    """Left context, keyword and right context around a word, as written."""
+    first = max(position - window, 0)
+    last = min(position + window, len(starts) - 1)
+    return (
+        " ".join(text[starts[first]:starts[position]].split()),
+        text[starts[position]:ends[position]],
+        " ".join(text[ends[position]:ends[last]].split()),
+    )
+
+
+def index_path(source) -> str:
+    """Path of the persisted index of a corpus, in the cache directory.
+
+    The index of local paths is keyed by their absolute paths, so that
+    nothing is written next to the reflections, the others, e.g. of aws
+    assignments or uploaded files, by their source.
+    """
+    if source and source[0] == "Path input":
+        source = [os.path.abspath(path) for path in source[1]]
+    digest = hashlib.sha256(
+        json.dumps(source, default=str).encode("utf-8")).hexdigest()
+    return os.path.join(cts.CACHE_DIR, "index", digest + cts.JSON_EXT)
+
+
+def load_index(path: str) -> InvertedIndex:
+    """Load a persisted index, empty if missing or unreadable."""
+    try:
+        with open(path, encoding="utf-8") as index_file:
+            return InvertedIndex.from_dict(json.load(index_file))
+    except (OSError, ValueError) as err:
+        logging.info(f"Cannot load index {path}: {err}")
+        return InvertedIndex()
+
+
+def save_index(index: InvertedIndex, path: str) -> None:
+    """Atomically write an index, ignore read-only directories."""
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=directory or None,
+                suffix=".tmp", delete=False) as index_file:
+            json.dump(index.to_dict(), index_file)
+        os.replace(index_file.name, path)
+    except OSError as err:
+        logging.warning(f"Cannot save index {path}: {err}")
+
+
+# pylint: disable=too-many-arguments
+@pr.stage("search.update_index", documents=pr.first_count)
+def update_index(raw_df, main_df, assign_id, stu_id, path: str,
+                 lemmatize: Callable[[List[str]], List[str]],
+                 index: InvertedIndex = None) -> InvertedIndex:
+    """Load, build and, if reflections were indexed again, save an index."""
+    if index is None:
+        index = load_index(path)
+    if index.build(raw_df, main_df, assign_id, stu_id, lemmatize):
+        save_index(index, path)
+    return index
@@ -0,0 +1,274 @@
+"""Per-session analysis context and process-wide corpus cache."""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Sequence, Tuple
+
+import pandas as pd
+
+from . import vocabulary as vb
+from .corpus_store import CorpusStore
+
+# derived views kept per session before the least recently used is dropped
+MAX_VIEWS = 64
+# memory budget of the shared corpus cache in MB
+CORPUS_BUDGET = int(os.environ.get("GATOR_CORPUS_BUDGET", 512))
+
+
+class AnalysisContext:
+    """Corpus of one session and the views derived from it.
+
+    The corpus frames are shared by every page and are never modified in
+    place, pages derive new frames from them instead of deep copies. Views
+    are memoized per selection until the corpus is reloaded or the view is
+    invalidated.
+    """
+
+    def __init__(self, max_views: int = MAX_VIEWS):
+        """Start with an empty corpus and no selection."""
+        self.source: Hashable = None
+        # identity of the corpus content, shared by the sessions that use it
+        self.corpus_key: Hashable = None
+        self.raw_df = pd.DataFrame()
+        self.main_df = pd.DataFrame()
+        self.assign_id = None
+        self.stu_id = None
+        self.assignments: Tuple[str, ...] = ()
+        self.max_views = max_views
+        self._views: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._store: CorpusStore = None
+
+    def is_loaded(self, source: Hashable) -> bool:
+        """Return whether the corpus was loaded from the given source."""
+        return self.source is not None and self.source == source
+
+    def load(self, source: Hashable, raw_df, main_df,
+             corpus_key: Hashable = None):
+        """Replace the corpus and drop every derived view.
+
+        corpus_key identifies the content of the corpus, it defaults to the
+        source.
+        """
+        self.source = source
+        self.corpus_key = source if corpus_key is None else corpus_key
+        self.raw_df = raw_df
+        self.main_df = main_df
+        self._store = None
+        self.invalidate()
+
+    def reset(self):
+        """Forget the corpus so that the next run imports it again."""
+        self.load(None, pd.DataFrame(), pd.DataFrame())
+
+    def select(self, assign_id, stu_id, assignments: Sequence[str]):
+        """Set the assignment and student columns and the assignments."""
+        self.assign_id = assign_id
+        self.stu_id = stu_id
+        self.assignments = tuple(assignments)
+
+    @property
+    def store(self) -> CorpusStore:
+        """Index of the corpus by the assignment and student columns."""
+        if (self._store is None
+                or self._store.assign_id != self.assign_id
+                or self._store.stu_id != self.stu_id):
+            self._store = CorpusStore(
+                self.main_df, self.assign_id, self.stu_id, self.raw_df)
+        return self._store
+
+    def query(self, frame=None, students=None, columns=None,
+              dropna=False) -> pd.DataFrame:
+        """Rows of the selected assignments and the students, if given.
+
+        The frame defaults to the processed corpus and must have its rows.
+        """
+        return self.store.select(
+            self.main_df if frame is None else frame,
+            self.assignments, students, columns, dropna,
+        )
+
+    def headings(self):
+        """Raw corpus columns that the selected assignments use."""
+        return self.store.headings(self.assignments)
+
+    @property
+    def selection(self) -> Tuple:
+        """Hashable description of the current selection."""
+        return (self.assign_id, self.stu_id, self.assignments)
+
+    @property
+    def assignment_string(self) -> str:
+        """String display of the selected assignments."""
+        return ", ".join(self.assignments)
+
+    def view_key(
+            self, name: str, *params: Hashable, selected: bool = True
+    ) -> Tuple:
+        """Key of a view, by name, params and, if needed, the selection."""
+        return (name, self.selection if selected else None, params)
+
+    def has_view(
+            self, name: str, *params: Hashable, selected: bool = True
+    ) -> bool:
+        """Whether the view is memoized."""
+        return self.view_key(name, *params, selected=selected) in self._views
+
+    def view(
+            self, name: str, compute: Callable[[], Any], *params: Hashable,
+            selected: bool = True):
+        """Return the memoized view, compute it on the first request.
+
+        The view is keyed by its name, its params and, unless it does not
+        depend on it, the current selection.
+        """
+        key = self.view_key(name, *params, selected=selected)
+        try:
+            self._views.move_to_end(key)
+            return self._views[key]
+        except KeyError:
+            pass
+        value = compute()
+        self._views[key] = value
+        while len(self._views) > self.max_views:
+            self._views.popitem(last=False)
+        return value
+
+    def invalidate(self, name: str = None):
+        """Drop the memoized views with the given name, or all of them."""
+        if name is None:
+            self._views.clear()
+        else:
+            for key in [key for key in self._views if key[0] == name]:
+                del self._views[key]
+
+    def __len__(self) -> int:
+        """Number of memoized views."""
+        return len(self._views)
+
+
+def content_hash(documents) -> str:
+    """Hash of the content of imported documents."""
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps(documents, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def frame_size(frames) -> int:
+    """Memory used by a dataframe or a tuple of dataframes in bytes."""
+    if isinstance(frames, pd.DataFrame):
+        frames = (frames,)
+    return int(sum(
+        frame.memory_usage(index=True, deep=True).sum() for frame in frames
+    ))
+
+
+class CorpusCache:
+    """Read-only corpora shared by every session of the process.
+
+    Corpora are evicted least recently used first once their memory
+    exceeds the budget. The shared vocabulary of their token ids is reset
+    with the cache when a corpus is loaded while it is over its budget. A
+    corpus that is being loaded is loaded only once, sessions that ask for
+    it meanwhile wait for the result.
+    """
+
+    def __init__(
+            self, budget: int = CORPUS_BUDGET * 2 ** 20,
+            sizeof: Callable[[Any], int] = frame_size):
+        """Start empty with a memory budget in bytes."""
+        self.budget = budget
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = (
+            OrderedDict())
+        self._loading: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        """Return the entry and count the hit, must hold the lock."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return entry
+
+    def get_or_load(self, key: Hashable, load: Callable[[], Any]):
+        """Return the cached corpus of the key, load it on a miss."""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry[0]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    return entry[0]
+                self.misses += 1
+            if len(vb.VOCABULARY) > vb.VOCABULARY_BUDGET:
+                # the new corpus starts the next generation of token ids
+                self.clear()
+            try:
+                value = load()
+                self.put(key, value)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return value
+
+    def put(self, key: Hashable, value, size: int = None):
+        """Cache a corpus, a corpus larger than the budget is not kept.
+
+        None, e.g. when nothing could be imported, is not kept either.
+        """
+        if value is None:
+            return
+        if size is None:
+            size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            if size > self.budget:
+                return
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.budget:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached corpus, and the vocabulary if over budget.
+
+        The corpora that sessions still hold encode their token ids again.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            vb.VOCABULARY.trim(vb.VOCABULARY_BUDGET)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss statistics and the memory use of the cache."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size": self.size,
+                "budget": self.budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        """Number of cached corpora."""
+        return len(self._entries)
+
+
+# shared by all the sessions of the streamlit server
+SHARED_CORPUS_CACHE = CorpusCache()
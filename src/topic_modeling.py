@@ -1,23 +1,65 @@
 """Topic modeling."""
-from typing import List, Tuple
+from typing import Callable, List, Tuple
 
 import gensim
+from gensim.models.callbacks import Metric
 import pandas as pd
 import numpy as np
 
 from sklearn.manifold import TSNE
 
+from . import profiling as pr
+from . import vocabulary as vb
+
 # import pickle
 
+PASSES = 10
+# documents whose topics are inferred between two progress reports
+TSNE_CHUNK = 256
 
-# pylint: disable=unused-argument
-def topic_model(tokens, num_topics=5, num_words=4) -> List[Tuple[int, str]]:
-    """Find topics from inout text."""
-    # Create Dictionary by giving id to each word
-    id2word = gensim.corpora.Dictionary(tokens)
 
-    # Term Document Frequency
-    corpus = [id2word.doc2bow(text) for text in tokens]
+class PassCallback(Metric):
+    """Training callback of gensim that calls a function after every pass.
+
+    The function gets the number of finished passes, an exception raised
+    by it stops the training.
+    """
+
+    def __init__(self, function: Callable[[int], None]):
+        """Wrap the function, no metric is logged."""
+        self.function = function
+        self.logger = None
+        self.title = "pass"
+        self.passes = 0
+
+    def get_value(self, **_):
+        """Call the function with the number of finished passes."""
+        self.passes += 1
+        self.function(self.passes)
+
+
+# pylint: disable=unused-argument
+@pr.stage("gensim.lda", documents=pr.first_count)
+def topic_model(
+        tokens, num_topics=5, num_words=4, token_ids=None,
+        on_pass: Callable[[int], None] = None,
+) -> List[Tuple[int, str]]:
+    """Find topics from inout text.
+
+    on_pass is called after every training pass with the number of
+    finished passes, out of PASSES.
+    """
+    if token_ids is None:
+        # Create Dictionary by giving id to each word
+        id2word = gensim.corpora.Dictionary(tokens)
+
+        # Term Document Frequency
+        corpus = [id2word.doc2bow(text) for text in tokens]
+    else:
+        # ids of the shared vocabulary, renumbered for these documents
+        vocabulary_ids, local_ids = vb.local_ids(token_ids)
+        id2word = dict(enumerate(vb.VOCABULARY.decode(vocabulary_ids)))
+        corpus = vb.bag_of_words(local_ids)
 
     # Build LDA model
     ldamodel = gensim.models.ldamodel.LdaModel(
@@ -27,11 +69,14 @@ def topic_model(tokens, num_topics=5, num_words=4) -> List[Tuple[int, str]]:
         random_state=100,
         update_every=1,
         chunksize=10,
-        passes=10,
+        passes=PASSES,
         alpha='symmetric',
         iterations=100,
-        per_word_topics=True
+        per_word_topics=True,
+        callbacks=None if on_pass is None else [PassCallback(on_pass)],
     )
+    # the callback is not part of the trained model
+    ldamodel.callbacks = None
 
     # pickle.dump(corpus, open("corpus.pkl", "wb"))
     # id2word.save("dictionary.gensim")
@@ -75,11 +120,24 @@ def format_topics_sentences(ldamodel, corpus, texts):
     return sent_topics_df
 
 
-def tsne(lda_model, corpus, overall_topic_df, random_state, angle):
-    """Compute tsne and return result in dataframe."""
+# pylint: disable=too-many-arguments
+@pr.stage("sklearn.tsne", documents=lambda _, corpus, *__: len(corpus))
+def tsne(lda_model, corpus, overall_topic_df, random_state, angle,
+         on_step: Callable[[float, str], None] = None):
+    """Compute tsne and return result in dataframe.
+
+    on_step is called with the progress and the step before the topics of
+    every chunk of documents and before the embedding, which is fitted in
+    one call of scikit-learn.
+    """
+    if on_step is None:
+        def on_step(*_):
+            pass
     topic_weights = []
-    for i, row_list in enumerate(lda_model[corpus]):
-        topic_weights.append([w for i, w in row_list[0]])
+    for start in range(0, len(corpus), TSNE_CHUNK):
+        on_step(0.5 * start / len(corpus), "Inferring the topics")
+        for row_list in lda_model[corpus[start:start + TSNE_CHUNK]]:
+            topic_weights.append([w for i, w in row_list[0]])
 
     # Array of topic weights
     arr = pd.DataFrame(topic_weights).fillna(0).values
@@ -97,6 +155,7 @@ def tsne(lda_model, corpus, overall_topic_df, random_state, angle):
     # st.write(topic_num)
 
     # tSNE Dimension Reduction
+    on_step(0.5, "Embedding the topics")
     tsne_model = TSNE(
         n_components=2,
         verbose=1,
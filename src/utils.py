@@ -6,7 +6,9 @@ from textblob import TextBlob
 from . import analyzer as az
 from . import constants as cts
 from . import doc_similarity as ds
+from . import profiling as pr
 from . import summarizer as sz
+from . import vocabulary as vb
 
 
 def return_student_assignment(df, student, assignment, assign_id, stu_id):
@@ -24,8 +26,15 @@ def return_student_assignment(df, student, assignment, assign_id, stu_id):
         raise TypeError(f"{student} or {assignment} is not list or str type")
 
 
-def return_assignment(input_df, column_name, selected):
-    """Return entries where one column matches with selected in dataframe."""
+def return_assignment(input_df, column_name, selected, store=None):
+    """Return entries where one column matches with selected in dataframe.
+
+    With the corpus store of the frame, indexed by the column, the rows
+    are looked up in the index instead of a scan of the column.
+    """
+    if store is not None and store.assign_id == column_name and \
+            isinstance(selected, (list, str)):
+        return store.select(input_df, selected, dropna=True)
     if isinstance(selected, list):
         # a list of selected assignments
         return input_df[input_df[column_name].isin(selected)].dropna(
@@ -40,6 +49,8 @@ def return_assignment(input_df, column_name, selected):
         raise TypeError(f"{selected} is not list or str type")
 
 
+@pr.stage("frequency.students",
+          documents=lambda df, students, *_: len(students))
 def compute_freq_df(df, students, assignments, assign_id, stu_id, freq_range):
     """Compute frequency and return dataframe(df same as freq_to_df)."""
     freq_df = pd.DataFrame()
@@ -48,25 +59,21 @@ def compute_freq_df(df, students, assignments, assign_id, stu_id, freq_range):
     )
     for student in students:
         for assignment in assignments:
-            try:
-                # extract matching combined string
-                combined_string = return_student_assignment(
-                    stu_assignment,
-                    student,
-                    assignment,
-                    assign_id,
-                    stu_id,
-                )[cts.COMBINED].item()
-                # calculate word frequency
-                single_freq = az.word_frequency(
-                    combined_string,
-                    freq_range,
-                )
-                single_df = freq_to_df(single_freq, assignment, student)
-                freq_df = freq_df.append(single_df)
-            except ValueError:
+            # extract matching document
+            document = return_student_assignment(
+                stu_assignment,
+                student,
+                assignment,
+                assign_id,
+                stu_id,
+            )
+            if len(document) != 1:
                 # no matching result of student and assignment
                 continue
+            # calculate word frequency from the token ids
+            single_freq = vb.most_common(vb.token_ids(document), freq_range)
+            single_df = freq_to_df(single_freq, assignment, student)
+            freq_df = freq_df.append(single_df)
     return freq_df
 
 
@@ -91,6 +98,7 @@ def make_questions_df(questions, main_df):
     return question_df
 
 
+@pr.stage("frequency.questions", documents=pr.first_count)
 def compute_quest_df(questions, freq_range, question_df):
     """Compute freq of questions and return dataframe."""
     freq_question_df = pd.DataFrame(columns=["question", "word", "freq"])
@@ -127,25 +135,36 @@ def compute_question_senti(questions, input_df):
     return select_text, questions_senti_df
 
 
-def sim_pair(assignment, doc_df, assign_id, stu_id, model, nlp=None):
-    """Compute similarity score between pairs and return in dataframe."""
-    doc = return_assignment(doc_df, assign_id, assignment)
+# pylint: disable=too-many-arguments
+@pr.stage("similarity.pairs", result_documents=len)
+def sim_pair(assignment, doc_df, assign_id, stu_id, model, nlp=None,
+             on_chunk=None, store=None):
+    """Compute similarity score between pairs and return in dataframe.
+
+    on_chunk is called with the progress of the spacy similarity, store is
+    the corpus store of doc_df.
+    """
+    doc = return_assignment(doc_df, assign_id, assignment, store)
 
     pairs = ds.create_pair(doc[stu_id])
     # calculate similarity of the docs of the selected author pairs
     if model == "tfidf":
+        # first document of every author, like make_tuple
+        positions = {}
+        for position, student in enumerate(doc[stu_id]):
+            positions.setdefault(student, position)
+        vocabulary_ids, local_ids = vb.local_ids(vb.token_ids(doc))
+        matrix = ds.tfidf_pair_similarities(
+            vb.count_matrix(local_ids, len(vocabulary_ids)))
         similarity = [
-            ds.tfidf_cosine_similarity(make_tuple(doc, stu_id, pair))
-            for pair in pairs
+            matrix[positions[pair[0]], positions[pair[1]]] for pair in pairs
         ]
     elif model == "spacy":
-        similarity = [
-            ds.spacy_doc_similarity(
-                nlp,
-                make_tuple(doc, stu_id, pair),
-            )
-            for pair in pairs
-        ]
+        similarity = ds.spacy_similarities(
+            nlp, [make_tuple(doc, stu_id, pair) for pair in pairs],
+            None if on_chunk is None else
+            lambda done: on_chunk(done / len(pairs)),
+        )
     df_sim = pd.DataFrame({"pair": pairs, "similarity": similarity})
     # Split the pair tuple into two columns for plotting
     df_sim[["doc_1", "doc_2"]] = pd.DataFrame(
@@ -162,17 +181,21 @@ def make_tuple(doc, stu_id, pair):
     )
 
 
-def make_freq_df(assignments, main_df, assign_id, freq_range):
-    """Compute frequency and return result in dataframe."""
+@pr.stage("frequency.assignments",
+          documents=lambda _, main_df, *__: len(main_df))
+def make_freq_df(assignments, main_df, assign_id, freq_range, store=None):
+    """Compute frequency and return result in dataframe.
+
+    store is the corpus store of main_df.
+    """
     freq_df = pd.DataFrame(columns=["assignments", "word", "freq"])
     # calculate word frequency of each assignments
     for assignment in assignments:
-        # combined text of the whole assignment
-        combined_text = " ".join(
-            return_assignment(main_df, assign_id, assignment)[cts.NORMAL]
-        )
+        # token ids of the whole assignment
+        token_ids = vb.token_ids(
+            return_assignment(main_df, assign_id, assignment, store))
         item_df = pd.DataFrame(
-            az.word_frequency(combined_text, freq_range),
+            vb.most_common(token_ids, freq_range),
             columns=["word", "freq"],
         )
         item_df["assignments"] = assignment
@@ -180,11 +203,108 @@ def make_freq_df(assignments, main_df, assign_id, freq_range):
     return freq_df
 
 
-def make_summary_df(assignment, input_df, assign_id):
-    """Summarize and return in dataframe."""
-    sum_assignment_df = return_assignment(input_df, assign_id, assignment)
+@pr.stage("gensim.summary", documents=lambda _, input_df, *__: len(input_df))
+def make_summary_df(assignment, input_df, assign_id, store=None):
+    """Summarize and return in dataframe, store is that of input_df."""
+    sum_assignment_df = return_assignment(
+        input_df, assign_id, assignment, store)
     for column in sum_assignment_df.columns[2:]:
         sum_assignment_df[column] = sum_assignment_df[column].apply(
             lambda x: sz.summarize_text(x)
         )
     return sum_assignment_df
+
+
+@pr.stage("corpus.make", result_documents=lambda frames: len(frames[1]))
+def make_corpus(json_lst, compact=False):
+    """Parse the retreived data into the raw and processed dataframes."""
+    raw_df = pd.DataFrame()
+    # construct each assignment as a dataframe
+    # concat into a main dataframe
+    for item in json_lst:
+        single_df = pd.DataFrame(item)
+        # NA as `nan`
+        raw_df = pd.concat([raw_df, single_df], ignore_index=True)
+    # NA as ""
+    processed_df = raw_df.fillna("")
+    df_preprocess(processed_df, compact=compact)
+    if compact:
+        raw_df = compact_df(raw_df)
+    return raw_df, processed_df
+
+
+def compact_corpus(raw_df, main_df):
+    """Compact the raw and processed dataframes of a corpus."""
+    return compact_df(raw_df), compact_df(main_df)
+
+
+def string_dtype():
+    """Arrow backed string dtype, python strings without pyarrow."""
+    try:
+        return pd.StringDtype("pyarrow")
+    except (ImportError, TypeError):
+        return pd.StringDtype()
+
+
+def compact_df(df, key_columns=2):
+    """Store repeated labels as categoricals and text as string arrays.
+
+    The first columns (assignment and student names) become categoricals,
+    the other text columns, headings and the combined and normalized text,
+    use the arrow backed string dtype. Tokens are kept as they are.
+    """
+    text_dtype = string_dtype()
+    compacted = df.copy(deep=False)
+    for position, column in enumerate(df.columns):
+        values = df[column]
+        if position < key_columns:
+            compacted[column] = values.astype("category")
+        elif column not in (cts.TOKEN, cts.TOKEN_IDS) and (
+                values.dtype == object
+                or pd.api.types.is_string_dtype(values.dtype)):
+            compacted[column] = values.astype(text_dtype)
+    return compacted
+
+
+@pr.stage("corpus.preprocess", documents=pr.first_count)
+def df_preprocess(df, compact=False):
+    """Build and preprocess (combine, normalize, tokenize) text."""
+    # filter out first two columns -- non-report content
+    # (student and assignment name)
+    cols = df.columns[2:]
+    # combining text into combined column
+    df[cts.COMBINED] = df[cols].apply(
+        lambda row: "\n".join(row.values.astype(str)), axis=1
+    )
+    # normalize
+    df[cts.NORMAL] = df[cts.COMBINED].apply(lambda row: az.normalize(row))
+    # tokenize, the documents are processed by spacy in batches
+    df[cts.TOKEN] = pd.Series(
+        az.tokenize_texts(df[cts.NORMAL]), index=df.index, dtype=object
+    )
+    # token ids of the shared vocabulary
+    vb.add_token_ids(df)
+    if compact:
+        for column, values in compact_df(df).items():
+            df[column] = values
+
+
+@pr.stage("textblob.sentiment", documents=pr.first_count)
+def make_senti_df(main_df):
+    """Corpus with the polarized words and the sentiment of each entry."""
+    positive, negative = az.top_polarized_word(main_df[cts.TOKEN].values)
+    # calculate overall sentiment from the combined text
+    polarity = [
+        TextBlob(text).sentiment.polarity
+        for text in az.lemmatized_texts(main_df[cts.COMBINED])
+    ]
+    # the new columns are joined to the corpus without copying it
+    senti_columns = pd.DataFrame(
+        {
+            cts.POSITIVE: positive.values,
+            cts.NEGATIVE: negative.values,
+            cts.SENTI: polarity,
+        },
+        index=main_df.index,
+    )
+    return pd.concat([main_df, senti_columns], axis=1, copy=False)
@@ -241,3 +241,26 @@ def tp_scatter_plot(df_lda):
         color='topic_num:N',
     ).interactive()
     return lda
+
+
+def cooccurrence_network(nodes, links):
+    """Network of the terms that occur together, wider edges more often."""
+    axis = alt.Axis(title=None, labels=False, ticks=False, grid=False)
+    edges = alt.Chart(links).mark_rule(opacity=0.4).encode(
+        x=alt.X("x", axis=axis),
+        y=alt.Y("y", axis=axis),
+        x2="x2",
+        y2="y2",
+        strokeWidth=alt.Size("weight", legend=None),
+        tooltip=["source", "target", "weight"],
+    )
+    points = alt.Chart(nodes).mark_circle(opacity=0.8).encode(
+        x="x",
+        y="y",
+        size=alt.Size("degree", legend=None),
+        tooltip=["term", "degree"],
+    )
+    labels = alt.Chart(nodes).mark_text(dy=-10).encode(
+        x="x", y="y", text="term")
+    return (edges + points + labels).properties(
+        width=700, height=600).interactive()
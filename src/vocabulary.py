@@ -0,0 +1,214 @@
+"""Shared vocabulary that interns tokens as integer ids."""
+import os
+import threading
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from . import constants as cts
+
+ID_DTYPE = np.int32
+# distinct tokens kept before the vocabulary is reset with the corpus cache
+VOCABULARY_BUDGET = int(os.environ.get("GATOR_VOCABULARY_BUDGET", 2000000))
+# generation of the vocabulary that encoded the token ids of a frame
+GENERATION = "vocabulary_generation"
+
+
+class Vocabulary:
+    """Append-only mapping between tokens and integer ids.
+
+    Every token is hashed once, when it is first seen, and documents are
+    then stored as int32 arrays of ids. The ids are stable, so arrays of
+    different corpora and sessions of the process can be counted together,
+    until the vocabulary is reset. A reset starts a new generation, the ids
+    of an older one are encoded again.
+    """
+
+    def __init__(self):
+        """Start with an empty vocabulary."""
+        # generation, words and ids, replaced at once by a reset so that
+        # the readers without the lock see the words and ids of one
+        # generation
+        self._state: Tuple[int, List[str], Dict[str, int]] = (0, [], {})
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        """Number of resets of the vocabulary."""
+        return self._state[0]
+
+    @property
+    def words(self) -> List[str]:
+        """Token of every id of the current generation."""
+        return self._state[1]
+
+    @property
+    def ids(self) -> Dict[str, int]:
+        """Id of every token of the current generation."""
+        return self._state[2]
+
+    def reset(self) -> None:
+        """Forget every token and start a new generation of ids."""
+        with self._lock:
+            self._state = (self._state[0] + 1, [], {})
+
+    def trim(self, budget: int = VOCABULARY_BUDGET) -> bool:
+        """Reset the vocabulary if it has more tokens than the budget."""
+        if len(self) <= budget:
+            return False
+        self.reset()
+        return True
+
+    def encode(self, tokens: Sequence[str]) -> np.ndarray:
+        """Ids of the tokens of a document, new tokens are added."""
+        ids = self._state[2]
+        try:
+            # the tokens are usually known already
+            return np.array([ids[token] for token in tokens], dtype=ID_DTYPE)
+        except KeyError:
+            pass
+        with self._lock:
+            _, words, ids = self._state
+            encoded = []
+            for token in tokens:
+                token_id = ids.get(token)
+                if token_id is None:
+                    # the word is there before readers without the lock
+                    # can find its id
+                    words.append(token)
+                    token_id = ids[token] = len(words) - 1
+                encoded.append(token_id)
+        return np.array(encoded, dtype=ID_DTYPE)
+
+    def encode_many(self, documents: Iterable[Sequence[str]]) -> \
+            List[np.ndarray]:
+        """Ids of the tokens of every document."""
+        return [self.encode(tokens) for tokens in documents]
+
+    def decode(self, token_ids: Sequence[int],
+               generation: int = None) -> List[str]:
+        """Tokens of the ids, as the interned strings of the vocabulary.
+
+        Ids of another generation than the given one raise a ValueError
+        instead of decoding to other tokens.
+        """
+        with self._lock:
+            current, words, _ = self._state
+        if generation is not None and generation != current:
+            raise ValueError(
+                f"Token ids of generation {generation} of the vocabulary, "
+                f"now at {current}")
+        return [words[token_id] for token_id in token_ids]
+
+    def __len__(self) -> int:
+        """Number of distinct tokens."""
+        return len(self._state[1])
+
+
+def encode_current(vocabulary: "Vocabulary",
+                   documents: Sequence[Sequence[str]]) -> \
+        Tuple[int, List[np.ndarray]]:
+    """Generation and ids of documents that are all of that generation."""
+    while True:
+        generation = vocabulary.generation
+        ids = vocabulary.encode_many(documents)
+        # encoded again when the vocabulary was reset meanwhile
+        if vocabulary.generation == generation:
+            return generation, ids
+
+
+# shared by all the corpora of the process
+VOCABULARY = Vocabulary()
+
+
+def token_ids(main_df: pd.DataFrame, vocabulary: Vocabulary = VOCABULARY) \
+        -> List[np.ndarray]:
+    """Token ids of the documents, encoded now if the corpus has none.
+
+    The ids are those of the generation of the vocabulary stored with the
+    corpus, ids of another generation or without one are encoded again.
+    """
+    if cts.TOKEN_IDS in main_df.columns and main_df.attrs.get(
+            GENERATION) == vocabulary.generation:
+        return list(main_df[cts.TOKEN_IDS])
+    return encode_current(vocabulary, main_df[cts.TOKEN])[1]
+
+
+def add_token_ids(main_df: pd.DataFrame,
+                  vocabulary: Vocabulary = VOCABULARY) -> None:
+    """Store the token ids next to the tokens, which are interned.
+
+    The generation of the vocabulary of the ids is stored with them.
+    """
+    while True:
+        generation, ids = encode_current(vocabulary, main_df[cts.TOKEN])
+        try:
+            # the token lists share the strings of the vocabulary
+            tokens = [vocabulary.decode(document, generation)
+                      for document in ids]
+            break
+        except ValueError:
+            continue
+    main_df[cts.TOKEN_IDS] = pd.Series(ids, index=main_df.index, dtype=object)
+    main_df[cts.TOKEN] = pd.Series(tokens, index=main_df.index, dtype=object)
+    main_df.attrs[GENERATION] = generation
+
+
+def concatenate(id_arrays: Sequence[np.ndarray]) -> np.ndarray:
+    """One array of the token ids of several documents."""
+    if len(id_arrays) == 0:
+        return np.empty(0, dtype=ID_DTYPE)
+    return np.concatenate(id_arrays).astype(ID_DTYPE, copy=False)
+
+
+def most_common(id_arrays: Sequence[np.ndarray], amount=50,
+                vocabulary: Vocabulary = VOCABULARY) -> List[Tuple[str, int]]:
+    """Most frequent tokens of documents, like Counter.most_common.
+
+    Tokens with the same count are ordered by their first occurrence.
+    """
+    all_ids = concatenate(id_arrays)
+    unique, first, counts = np.unique(
+        all_ids, return_index=True, return_counts=True)
+    order = np.lexsort((first, -counts))[:amount]
+    return [
+        (vocabulary.words[unique[index]], int(counts[index]))
+        for index in order
+    ]
+
+
+def local_ids(id_arrays: Sequence[np.ndarray]) -> \
+        Tuple[np.ndarray, List[np.ndarray]]:
+    """Renumber the ids of documents from 0 to their number of tokens.
+
+    Return the vocabulary ids of the local ids and the local id arrays.
+    """
+    if len(id_arrays) == 0:
+        return np.empty(0, dtype=ID_DTYPE), []
+    all_ids = concatenate(id_arrays)
+    unique, inverse = np.unique(all_ids, return_inverse=True)
+    bounds = np.cumsum([len(ids) for ids in id_arrays])[:-1]
+    return unique, np.split(inverse.reshape(-1).astype(ID_DTYPE), bounds)
+
+
+def bag_of_words(local_arrays: Sequence[np.ndarray]) -> \
+        List[List[Tuple[int, int]]]:
+    """Gensim bag of words of every document, from local ids."""
+    corpus = []
+    for ids in local_arrays:
+        unique, counts = np.unique(ids, return_counts=True)
+        corpus.append(list(zip(unique.tolist(), counts.tolist())))
+    return corpus
+
+
+def count_matrix(local_arrays: Sequence[np.ndarray], num_terms: int):
+    """Sparse document-term count matrix, from local ids."""
+    lengths = [len(ids) for ids in local_arrays]
+    rows = np.repeat(np.arange(len(local_arrays)), lengths)
+    columns = concatenate(local_arrays)
+    return sparse.csr_matrix(
+        (np.ones(len(columns), dtype=np.float64), (rows, columns)),
+        shape=(len(local_arrays), num_terms),
+    )
@@ -3,40 +3,63 @@
 import re
 import base64
 import os
+import secrets
+import time
+import numpy as np
 import pandas as pd
 import spacy
 import streamlit as st
 from textblob import TextBlob
 
 import src.analyzer as az
+import src.batch as bt
 import src.constants as cts
+import src.cooccurrence as co
+import src.corpus_file as cf
 import src.get_handler as gh
+import src.jobs as jb
 import src.json_util as ju
 import src.markdown as md
+import src.model_server as ms
+import src.ngrams as ng
+import src.profiling as pr
+import src.search as sr
+import src.session as ss
 import src.summarizer as sz
 import src.topic_modeling as tm
 import src.visualization as vis
 import src.utils as ut
+import src.vocabulary as vb
 
 
 # resources/sample_reflections/lab1, resources/sample_reflections/lab2
 
-# initialize main_df
 SPACY_MODEL_NAMES = ["en_core_web_sm", "en_core_web_md"]
-main_df = pd.DataFrame()
-selected_df = pd.DataFrame()
-selected_nan_df = pd.DataFrame()
-assignments = None
-assignment_string = None
-stu_id = None
-assign_id = None
-success_msg = None
+# seconds between two progress updates of a background job
+POLL_INTERVAL = 0.25
+# keyword-in-context rows shown by the search page
+SEARCH_ROWS = 200
+# browser sessions whose analysis context is kept, and their url parameter
+MAX_SESSIONS = 32
+SESSION_PARAM = "session"
+CONTEXTS = {"Window of words": co.WINDOW, "Sentence": None, "Reflection": None}
+# sentences tokenized between two progress reports
+SENTENCE_CHUNK = 1000
+PHRASE_MEASURES = {
+    "Frequency": "frequency",
+    "PMI": "pmi",
+    "Likelihood ratio": "likelihood",
+}
 debug_mode = False
-main_md_dict = None
 
 
 def main():
     """Main streamlit function."""
+    # the stages of the pages are timed in debug mode, or when asked for
+    if debug_mode:
+        pr.PROFILE.enable(os.environ.get(pr.LOG_ENV))
+    else:
+        pr.enable_from_env()
     # Title
     st.sidebar.title("Welcome to GatorMiner!")
     data_retreive_method = st.sidebar.selectbox(
@@ -47,7 +70,8 @@ def main():
             "File uploader",
         ],
     )
-    if retreive_data(data_retreive_method):
+    context, success_msg = retreive_data(data_retreive_method)
+    if context is not None:
         analysis_mode = st.sidebar.selectbox(
             "Choose the analysis mode",
             [
@@ -56,38 +80,64 @@ def main():
                 "Sentiment Analysis",
                 "Entity Analysis",
                 "Document Similarity",
+                "Co-occurrence Network",
                 "Summary",
                 "Topic Modeling",
+                "Search",
                 "Interactive",
             ],
         )
         if debug_mode:
-            st.write(main_df)
+            st.write(context.main_df)
+            st.sidebar.write(ss.SHARED_CORPUS_CACHE.stats())
         if analysis_mode == "Home":
             landing_src()
         else:
             if analysis_mode == "Frequency Analysis":
                 st.title(analysis_mode)
-                frequency()
+                frequency(context)
             elif analysis_mode == "Sentiment Analysis":
                 st.title(analysis_mode)
-                sentiment()
+                sentiment(context)
             elif analysis_mode == "Document Similarity":
                 st.title(analysis_mode)
-                doc_sim()
+                doc_sim(context)
+            elif analysis_mode == "Co-occurrence Network":
+                st.title(analysis_mode)
+                cooccurrence(context)
             elif analysis_mode == "Summary":
                 st.title(analysis_mode)
-                summary()
+                summary(context)
             elif analysis_mode == "Topic Modeling":
                 st.title(analysis_mode)
-                tpmodel()
+                tpmodel(context)
+            elif analysis_mode == "Search":
+                st.title(analysis_mode)
+                search(context)
             elif analysis_mode == "Interactive":
                 st.title(analysis_mode)
                 interactive()
             elif analysis_mode == "Entity Analysis":
                 st.title(analysis_mode)
-                entities()
-            success_msg.empty()
+                entities(context)
+            if success_msg is not None:
+                success_msg.empty()
+    if debug_mode:
+        profile_sidebar()
+
+
+def profile_sidebar():
+    """Time, calls and documents of the stages since the server started."""
+    st.sidebar.subheader("Stage timings")
+    if st.sidebar.button("Reset the stage timings"):
+        pr.PROFILE.reset()
+    st.sidebar.table(pd.DataFrame(pr.PROFILE.summary()))
+
+
+@pr.stage("altair.render")
+def altair_chart(chart):
+    """Render an Altair chart, timed as a stage of the page."""
+    st.altair_chart(chart)
 
 
 def landing_src():
@@ -120,7 +170,8 @@ def input_sidebar_display(data_retreive):
     """Display and get input through sidebar textbox."""
     if data_retreive == "Path input":
         input_assignments = st.sidebar.text_input(
-            "Enter path(s) to markdown documents (seperate by comma)"
+            "Enter path(s) to markdown documents or zip/tar archives \
+(seperate by comma)"
         )
     elif data_retreive == "AWS":
         input_assignments = st.sidebar.text_input(
@@ -144,100 +195,291 @@ environment variables"
         return False
 
 
+@st.cache(allow_output_mutation=True, max_entries=MAX_SESSIONS)
+def session_contexts(token):
+    """Analysis context of the browser session with the token."""
+    return ss.AnalysisContext()
+
+
+def session_context():
+    """Return the analysis context of the current browser session."""
+    if hasattr(st, "session_state"):
+        store = st.session_state
+        if "gatorminer_context" not in store:
+            store["gatorminer_context"] = ss.AnalysisContext()
+        return store["gatorminer_context"]
+    # streamlit < 0.84 has no session state, the session is a token in the
+    # query of its url, which reruns and reloads keep
+    params = st.experimental_get_query_params()
+    token = params.get(SESSION_PARAM, [None])[0]
+    if token is None:
+        token = secrets.token_hex(16)
+        params[SESSION_PARAM] = token
+        st.experimental_set_query_params(**params)
+    return session_contexts(token)
+
+
+@pr.stage("page.import")
 def retreive_data(data_retreive):
     """Pipeline to retrieve data from user input to output."""
-    global main_df
+    context = session_context()
     input_assignments = input_sidebar_display(data_retreive)
     if input_assignments:
+        options = import_options(data_retreive)
+        if st.sidebar.button("Reload data"):
+            # explicit invalidation of the corpus and every derived view
+            context.reset()
+        source = (
+            data_retreive,
+            tuple(source_key(path) for path in input_assignments),
+            options,
+        )
         try:
-            raw_df, main_df = import_data(data_retreive, input_assignments)
+            if not context.is_loaded(source):
+                corpus_key, (raw_df, main_df) = import_data(
+                    data_retreive, input_assignments, dict(options), source
+                )
+                context.load(source, raw_df, main_df, corpus_key)
         except TypeError:
             st.sidebar.warning(
                 "No data imported. Please check the reflection document input"
             )
             landing_src()
         else:
-            global success_msg
-            global assign_id
-            global assignments
-            global assignment_string
-            global stu_id
-            global selected_nan_df
-            global selected_df
+            main_df = context.main_df
             success_msg = None
             if main_df.empty is not True:
                 success_msg = st.sidebar.success("Sucessfully Loaded!!")
+                export_corpus(context)
             # Column name of assignment and student names
             # assignment default index 0
-            assign_id = st.sidebar.selectbox("Choose the assignment column", main_df.columns, index=0)
+            assign_id = st.sidebar.selectbox(
+                "Choose the assignment column", main_df.columns, index=0
+            )
             # student default index 1
-            stu_id = st.sidebar.selectbox("Choose the student column", main_df.columns, index=1)
+            stu_id = st.sidebar.selectbox(
+                "Choose the student column", main_df.columns, index=1
+            )
             # selected assignments
             assignments = st.sidebar.multiselect(
                 label="Select assignments below:",
                 options=main_df[assign_id].unique(),
             )
-            selected_nan_df = ut.return_assignment(
-                raw_df, assign_id, assignments
-            )
-            selected_df = ut.return_assignment(main_df, assign_id, assignments)
-            # string display of the selected assignments
-            assignment_string = ", ".join(assignments)
-            return True
+            context.select(assign_id, stu_id, assignments)
+            return context, success_msg
+    return None, None
+
+
+def export_corpus(context):
+    """Export the preprocessed corpus to an arrow file and link to it.
+
+    The file is written in the cache directory, where it can also be
+    entered as a path, and offered as a download link.
+    """
+    if cf.pa is None:
+        return
+    if st.sidebar.checkbox("Export preprocessed corpus", value=False):
+        path = context.view(
+            "corpus_file",
+            lambda: cf.write_corpus(
+                context.raw_df, context.main_df, os.path.join(
+                    cts.CACHE_DIR, "exports",
+                    ss.content_hash(context.corpus_key) + cts.ARROW_EXT)),
+            selected=False,
+        )
+        with open(path, "rb") as corpus_file:
+            corpus_bin = base64.b64encode(corpus_file.read()).decode()
+        st.sidebar.markdown(
+            f'<a href="data:application/octet-stream;base64,{corpus_bin}" '
+            f'download="corpus{cts.ARROW_EXT}">Download corpus</a>',
+            unsafe_allow_html=True,
+        )
+        st.sidebar.write(f"Saved to {path}")
+
+
+def source_key(path):
+    """Hashable key of a path or an uploaded file."""
+    if isinstance(path, str):
+        return path
+    return (path.name, path.size)
+
+
+def selected_df(context, raw=False):
+    """Entries of the selected assignments, the raw ones keep NA."""
+    input_df = context.raw_df if raw else context.main_df
+    return context.view(
+        "selected", lambda: context.query(input_df, dropna=True), raw)
+
+
+def batch_analysis(context, dataset):
+    """Analysis precomputed by the batch mode for the corpus, else None.
+
+    The batch analysis groups the documents by the first two columns of
+    the corpus, so its results only stand for the pages with these
+    columns selected.
+    """
+    if (context.source is None or context.source[0] != "Path input"
+            or (context.assign_id, context.stu_id)
+            != tuple(context.raw_df.columns[:2])):
+        return None
+    paths = context.source[1]
+    return context.view(
+        "batch_analysis",
+        lambda: bt.load_analysis(paths, dataset),
+        dataset,
+        selected=False,
+    )
+
+
+def background_view(context, name, compute, *params, selected=True):
+    """Return the memoized view, computed by a background job.
+
+    compute(job) runs off the script thread and reports its progress, which
+    is shown until the job is done. A rerun with the same inputs keeps
+    waiting on the same job, as do other sessions that ask for it, and the
+    job of the page is cancelled when its inputs change.
+    """
+    if context.has_view(name, *params, selected=selected):
+        return context.view(name, None, *params, selected=selected)
+    # the corpus is shared by the sessions that loaded the same documents
+    key = (context.corpus_key,) + context.view_key(
+        name, *params, selected=selected)
+    waiter = (id(context), name)
+    job = jb.RUNNER.submit(key, compute, waiter)
+    progress_bar = st.progress(0)
+    status = st.empty()
+    while not job.done():
+        progress_bar.progress(int(job.progress * 100))
+        status.text(job.message)
+        time.sleep(POLL_INTERVAL)
+    progress_bar.empty()
+    status.empty()
+    jb.RUNNER.release(waiter)
+    result = job.result()
+    return context.view(name, lambda: result, *params, selected=selected)
 
 
 @st.cache(allow_output_mutation=True)
 def load_model(name):
-    """Load spacy model."""
+    """Load spacy model, or connect to it on the model server."""
+    remote = ms.remote_model(name)
+    if remote is not None:
+        return remote
     return spacy.load(name)
 
 
-@st.cache(allow_output_mutation=True, suppress_st_warning=True)
-def import_data(data_retreive_method, paths):
-    """Pipeline to import data from local or aws."""
-    global main_md_dict
+def import_options(data_retreive_method):
+    """Display the import options of the method and return them."""
+    # categorical labels and arrow strings for large courses
+    compact = (
+        ("compact", st.sidebar.checkbox("Compact memory mode", value=False)),
+    )
     if data_retreive_method == "Path input":
-        json_lst = path_import(paths)
-    elif data_retreive_method == "AWS":
-        json_lst = aws_import(paths)
+        return (
+            ("assignment_from_dir", st.sidebar.checkbox(
+                "Use folder names as assignment names", value=False
+            )),
+        ) + compact
+    if data_retreive_method == "AWS":
+        cache_configs = gh.cache_config()
+        return (
+            ("passbuild", st.sidebar.checkbox(
+                "Only retreive build success records", value=True
+            )),
+            ("offline", st.sidebar.checkbox(
+                "Replay cached responses (offline)",
+                value=cache_configs["offline"],
+            )),
+        ) + compact
+    return compact
+
+
+def import_data(data_retreive_method, paths, options, source=None):
+    """Pipeline to import data from local or aws.
+
+    The dataframes are shared with the other sessions that import the same
+    documents from the same source. Return the key of the corpus in the
+    shared cache and its dataframes.
+    """
+    compact = options.pop("compact", False)
+    if data_retreive_method == "Path input" and all(
+            cf.is_corpus_file(path) for path in paths):
+        # exported corpus files are memory-mapped instead of parsed
+        key = (source, ss.content_hash(cf.file_signature(paths)))
+        return key, ss.SHARED_CORPUS_CACHE.get_or_load(
+            key, lambda: load_corpus(cf.load_corpus, paths, compact))
+    if data_retreive_method == "Path input" and all(
+            bt.is_batch_output(path) for path in paths):
+        # corpora preprocessed by the batch analysis are loaded as they are
+        manifests = [bt.load_manifest(path) for path in paths]
+        key = (source, ss.content_hash(manifests))
+        return key, ss.SHARED_CORPUS_CACHE.get_or_load(
+            key, lambda: load_corpus(bt.load_corpus, paths, compact))
+    if data_retreive_method == "Path input":
+        # the files are only stated, a hit skips reading and parsing them
+        try:
+            key = (source, ss.content_hash(cf.tree_signature(paths)))
+        except FileNotFoundError as err:
+            st.sidebar.error(err)
+            return None
+
+        def load():
+            json_lst = path_import(paths, **options)
+            return ut.make_corpus(json_lst, compact=compact) \
+                if json_lst else None
+
+        frames = ss.SHARED_CORPUS_CACHE.get_or_load(key, load)
+        return None if frames is None else (key, frames)
+    if data_retreive_method == "AWS":
+        json_lst = aws_import(paths, **options)
     else:
         json_lst = file_uploader_import(paths)
-    # when data is retreived, parse into dataframe
     if json_lst:
-        raw_df = pd.DataFrame()
-        # construct each assignment as a dataframe
-        # concat into a main dataframe
-        for item in json_lst:
-            single_df = pd.DataFrame(item)
-            # NA as `nan`
-            raw_df = pd.concat([raw_df, single_df], ignore_index=True)
-        # NA as ""
-        processed_df = raw_df.fillna("")
-        df_preprocess(processed_df)
-        return raw_df, processed_df
-
-
-def path_import(paths):
+        key = (source, ss.content_hash(json_lst))
+        return key, ss.SHARED_CORPUS_CACHE.get_or_load(
+            key, lambda: ut.make_corpus(json_lst, compact=compact))
+    return None
+
+
+def load_corpus(load, paths, compact=False):
+    """Load a preprocessed corpus, compacted if asked."""
+    raw_df, main_df = load(paths)
+    if compact:
+        return ut.compact_corpus(raw_df, main_df)
+    return raw_df, main_df
+
+
+def path_import(paths, assignment_from_dir=False):
     """Read and compile files from given path."""
     json_lst = []
     try:
         for path in paths:
-            json_lst.append(md.collect_md(path))
+            if md.is_archive(path):
+                json_lst.append(md.collect_md_archive(path))
+            elif ju.is_report_path(path):
+                # json/ndjson report exports are parsed report by report
+                json_lst.append(ju.reports_frame(ju.stream_reports(path)))
+            else:
+                # one traversal of a course with a folder per assignment
+                json_lst.extend(md.collect_md_tree(
+                    path, assignment_from_dir=assignment_from_dir))
         return json_lst
     except FileNotFoundError as err:
         st.sidebar.error(err)
 
 
-def aws_import(paths):
+def aws_import(paths, passbuild=True, offline=False):
     """Read and compile documents from aws."""
     json_lst = []
-    passbuild = st.sidebar.checkbox(
-            "Only retreive build success records", value=True
-        )
+    cache_configs = gh.cache_config()
+    cache_configs["offline"] = offline
     try:
-        configs = gh.auth_config()
-        for path in paths:
-            response = gh.get_request(path, passbuild, **configs)
+        configs = gh.auth_config(offline=cache_configs["offline"])
+        # fetch all the assignments concurrently over one pooled session,
+        # serving unchanged assignments from the local response cache
+        responses = gh.get_requests(
+            paths, passbuild, **configs, **cache_configs)
+        for response in responses:
             json_lst.append(ju.clean_report(response))
         return json_lst
     except (EnvironmentError, Exception) as err:
@@ -257,29 +499,17 @@ def file_uploader_import(paths):
         st.sidebar.error(err)
 
 
-def df_preprocess(df):
-    """Build and preprocess (combine, normalize, tokenize) text."""
-    # filter out first two columns -- non-report content
-    # (student and assignment name)
-    cols = df.columns[2:]
-    # combining text into combined column
-    df[cts.COMBINED] = df[cols].apply(
-        lambda row: "\n".join(row.values.astype(str)), axis=1
-    )
-    # normalize
-    df[cts.NORMAL] = df[cts.COMBINED].apply(lambda row: az.normalize(row))
-    # tokenize
-    df[cts.TOKEN] = df[cts.NORMAL].apply(lambda row: az.tokenize(row))
-
-
-def frequency():
+@pr.stage("page.frequency")
+def frequency(context):
     """Main function for frequency analysis."""
     freq_type = st.sidebar.selectbox(
-        "Type of frequency analysis", ["Overall", "Student", "Question"]
+        "Type of frequency analysis",
+        ["Overall", "Student", "Question", "Phrase"],
     )
     range_select_msg = "Select a range of most frequent words"
     freq_msg = "Most frequent words"
-    if not assignments:
+    assignment_string = context.assignment_string
+    if not context.assignments:
         st.warning("Please select an assignment for the analysis")
     elif freq_type == "Overall":
         freq_range = st.sidebar.slider(range_select_msg, 1, 50, value=25)
@@ -287,51 +517,79 @@ def frequency():
             'To continue see individual frequency analysis select "Student"'
         )
         st.header(f"{freq_msg} in **{assignment_string}**")
-        overall_freq(freq_range)
+        overall_freq(context, freq_range)
     elif freq_type == "Student":
         freq_range = st.sidebar.slider(range_select_msg, 1, 20, value=10)
         st.header(
             f"{freq_msg} by individual students in **{assignment_string}**"
         )
-        student_freq(freq_range)
+        student_freq(context, freq_range)
     elif freq_type == "Question":
         freq_range = st.sidebar.slider(range_select_msg, 1, 20, value=10)
         st.header(
             f"{freq_msg} in individual questions in **{assignment_string}**"
         )
-        question_freq(freq_range)
+        question_freq(context, freq_range)
+    elif freq_type == "Phrase":
+        freq_range = st.sidebar.slider(
+            "Select a range of most frequent phrases", 1, 20, value=10
+        )
+        st.header(f"Most frequent phrases in **{assignment_string}**")
+        phrase_freq(context, freq_range)
 
 
-def overall_freq(freq_range):
+def overall_freq(context, freq_range):
     """Page fore overall word frequency."""
     plots_range = st.sidebar.slider(
         "Select the number of plots per row", 1, 5, value=3
     )
-    freq_df = ut.make_freq_df(assignments, main_df, assign_id, freq_range)
+    assignments = list(context.assignments)
+
+    def compute():
+        precomputed = batch_analysis(context, "frequency")
+        if precomputed is None:
+            return ut.make_freq_df(
+                assignments, context.main_df, context.assign_id, freq_range,
+                context.store,
+            )
+        return bt.top_frequency(
+            precomputed, assignments, context.assign_id, freq_range)
+
+    freq_df = context.view("frequency", compute, freq_range)
     # plot all the subplots of different assignments
-    st.altair_chart(
+    altair_chart(
         vis.facet_freq_barplot(
             freq_df, assignments, "assignments", plots_per_row=plots_range
         )
     )
 
 
-def student_freq(freq_range):
+def student_freq(context, freq_range):
     """Page for individual student's word frequency."""
     students = st.multiselect(
         label="Select specific students below:",
-        options=selected_df[stu_id].unique(),
+        options=selected_df(context)[context.stu_id].unique(),
     )
 
     plots_range = st.sidebar.slider(
         "Select the number of plots per row", 1, 5, value=3
     )
     if len(students) != 0:
-        freq_df = ut.compute_freq_df(
-            main_df, students, assignments, assign_id, stu_id, freq_range
+        freq_df = context.view(
+            "student_frequency",
+            lambda: ut.compute_freq_df(
+                context.main_df,
+                students,
+                list(context.assignments),
+                context.assign_id,
+                context.stu_id,
+                freq_range,
+            ),
+            tuple(students),
+            freq_range,
         )
 
-        st.altair_chart(
+        altair_chart(
             vis.facet_freq_barplot(
                 freq_df,
                 students,
@@ -342,25 +600,31 @@ def student_freq(freq_range):
         )
 
 
-def question_freq(freq_range):
+def question_freq(context, freq_range):
     """Page for individual question's word frequency."""
-    # drop columns with all na
+    # only the questions of the selected assignments
     questions = st.multiselect(
         label="Select specific questions below:",
-        options=selected_nan_df.columns[2:],
+        options=context.headings()[2:],
     )
 
     plots_range = st.sidebar.slider(
         "Select the number of plots per row", 1, 5, value=1
     )
 
-    question_df = ut.make_questions_df(questions, main_df)
     if len(questions) != 0:
-        freq_question_df = ut.compute_quest_df(
-            questions, freq_range, question_df
+        freq_question_df = context.view(
+            "question_frequency",
+            lambda: ut.compute_quest_df(
+                questions,
+                freq_range,
+                ut.make_questions_df(questions, context.main_df),
+            ),
+            tuple(questions),
+            freq_range,
         )
 
-        st.altair_chart(
+        altair_chart(
             vis.facet_freq_barplot(
                 freq_question_df,
                 questions,
@@ -370,52 +634,141 @@ def question_freq(freq_range):
         )
 
 
-def sentiment():
-    """Main function for sentiment analysis."""
-    senti_df = main_df.copy(deep=True)
-    # Initializing the new columns with a numpy array, so the entire series is returned
-    senti_df[cts.POSITIVE], senti_df[cts.NEGATIVE] = az.top_polarized_word(
-        senti_df[cts.TOKEN].values
+def ngram_counts(context):
+    """N-gram counts of the reflections, built once per corpus in a job."""
+    main_df = context.main_df
+
+    def count(job):
+        job.report(0, "Counting the phrases of the reflections")
+        return ng.NgramCounts(vb.token_ids(main_df))
+
+    return background_view(context, "ngram_counts", count, selected=False)
+
+
+def question_ngram_counts(context):
+    """Labels and n-gram counts of the answers of the indexed corpus."""
+    index = search_index(context)
+
+    def count(job):
+        job.report(0, "Counting the phrases of the answers")
+        labels, id_arrays = index.answers()
+        return labels, ng.NgramCounts(id_arrays)
+
+    return background_view(
+        context, "question_ngram_counts", count, selected=False)
+
+
+def phrase_freq(context, freq_range):
+    """Page for the frequency and collocations of phrases."""
+    length = st.sidebar.selectbox("Number of words in a phrase", [2, 3])
+    measure = st.sidebar.selectbox("Score", list(PHRASE_MEASURES))
+    group_type = st.sidebar.selectbox(
+        "Phrases by", ["Assignment", "Student", "Question"]
     )
+    plots_range = st.sidebar.slider(
+        "Select the number of plots per row", 1, 5, value=3
+    )
+    assignments = list(context.assignments)
+    if group_type == "Assignment":
+        counts = ngram_counts(context)
+        column = "assignments"
+        groups = {
+            assignment: context.store.rows([assignment])
+            for assignment in assignments
+        }
+    elif group_type == "Student":
+        students = st.multiselect(
+            label="Select specific students below:",
+            options=selected_df(context)[context.stu_id].unique(),
+        )
+        counts = ngram_counts(context)
+        column = "student"
+        groups = {
+            student: context.store.rows(assignments, [student])
+            for student in students
+        }
+    else:
+        questions = st.multiselect(
+            label="Select specific questions below:",
+            options=context.headings()[2:],
+        )
+        labels, counts = question_ngram_counts(context)
+        column = "question"
+        in_selected = labels["assignment"].isin(
+            [str(assignment) for assignment in assignments])
+        groups = {
+            question: np.flatnonzero(
+                in_selected & (labels["question"] == question))
+            for question in questions
+        }
+    if groups:
+        phrase_df = context.view(
+            "phrase_frequency",
+            lambda: ng.phrase_df(
+                counts, groups, column, length, freq_range,
+                PHRASE_MEASURES[measure],
+            ),
+            group_type,
+            tuple(groups),
+            length,
+            measure,
+            freq_range,
+        )
+        altair_chart(
+            vis.facet_freq_barplot(
+                phrase_df, list(groups), column, plots_per_row=plots_range
+            )
+        )
+
 
-    # calculate overall sentiment from the combined text
-    senti_df[cts.SENTI] = senti_df[cts.COMBINED].apply(
-        lambda x: TextBlob(az.lemmatized_text(x)).sentiment.polarity
+@pr.stage("page.sentiment")
+def sentiment(context):
+    """Main function for sentiment analysis."""
+    # the scores of the corpus do not depend on the selected assignments
+    corpus_senti_df = context.view(
+        "sentiment",
+        lambda: ut.make_senti_df(context.main_df),
+        selected=False,
+    )
+    senti_df = context.view(
+        "selected_sentiment",
+        lambda: context.query(corpus_senti_df, dropna=True),
     )
-    senti_df = ut.return_assignment(senti_df, assign_id, assignments)
     senti_type = st.sidebar.selectbox(
         "Type of sentiment analysis", ["Overall", "Student", "Question"]
     )
-    if not assignments:
+    assignment_string = context.assignment_string
+    if not context.assignments:
         st.warning("Please select an assignment for the analysis")
     elif senti_type == "Overall":
         st.sidebar.success(
             'To continue see individual sentiment analysis select "Student"'
         )
         st.header(f"Overall sentiment polarity in **{assignment_string}**")
-        overall_senti(senti_df)
+        overall_senti(context, senti_df)
     elif senti_type == "Student":
         st.header(
             f"View sentiment by individual students in **{assignment_string}**"
         )
-        student_senti(senti_df)
+        student_senti(context, senti_df, corpus_senti_df)
     elif senti_type == "Question":
         st.header(
             f"View sentiment by individual questions in **{assignment_string}**"
         )
-        question_senti(senti_df)
+        question_senti(context, senti_df)
 
 
-def overall_senti(input_df):
+def overall_senti(context, input_df):
     """Page for overall senti."""
     # display line plot when there are multiple assingments
-    if len(assignments) > 1:
-        st.altair_chart(vis.stu_senti_lineplot(input_df, stu_id))
-    st.altair_chart((vis.senti_combinedplot(input_df, stu_id)))
+    if len(context.assignments) > 1:
+        altair_chart(vis.stu_senti_lineplot(input_df, context.stu_id))
+    altair_chart((vis.senti_combinedplot(input_df, context.stu_id)))
 
 
-def student_senti(input_df):
+def student_senti(context, input_df, corpus_senti_df):
     """Page for display individual student's sentiment."""
+    stu_id = context.stu_id
     students = st.multiselect(
         label="Select specific students below:",
         options=input_df[stu_id].unique(),
@@ -423,44 +776,95 @@ def student_senti(input_df):
     plots_range = st.sidebar.slider(
         "Select the number of plots per row", 1, 5, value=3
     )
-    df_selected_stu = ut.return_assignment(input_df, stu_id, students)
+    df_selected_stu = context.query(corpus_senti_df, students, dropna=True)
     if len(students) != 0:
-        st.altair_chart(
+        altair_chart(
             vis.facet_senti_barplot(
                 df_selected_stu, students, stu_id, plots_per_row=plots_range
             )
         )
-        st.altair_chart(vis.stu_senti_barplot(df_selected_stu, stu_id))
+        altair_chart(vis.stu_senti_barplot(df_selected_stu, stu_id))
 
 
-def question_senti(input_df):
+def question_senti(context, input_df):
     """Page for individual question's sentiment."""
     questions = st.multiselect(
         label="Select specific questions below:",
-        options=selected_nan_df.columns[2:],
+        options=context.headings()[2:],
     )
-    select_text, questions_senti_df = ut.compute_question_senti(
-        questions, input_df
+    select_text, questions_senti_df = context.view(
+        "question_sentiment",
+        lambda: ut.compute_question_senti(questions, input_df),
+        tuple(questions),
     )
     if len(select_text) != 0:
-        st.altair_chart(vis.question_senti_barplot(questions_senti_df))
+        altair_chart(vis.question_senti_barplot(questions_senti_df))
 
 
-def summary():
+@pr.stage("page.summary")
+def summary(context):
     """Display summarization."""
-    # sum_df = ut.return_assignment(main_df, assign_id, assignments)
-    # sum_df = selected_nan_df.copy(deep=True)
-    if not assignments:
+    if not context.assignments:
         st.warning("Please select an assignment for the analysis")
     else:
-        for assignment in assignments:
-            sum_df = ut.make_summary_df(assignment, selected_nan_df, assign_id)
+        assignments = context.assignments
+        assign_id = context.assign_id
+        precomputed = batch_analysis(context, "summary")
+        if precomputed is not None:
+            for assignment in assignments:
+                st.write(bt.assignment_rows(
+                    precomputed, assign_id, assignment))
+            return
+        raw_df, store = context.raw_df, context.store
+
+        def summarize(job):
+            summaries = []
+            for number, assignment in enumerate(assignments):
+                job.report(
+                    number / len(assignments), f"Summarizing {assignment}"
+                )
+                # the answered questions, from the heading index
+                summaries.append(ut.make_summary_df(
+                    assignment, raw_df, assign_id, store))
+            return summaries
+
+        for sum_df in background_view(context, "summary", summarize):
             st.write(sum_df)
 
 
-def tpmodel():
+# pylint: disable=too-many-arguments
+def topic_model(job, topic_df, assign_id, stu_id, topic_range, word_range):
+    """Topic model of the selected assignments."""
+    job.report(0, "Fitting the topic model")
+    overall_topic_df, lda_model, corpus = tm.topic_model(
+        topic_df[cts.TOKEN].tolist(),
+        num_topics=topic_range,
+        num_words=word_range,
+        token_ids=vb.token_ids(topic_df),
+        # cancelled between the training passes
+        on_pass=lambda done: job.report(
+            0.9 * done / tm.PASSES, "Fitting the topic model"),
+    )
+    job.report(0.9, "Assigning the topics")
+    overall_topic_df["Student"] = topic_df[stu_id].tolist()
+    overall_topic_df[assign_id] = topic_df[assign_id].tolist()
+    # reorder the column
+    overall_topic_df = overall_topic_df[
+        [
+            assign_id,
+            "Student",
+            "Dominant_Topic",
+            "Topic_Keywords",
+            "Text",
+            "Perc_Contribution",
+        ]
+    ]
+    return overall_topic_df, lda_model, corpus
+
+
+@pr.stage("page.topic_modeling")
+def tpmodel(context):
     """Display topic modeling."""
-    topic_df = main_df.copy(deep=True)
     tp_type = st.sidebar.selectbox(
         "Type of topic modeling analysis", ["Histogram", "Scatter"]
     )
@@ -470,94 +874,244 @@ def tpmodel():
     word_range = st.sidebar.slider(
         "Select the amount of words per topic", 1, 10, value=5
     )
-    if not assignments:
+    if not context.assignments:
         st.warning("Please select an assignment for the analysis")
     else:
-        topic_df = ut.return_assignment(topic_df, assign_id, assignments)
-        overall_topic_df, lda_model, corpus = tm.topic_model(
-            topic_df[cts.TOKEN].tolist(),
-            num_topics=topic_range,
-            num_words=word_range,
+        topic_df = selected_df(context)
+        overall_topic_df, lda_model, corpus = background_view(
+            context,
+            "topics",
+            lambda job: topic_model(
+                job, topic_df, context.assign_id, context.stu_id,
+                topic_range, word_range,
+            ),
+            topic_range,
+            word_range,
         )
-        overall_topic_df["Student"] = topic_df[stu_id].tolist()
-        overall_topic_df[assign_id] = topic_df[assign_id].tolist()
-        # reorder the column
-        overall_topic_df = overall_topic_df[
-            [
-                assign_id,
-                "Student",
-                "Dominant_Topic",
-                "Topic_Keywords",
-                "Text",
-                "Perc_Contribution",
-            ]
-        ]
-        st.header(f"Overall topics in **{assignment_string}**")
+        st.header(f"Overall topics in **{context.assignment_string}**")
         if tp_type == "Histogram":
             hist_tm(overall_topic_df)
         elif tp_type == "Scatter":
             # topics = lda_model.show_topics(formatted=False)
-            scatter_tm(lda_model, corpus, overall_topic_df)
+            scatter_tm(
+                context, lda_model, corpus, overall_topic_df,
+                (topic_range, word_range),
+            )
 
 
 def hist_tm(topic_df):
     """Topic modeling in histogram."""
     # st.write(topic_df)
-    st.altair_chart(vis.tp_hist_plot(topic_df))
+    altair_chart(vis.tp_hist_plot(topic_df))
 
 
-def scatter_tm(lda_model, corpus, overall_topic_df):
+def scatter_tm(context, lda_model, corpus, overall_topic_df, topic_params):
     """Topic modeling in scatter plot."""
     random_state = st.sidebar.slider("Select random_state", 1, 1000, value=500)
 
     angle = st.sidebar.slider("Select angle", 0, 100, value=50)
 
-    df_tsne = tm.tsne(lda_model, corpus, overall_topic_df, random_state, angle)
+    df_tsne = background_view(
+        context,
+        "tsne",
+        lambda job: tm.tsne(
+            lda_model, corpus, overall_topic_df, random_state, angle,
+            job.report,
+        ),
+        topic_params,
+        random_state,
+        angle,
+    )
 
     lda_scatter = vis.tp_scatter_plot(df_tsne)
-    st.altair_chart(lda_scatter)
+    altair_chart(lda_scatter)
 
 
-def doc_sim():
+@pr.stage("page.similarity")
+def doc_sim(context):
     """Display document similarity."""
-    doc_df = main_df.copy(deep=True)
     doc_sim_type = st.sidebar.selectbox(
         "Type of similarity analysis", ["TF-IDF", "Spacy"]
     )
-    if not assignments:
+    if not context.assignments:
         st.warning("Please select an assignment for the analysis")
     else:
         st.header(
-            f"Similarity between each student's document in **{assignment_string}**"
+            "Similarity between each student's document in "
+            f"**{context.assignment_string}**"
         )
         if doc_sim_type == "TF-IDF":
-            tf_idf_sim(doc_df)
+            tf_idf_sim(context)
         elif doc_sim_type == "Spacy":
-            spacy_sim(doc_df)
+            spacy_sim(context)
 
 
-def tf_idf_sim(doc_df):
+def tf_idf_sim(context):
     """Plot similarity with tf idf model."""
-    for assignment in assignments:
-        df_sim = ut.sim_pair(assignment, doc_df, assign_id, stu_id, "tfidf")
-        st.altair_chart(
+    precomputed = batch_analysis(context, "similarity")
+    for assignment in context.assignments:
+        df_sim = context.view(
+            "similarity",
+            lambda: ut.sim_pair(
+                assignment, context.main_df, context.assign_id,
+                context.stu_id, "tfidf", store=context.store,
+            ) if precomputed is None else bt.assignment_rows(
+                precomputed, context.assign_id, assignment),
+            assignment,
+            "tfidf",
+        )
+        altair_chart(
             vis.doc_sim_heatmap(df_sim).properties(title=assignment)
         )
 
 
-def spacy_sim(doc_df):
+def spacy_sim(context):
     """Plot similarity with spacy model."""
     spacy_model = st.sidebar.selectbox("Model name", SPACY_MODEL_NAMES)
     nlp = load_model(spacy_model)
-    for assignment in assignments:
-        df_sim = ut.sim_pair(
-            assignment, doc_df, assign_id, stu_id, "spacy", nlp
-        )
-        st.altair_chart(
+    main_df = context.main_df
+    assignments = context.assignments
+    assign_id = context.assign_id
+    stu_id = context.stu_id
+    store = context.store
+
+    def similarities(job):
+        sims = []
+        for number, assignment in enumerate(assignments):
+            # cancelled between the chunks of pairs of an assignment
+            sims.append(
+                ut.sim_pair(
+                    assignment, main_df, assign_id, stu_id, "spacy", nlp,
+                    lambda done, number=number, assignment=assignment:
+                    job.report(
+                        (number + done) / len(assignments),
+                        f"Comparing {assignment}",
+                    ),
+                    store,
+                )
+            )
+        return sims
+
+    sims = background_view(
+        context, "spacy_similarity", similarities, spacy_model
+    )
+    for assignment, df_sim in zip(assignments, sims):
+        altair_chart(
             vis.doc_sim_heatmap(df_sim).properties(title=assignment)
         )
 
 
+@pr.stage("page.cooccurrence")
+def cooccurrence(context):
+    """Page for the network of the words that occur together."""
+    if not context.assignments:
+        st.warning("Please select an assignment for the analysis")
+        return
+    context_type = st.sidebar.selectbox(
+        "Words occur together in the same", list(CONTEXTS)
+    )
+    window = CONTEXTS[context_type]
+    if window is not None:
+        window = st.sidebar.slider("Number of words in a window", 2, 50,
+                                   value=window)
+    amount = st.sidebar.slider("Number of edges", 10, 200, value=co.EDGES)
+    selected = selected_df(context)
+
+    def compute(job):
+        if context_type != "Sentence":
+            job.report(0, "Counting the words that occur together")
+            return co.cooccurrence_matrix(vb.token_ids(selected), window)
+        # the tokens of the corpus have no sentence boundaries
+        sentences = co.split_sentences(selected[cts.COMBINED])
+        tokens = []
+        for start in range(0, len(sentences), SENTENCE_CHUNK):
+            job.report(start / len(sentences), "Tokenizing the sentences")
+            tokens.extend(az.tokenize_texts([
+                az.normalize(sentence)
+                for sentence in sentences[start:start + SENTENCE_CHUNK]
+            ]))
+        return co.cooccurrence_matrix(vb.VOCABULARY.encode_many(tokens), None)
+
+    # the matrix of a selection is cached for every number of edges
+    words, counts = background_view(
+        context, "cooccurrence", compute, context_type, window)
+    edges = co.top_edges(words, counts, amount)
+    st.header(
+        f"Words that occur together in **{context.assignment_string}**")
+    if edges.empty:
+        st.warning("The selected reflections have no words that occur "
+                   "together")
+        return
+    altair_chart(vis.cooccurrence_network(*co.spring_layout(edges)))
+    if debug_mode:
+        st.write(edges)
+
+
+def lemmatize_words(words):
+    """Lemma of every word like the tokens of the corpus, empty if none."""
+    return [
+        tokens[0] if len(tokens) == 1 else ""
+        for tokens in az.tokenize_texts(words)
+    ]
+
+
+def search_index(context):
+    """Inverted index of the corpus, built in a job."""
+    raw_df, main_df = context.raw_df, context.main_df
+    assign_id, stu_id = context.assign_id, context.stu_id
+    path = sr.index_path(context.source)
+
+    def build(job):
+        job.report(0, "Indexing the reflections")
+        return sr.update_index(raw_df, main_df, assign_id, stu_id, path,
+                               lemmatize_words)
+
+    return background_view(
+        context, "search_index", build, assign_id, stu_id, selected=False)
+
+
+@pr.stage("page.search")
+def search(context):
+    """Keyword-in-context search over the reflections."""
+    index = search_index(context)
+    query = st.text_input("Search the reflections for")
+    in_selected = st.sidebar.checkbox(
+        "Only search the selected assignments",
+        value=bool(context.assignments),
+    )
+    terms = az.tokenize(az.normalize(query)) if query.strip() else []
+    if query.strip() and not terms:
+        st.warning("Please search for words that are not stop words")
+    if not terms:
+        return
+    start = time.perf_counter()
+    hits = index.search(
+        terms, list(context.assignments) if in_selected else None)
+    elapsed = (time.perf_counter() - start) * 1000
+    students = {(hit["assignment"], hit["student"]) for hit in hits}
+    st.write(
+        f"**{', '.join(terms)}** is mentioned in {len(hits)} answers of "
+        f"{len(students)} reflections ({elapsed:.1f} ms)"
+    )
+    rows = [
+        {
+            "assignment": hit["assignment"],
+            "student": hit["student"],
+            "question": hit["question"],
+            "left": left,
+            "term": term,
+            "right": right,
+        }
+        for hit in hits
+        for left, term, right in hit["snippets"]
+    ]
+    if len(rows) > SEARCH_ROWS:
+        st.write(f"Showing the first {SEARCH_ROWS} of {len(rows)} matches")
+    if rows:
+        st.table(pd.DataFrame(rows[:SEARCH_ROWS]))
+
+
+@pr.stage("page.interactive")
 def interactive():
     """Page to allow nlp analysis from user input."""
     input_text = st.text_area("Enter text", "Type here")
@@ -572,7 +1126,7 @@ def interactive():
         tokens = az.tokenize(input_text)
         st.write(tokens)
     if ner_cb:
-        displacy_renderer(az.get_nlp(input_text))
+        displacy_renderer(az.entity_spans(input_text))
     if sentiment_cb:
         sentiments = TextBlob(az.lemmatized_text(input_text))
         st.write(sentiments.sentiment)
@@ -581,7 +1135,8 @@ def interactive():
         st.write(summaries)
 
 
-def entities():
+@pr.stage("page.entities")
+def entities(context):
     """Page to display entity analysis."""
     st.write(
         "Entity analysis inspects the given text for known entities \
@@ -591,51 +1146,46 @@ def entities():
     locations, expressions of times, quantities, monetary values, and percentages."
     )
 
-    # make a copy of the main dataframe
-
     # makes a drop down list to select users classified by assignments
-    if not assignments:
+    if not context.assignments:
         st.warning("Please select an assignment for the analysis")
     else:
-        for assignment in assignments:
+        for assignment in context.assignments:
             st.write("")
             st.subheader(assignment)
-            df_selected_assign = ut.return_assignment(
-                selected_df, assign_id, assignment
-            )
-            for student in df_selected_assign[stu_id].unique():
+            students = context.store.select(
+                context.main_df, [assignment], columns=[context.stu_id])
+            for student in students[context.stu_id].unique():
                 with st.beta_expander(student):
-                    entity_analysis(assignment, student, selected_df)
+                    spans = context.view(
+                        "entities",
+                        lambda: entity_analysis(context, assignment, student),
+                        assignment,
+                        student,
+                    )
+                    displacy_renderer(spans)
 
 
-def entity_analysis(assignment, student, input_df):
+def entity_analysis(context, assignment, student):
     """Selects, modifies and runs the entity analysis on a document."""
-    # makes a dataframe with the selected user's information
-    df_selected_stu = ut.return_student_assignment(
-        input_df, student, assignment, assign_id, stu_id
+    # only the combined column of the selected user's documents
+    df_selected_stu_combined = context.store.select(
+        context.main_df, [assignment], [student], columns=[cts.COMBINED]
     )
-
-    # selects the combined column from the dataframe and extracts it
-    combine_start = df_selected_stu.columns.get_loc("combined")
-    combine_end = df_selected_stu.columns.get_loc("combined") + 1
-    df_selected_stu_combined = df_selected_stu.iloc[
-        :, combine_start:combine_end
-    ]
     # convert the combined dataframe into a string
     student_string = df_selected_stu_combined.to_string(
         header=False, index=False
     )
     student_string = student_string.replace("\\n", "")
 
-    # run spacy entity recogonizer on selected user document and display
-    doc = az.get_nlp(student_string)
-    displacy_renderer(doc)
+    # run spacy entity recogonizer on selected user document
+    return az.entity_spans(student_string)
 
 
-def displacy_renderer(doc):
-    """Renders the given string."""
-    if len(doc) > 0:
-        html = spacy.displacy.render(doc, style="ent")
+def displacy_renderer(spans):
+    """Renders the given entity spans."""
+    if spans["text"].strip():
+        html = spacy.displacy.render(spans, style="ent", manual=True)
         # Newlines seem to mess with the rendering
         html = html.replace("\n", " ")
         st.write(cts.HTML_WRAPPER.format(html), unsafe_allow_html=True)
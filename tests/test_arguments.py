@@ -0,0 +1,15 @@
+"""Test module for arguments.py."""
+import pytest
+import src.arguments as arg
+
+
+def test_functions_need_their_sources():
+    """Test that the functions without a source to analyze are rejected."""
+    for function in ("course", "batch", "export"):
+        with pytest.raises(SystemExit):
+            arg.parse(["--function", function])
+    assert arg.parse(
+        ["--function", "course", "--assignment", "lab1,lab2"]).assignment \
+        == "lab1,lab2"
+    assert arg.parse(
+        ["--function", "batch", "--directory", "lab1"]).directory == "lab1"
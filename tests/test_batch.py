@@ -0,0 +1,120 @@
+"""Test module for batch.py."""
+import json
+import os
+
+import pandas as pd
+import pytest
+import src.batch as bt
+import src.constants as cts
+import src.vocabulary as vb
+
+
+def test_split_assignments():
+    """Test that the documents are split into one frame per assignment."""
+    json_lst = [
+        {"assignment": ["lab1", "lab1"], "student": ["a", "b"],
+         "q1": ["one", "two"]},
+        {"assignment": ["lab2"], "student": ["a"], "q2": ["three"]},
+    ]
+    assignments = bt.split_assignments(json_lst)
+    assert [name for name, _ in assignments] == ["lab1", "lab2"]
+    lab1, lab2 = assignments[0][1], assignments[1][1]
+    assert list(lab1.columns) == ["assignment", "student", "q1"]
+    assert list(lab2.columns) == ["assignment", "student", "q2"]
+    assert len(lab1) == 2
+
+
+def test_partition_path():
+    """Test that assignments are quoted into the partition directory."""
+    path = bt.partition_path("out", "frequency", "lab 1/a", "json")
+    assert path == os.path.join(
+        "out", "frequency", "assignment=lab%201%2Fa", "part-0.json")
+    assert bt.partition_path("out", "raw", "lab1", "parquet").endswith(
+        "part-0.parquet")
+
+
+def test_json_frame_round_trip(tmp_path):
+    """Test that json lines keep strings and token lists."""
+    frame = pd.DataFrame({
+        "assignment": ["lab1", "lab1"],
+        "student": ["001", "002"],
+        "tokens": [["word", "count"], []],
+    })
+    path = str(tmp_path / "part" / "part-0.json")
+    bt.write_frame(frame, path, "json")
+    read = bt.read_frame(path, "json")
+    assert read["student"].tolist() == ["001", "002"]
+    assert read["tokens"].tolist() == [["word", "count"], []]
+
+
+def test_load_dataset(tmp_path):
+    """Test that the partitions listed in the manifest are loaded."""
+    output = str(tmp_path)
+    for name in ("lab1", "lab2"):
+        bt.write_frame(
+            pd.DataFrame({"assignment": [name], "word": ["text"]}),
+            bt.partition_path(output, "frequency", name, "json"),
+            "json",
+        )
+    assert not bt.is_batch_output(output)
+    with open(os.path.join(output, bt.MANIFEST), "w") as file:
+        json.dump({
+            "format": "json",
+            "assignments": [{"name": "lab1"}, {"name": "lab2"}],
+        }, file)
+    assert bt.is_batch_output(output)
+    frame = bt.load_dataset(output, "frequency")
+    assert frame["assignment"].tolist() == ["lab1", "lab2"]
+
+
+def test_run_batch_rejects_unknown_options(tmp_path):
+    """Test that unknown analyses and formats are reported."""
+    with pytest.raises(ValueError):
+        bt.run_batch([], str(tmp_path), ["wordcloud"], file_format="json")
+    with pytest.raises(ValueError):
+        bt.run_batch([], str(tmp_path), file_format="csv")
+
+
+def test_load_analysis_and_top_frequency(tmp_path):
+    """Test that precomputed analyses stand for the ones of the pages."""
+    output = str(tmp_path)
+    words = {"lab1": ["merge", "git", "branch"], "lab2": ["test"]}
+    for name, lab_words in words.items():
+        bt.write_frame(
+            pd.DataFrame({
+                "assignment": name, "word": lab_words,
+                "freq": list(range(len(lab_words), 0, -1)),
+            }),
+            bt.partition_path(output, "frequency", name, "json"),
+            "json",
+        )
+    with open(os.path.join(output, bt.MANIFEST), "w") as file:
+        json.dump({
+            "format": "json",
+            "analyses": ["frequency"],
+            "assignments": [{"name": "lab1"}, {"name": "lab2"}],
+        }, file)
+    assert bt.load_analysis([output], "topics") is None
+    assert bt.load_analysis([str(tmp_path / "missing")], "frequency") is None
+    freq_df = bt.load_analysis([output], "frequency")
+    assert bt.assignment_rows(freq_df, "assignment", "lab2")[
+        "word"].tolist() == ["test"]
+    top = bt.top_frequency(freq_df, ["lab2", "lab1"], "assignment", 2)
+    assert list(top.columns) == ["assignments", "word", "freq"]
+    assert top.values.tolist() == [
+        ["lab2", "test", 1], ["lab1", "merge", 3], ["lab1", "git", 2]]
+
+
+def test_similarity_partitions_share_a_schema():
+    """Test that an assignment without pairs has the columns of the others."""
+    main_df = pd.DataFrame({
+        "assignment": ["lab1", "lab1", "lab2"],
+        "reflection by": ["a", "b", "a"],
+        cts.TOKEN: [["git", "merge"], ["git", "test"], ["git"]],
+    })
+    vb.add_token_ids(main_df)
+    pairs = bt.similarity_df(main_df.iloc[:2], "assignment", "reflection by")
+    alone = bt.similarity_df(main_df.iloc[2:], "assignment", "reflection by")
+    assert len(pairs) == 1 and alone.empty
+    assert list(alone.columns) == list(pairs.columns)
+    assert alone.dtypes.tolist() == pairs.dtypes.tolist()
@@ -0,0 +1,82 @@
+"""Test module for cooccurrence.py."""
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+import src.cooccurrence as co
+import src.vocabulary as vb
+
+DOCUMENTS = [
+    ["git", "merge", "conflict", "git", "branch"],
+    ["git", "merge"],
+    ["test", "code", "review"],
+    [],
+]
+
+
+def expected_pairs(contexts):
+    """Number of contexts of every pair of terms, with python sets."""
+    pairs = Counter()
+    for context in contexts:
+        pairs.update(combinations(sorted(set(context)), 2))
+    return pairs
+
+
+def edge_pairs(edges):
+    """Sorted pair and weight of every edge."""
+    return {
+        tuple(sorted((source, target))): weight
+        for source, target, weight in edges.values.tolist()
+    }
+
+
+def window_pairs(documents, window):
+    """Pairs of different terms less than window tokens apart."""
+    pairs = Counter()
+    for document in documents:
+        for first, second in combinations(range(len(document)), 2):
+            if second - first < window and \
+                    document[first] != document[second]:
+                pairs[tuple(sorted((document[first], document[second])))] \
+                    += 1
+    return pairs
+
+
+def test_cooccurrence_matches_contexts():
+    """Test the counts of pairs in whole reflections and sliding windows."""
+    vocabulary = vb.Vocabulary()
+    ids = vocabulary.encode_many(DOCUMENTS)
+    words, counts = co.cooccurrence_matrix(ids, None)
+    edges = co.top_edges(words, counts, 100, vocabulary)
+    assert edge_pairs(edges) == expected_pairs(DOCUMENTS)
+    for window in (2, 3, 10):
+        words, counts = co.cooccurrence_matrix(ids, window)
+        edges = co.top_edges(words, counts, 100, vocabulary)
+        assert edge_pairs(edges) == window_pairs(DOCUMENTS, window)
+    # the windows overlap, "git" and "merge" are twice 1 and once 2 apart
+    words, counts = co.cooccurrence_matrix(ids, 3)
+    edges = co.top_edges(words, counts, 1, vocabulary)
+    assert edges.values.tolist() == [["git", "merge", 3]]
+
+
+def test_split_sentences():
+    """Test that texts are split at the end of sentences and lines."""
+    assert co.split_sentences([
+        "I used git. Merging was hard!\nRebase: v1.2 works",
+        "",
+    ]) == ["I used git", "Merging was hard", "Rebase: v1.2 works"]
+
+
+def test_spring_layout():
+    """Test that every term of the edges has a position."""
+    vocabulary = vb.Vocabulary()
+    words, counts = co.cooccurrence_matrix(vocabulary.encode_many(DOCUMENTS))
+    nodes, links = co.spring_layout(co.top_edges(words, counts, 100,
+                                                 vocabulary))
+    assert sorted(nodes["term"]) == sorted({
+        token for document in DOCUMENTS for token in document})
+    assert nodes.set_index("term")["degree"]["git"] == 3
+    assert np.isfinite(links[["x", "y", "x2", "y2"]].to_numpy()).all()
+    empty_nodes, empty_links = co.spring_layout(co.top_edges(
+        np.empty(0, dtype=int), counts[:0, :0], 10, vocabulary))
+    assert empty_nodes.empty and empty_links.empty
@@ -0,0 +1,84 @@
+"""Test module for corpus_file.py."""
+import pandas as pd
+import pytest
+import src.constants as cts
+import src.corpus_file as cf
+import src.vocabulary as vb
+
+pa = pytest.importorskip("pyarrow")
+
+
+def make_corpus():
+    """Raw and processed dataframes of a small corpus."""
+    raw_df = pd.DataFrame({
+        "assignment": ["lab1", "lab1", "lab2"],
+        "reflection by": ["a", "b", "a"],
+        "question": ["first answer", None, "third answer"],
+    })
+    main_df = raw_df.fillna("")
+    main_df[cts.COMBINED] = main_df["question"]
+    main_df[cts.NORMAL] = main_df["question"]
+    main_df[cts.TOKEN] = [["first", "answer"], [], ["third", "answer"]]
+    return raw_df, main_df
+
+
+@pytest.mark.parametrize("extension", [cts.ARROW_EXT, cts.PARQUET_EXT])
+def test_corpus_round_trip(tmp_path, extension):
+    """Test that a corpus file restores both dataframes."""
+    raw_df, main_df = make_corpus()
+    path = cf.write_corpus(raw_df, main_df, str(tmp_path / "corpus"))
+    assert path.endswith(cts.ARROW_EXT)
+    path = cf.write_corpus(
+        raw_df, main_df, str(tmp_path / ("corpus" + extension)))
+    assert cf.is_corpus_file(path)
+    raw, main = cf.read_corpus(path)
+    assert list(main.columns) == list(main_df.columns) + [cts.TOKEN_IDS]
+    assert main[cts.TOKEN].tolist() == main_df[cts.TOKEN].tolist()
+    assert [len(ids) for ids in main[cts.TOKEN_IDS]] == [2, 0, 2]
+    # the tokens of the selected rows are read from the arrow table
+    assert main.take([2])[cts.TOKEN].tolist() == [["third", "answer"]]
+    assert vb.VOCABULARY.decode(main[cts.TOKEN_IDS][2]) == ["third", "answer"]
+    assert main["question"].tolist() == ["first answer", "", "third answer"]
+    assert raw["question"].isna().tolist() == [False, True, False]
+    assert raw["assignment"].tolist() == ["lab1", "lab1", "lab2"]
+
+
+def test_corpus_table_schema():
+    """Test the dictionary encoded keys and the token lists."""
+    table = cf.corpus_table(*make_corpus())
+    assert pa.types.is_dictionary(table.schema.field("assignment").type)
+    assert pa.types.is_dictionary(table.schema.field("reflection by").type)
+    assert pa.types.is_list(table.schema.field(cts.TOKEN).type)
+
+
+def test_load_several_corpora(tmp_path):
+    """Test that corpus files are concatenated with aligned columns."""
+    raw_df, main_df = make_corpus()
+    first = cf.write_corpus(raw_df, main_df, str(tmp_path / "first"))
+    other_raw = raw_df.rename(columns={"question": "other"})
+    other_main = main_df.rename(columns={"question": "other"})
+    second = cf.write_corpus(other_raw, other_main, str(tmp_path / "second"))
+    raw, main = cf.load_corpus([first, second])
+    assert len(main) == 6
+    assert [vb.VOCABULARY.decode(ids) for ids in vb.token_ids(main)] == \
+        main[cts.TOKEN].tolist()
+    assert list(main.columns)[-4:] == [
+        cts.COMBINED, cts.NORMAL, cts.TOKEN, cts.TOKEN_IDS]
+    assert main["other"].tolist() == [
+        "", "", "", "first answer", "", "third answer"]
+    assert raw["other"].isna().sum() == 4
+    assert len(cf.corpus_bytes(raw_df, main_df)) > 0
+
+
+def test_tree_signature(tmp_path):
+    """Test that the signature follows the documents, not the indexes."""
+    lab = tmp_path / "lab1"
+    lab.mkdir()
+    (lab / "a.md").write_text("# Reflection")
+    signature = cf.tree_signature([str(tmp_path)])
+    assert [path for path, _, _ in signature] == [str(lab / "a.md")]
+    (lab / cts.MANIFEST_FILE).write_text("{}")
+    (tmp_path / cts.INDEX_FILE).write_text("{}")
+    assert cf.tree_signature([str(tmp_path)]) == signature
+    (lab / "a.md").write_text("# Reflection changed")
+    assert cf.tree_signature([str(tmp_path)]) != signature
@@ -0,0 +1,98 @@
+"""Test module for corpus_store.py."""
+import numpy as np
+import pandas as pd
+import pytest
+import src.corpus_store as cs
+import src.utils as ut
+
+
+def make_corpus():
+    """Corpus with answers that only some assignments have."""
+    return pd.DataFrame({
+        "assignment": ["lab1", "lab1", "lab2", "lab3"],
+        "reflection by": ["a", "b", "a", "b"],
+        "first": ["one", "two", None, "four"],
+        "second": [None, None, "three", None],
+    })
+
+
+def test_rows_use_assignments_and_students():
+    """Test the selection of rows by assignment and student."""
+    store = cs.CorpusStore(make_corpus(), "assignment", "reflection by")
+    assert len(store) == 4
+    assert store.rows().tolist() == [0, 1, 2, 3]
+    assert store.rows([]).tolist() == []
+    assert store.rows("lab1").tolist() == [0, 1]
+    assert store.rows(["lab3", "lab2"]).tolist() == [2, 3]
+    assert store.rows(students=["b"]).tolist() == [1, 3]
+    assert store.rows(["lab1"], ["b"]).tolist() == [1]
+    assert store.rows(["lab4"]).dtype == np.int64
+
+
+def test_select_matches_return_assignment():
+    """Test that a selection is the one of utils.return_assignment."""
+    main_df = make_corpus()
+    store = cs.CorpusStore(main_df, "assignment", "reflection by")
+    expected = ut.return_assignment(main_df, "assignment", ["lab1", "lab3"])
+    selected = store.select(main_df, ["lab1", "lab3"], dropna=True)
+    pd.testing.assert_frame_equal(selected, expected)
+    selected = store.select(main_df, ["lab2"], ["a"], columns=["second"])
+    assert selected["second"].tolist() == ["three"]
+    assert list(selected.index) == [2]
+    with pytest.raises(ValueError):
+        store.select(main_df.head(2), ["lab1"])
+
+
+def test_return_assignment_uses_the_store(monkeypatch):
+    """Test that the pages select the rows of an assignment in the index."""
+    raw_df = make_corpus()
+    store = cs.CorpusStore(raw_df, "assignment", "reflection by", raw_df)
+    for selected in ("lab1", ["lab2", "lab3"]):
+        expected = ut.return_assignment(raw_df, "assignment", selected)
+        pd.testing.assert_frame_equal(
+            ut.return_assignment(raw_df, "assignment", selected, store),
+            expected)
+    scanned = []
+    monkeypatch.setattr(
+        pd.Series, "isin", lambda *args: scanned.append(args))
+    ut.return_assignment(raw_df, "assignment", ["lab1"], store)
+    assert not scanned
+
+
+def test_headings_of_assignments():
+    """Test that the used columns of each assignment are indexed."""
+    raw_df = make_corpus()
+    main_df = raw_df.fillna("")
+    main_df["combined"] = ["one", "two", "three", "four"]
+    store = cs.CorpusStore(main_df, "assignment", "reflection by", raw_df)
+    assert store.headings("lab1") == ["assignment", "reflection by", "first"]
+    assert store.headings(["lab2", "lab3"]) == [
+        "assignment", "reflection by", "first", "second"]
+    assert store.headings([]) == []
+    for assignments in (["lab1"], ["lab2"], ["lab1", "lab3"]):
+        expected = ut.return_assignment(raw_df, "assignment", assignments)
+        pd.testing.assert_frame_equal(
+            store.select(raw_df, assignments, dropna=True), expected)
+    # the processed corpus has no missing answers, only empty ones
+    selected = store.select(main_df, ["lab2"], dropna=True)
+    assert list(selected.columns) == list(main_df.columns)
+    partial = main_df.assign(second=raw_df["second"])
+    pd.testing.assert_frame_equal(
+        store.select(partial, ["lab1"], dropna=True),
+        ut.return_assignment(partial, "assignment", ["lab1"]))
+
+
+def test_selection_larger_than_query_parameters():
+    """Test that long lists of assignments are queried in batches."""
+    size = cs.MAX_VARIABLES * 2 + 10
+    main_df = pd.DataFrame({
+        "assignment": [f"lab{number}" for number in range(size)],
+        "reflection by": ["a", "b"] * (size // 2),
+        "first": ["one"] * size,
+    })
+    store = cs.CorpusStore(main_df, "assignment", "reflection by", main_df)
+    assignments = list(reversed(main_df["assignment"]))
+    assert store.rows(assignments).tolist() == list(range(size))
+    assert store.rows(assignments, ["b"] * size).tolist() == list(
+        range(1, size, 2))
+    assert store.headings(assignments) == list(main_df.columns)
@@ -0,0 +1,259 @@
+"""Test module for get_handler.py."""
+import datetime
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import src.get_handler as gh
+
+CONFIGS = {
+    "api_key": "api-key",
+    "access_key": "access-key",
+    "secret_key": "secret-key",
+}
+
+
+class GatorHandler(BaseHTTPRequestHandler):
+    """Stand-in for the Gator API that returns one report per assignment."""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answer with a report of the requested assignment."""
+        server = self.server
+        with server.lock:
+            server.requests.append(self.headers)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            failure = server.failures.pop(0) if server.failures else None
+        time.sleep(server.delay)
+        query = parse_qs(urlsplit(self.path).query)
+        if failure is not None:
+            body = b"{}"
+            self.send_response(failure)
+        elif server.etag and self.headers["If-None-Match"] == server.etag:
+            body = b""
+            self.send_response(304)
+        else:
+            body = json.dumps([{
+                "assignment": query["assignment"][0],
+                "reflection": "# Reflection by\nuser\n## header\ntext",
+            }]).encode("utf-8")
+            self.send_response(200)
+            if server.etag:
+                self.send_header("ETag", server.etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.active -= 1
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Keep the test output quiet."""
+
+
+@pytest.fixture(name="server")
+def fixture_server():
+    """Run the stand-in server in a background thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GatorHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.failures = []
+    server.active = 0
+    server.max_active = 0
+    server.delay = 0
+    server.etag = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.endpoint = f"http://127.0.0.1:{server.server_port}/stage/report"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_signature_key_matches_aws_example():
+    """Test the key derivation against the example of the AWS docs."""
+    key = gh.get_signature_key(
+        "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY", "20120215", "us-east-1",
+        "iam"
+    )
+    assert key.hex() == (
+        "f4780e2d9f65fa895f9c67b32ce1baf0b0d8a43505a000a1a9e090d414db404d")
+
+
+def test_signers_are_shared_per_credentials():
+    """Test that the requests of the same credentials share a signer."""
+    signer = gh.get_signer(
+        CONFIGS["api_key"], "https://example.com/report",
+        CONFIGS["access_key"], CONFIGS["secret_key"])
+    assert gh.get_signer(
+        CONFIGS["api_key"], "https://example.com/report",
+        CONFIGS["access_key"], CONFIGS["secret_key"]) is signer
+    assert gh.get_signer(
+        CONFIGS["api_key"], "https://example.com/report",
+        CONFIGS["access_key"], "other-secret") is not signer
+
+
+def test_signer_reuses_signing_key_per_date():
+    """Test that the signing key is derived once per date."""
+    signer = gh.Signer(endpoint="https://example.com/report", **CONFIGS)
+    first_day = datetime.datetime(2020, 1, 1, 10, 0, 0)
+    url, headers = signer.sign("lab1", True, first_day)
+    key = signer.signing_key("20200101")
+    signer.sign("lab2", False, first_day + datetime.timedelta(hours=1))
+    assert signer.signing_key("20200101") is key
+    assert url == "https://example.com/report?assignment=lab1&passBuild=True"
+    assert headers["x-amz-date"] == "20200101T100000Z"
+    assert "Credential=access-key/20200101/us-east-2/execute-api/" in (
+        headers["Authorization"])
+    _, next_headers = signer.sign(
+        "lab1", True, first_day + datetime.timedelta(days=1))
+    assert signer.signing_key("20200102") != key
+    assert next_headers["Authorization"] != headers["Authorization"]
+
+
+def test_get_request_signs_request(server):
+    """Test that a single request is signed and decoded."""
+    output = gh.get_request(
+        "lab1", True, endpoint=server.endpoint, **CONFIGS)
+    assert output[0]["assignment"] == "lab1"
+    headers = server.requests[0]
+    assert headers["x-api-key"] == "api-key"
+    assert headers["Authorization"].startswith(
+        "AWS4-HMAC-SHA256 Credential=access-key/")
+
+
+def test_get_requests_runs_concurrently(server):
+    """Test that assignments are fetched in parallel and kept in order."""
+    server.delay = 0.3
+    assignments = [f"lab{number}" for number in range(6)]
+    start = time.perf_counter()
+    output = gh.get_requests(
+        assignments, True, endpoint=server.endpoint, max_workers=3, **CONFIGS
+    )
+    elapsed = time.perf_counter() - start
+    assert [response[0]["assignment"] for response in output] == assignments
+    assert server.max_active <= 3
+    # two rounds of three parallel requests instead of six sequential ones
+    assert elapsed < 6 * server.delay
+
+
+def test_get_requests_retries_failures(server):
+    """Test that server errors are retried with backoff."""
+    server.failures = [503, 502]
+    session = gh.create_session(backoff_factor=0)
+    output = gh.get_requests(
+        ["lab1"], True, endpoint=server.endpoint, session=session, **CONFIGS
+    )
+    assert output[0][0]["assignment"] == "lab1"
+    assert len(server.requests) == 3
+
+
+def test_get_requests_raises_after_retries(server):
+    """Test that persistent server errors are raised."""
+    server.failures = [500] * 3
+    session = gh.create_session(retries=2, backoff_factor=0)
+    with pytest.raises(Exception, match="Http Error"):
+        gh.get_requests(
+            ["lab1"], True, endpoint=server.endpoint, session=session,
+            **CONFIGS
+        )
+
+
+def test_save_cached_writes_through_private_temporary_files(tmp_path):
+    """Test that concurrent writers of an entry leave one complete file."""
+    path = gh.cache_path(str(tmp_path / "cache"), "lab1", True)
+    entries = [{"version": gh.CACHE_VERSION, "body": [number] * 1000}
+               for number in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda entry: gh.save_cached(entry, path), entries))
+    assert gh.load_cached(path) in entries
+    assert os.listdir(tmp_path / "cache") == [os.path.basename(path)]
+
+
+def test_get_request_serves_cache_within_ttl(server, tmp_path):
+    """Test that a fresh cached response skips the endpoint."""
+    for _ in range(2):
+        output = gh.get_request(
+            "lab1", True, endpoint=server.endpoint, cache_dir=str(tmp_path),
+            **CONFIGS
+        )
+        assert output[0]["assignment"] == "lab1"
+    assert len(server.requests) == 1
+    gh.get_request(
+        "lab1", False, endpoint=server.endpoint, cache_dir=str(tmp_path),
+        **CONFIGS
+    )
+    assert len(server.requests) == 2
+
+
+def test_get_request_revalidates_stale_cache(server, tmp_path):
+    """Test that a stale cached response is revalidated with its etag."""
+    server.etag = '"v1"'
+    first = gh.get_request(
+        "lab1", True, endpoint=server.endpoint, cache_dir=str(tmp_path),
+        ttl=0, **CONFIGS
+    )
+    second = gh.get_request(
+        "lab1", True, endpoint=server.endpoint, cache_dir=str(tmp_path),
+        ttl=0, **CONFIGS
+    )
+    assert first == second
+    assert len(server.requests) == 2
+    assert server.requests[1]["If-None-Match"] == '"v1"'
+
+
+def test_get_requests_replays_offline(server, tmp_path):
+    """Test that offline replay serves cached responses only."""
+    gh.get_requests(
+        ["lab1", "lab2"], True, endpoint=server.endpoint,
+        cache_dir=str(tmp_path), **CONFIGS
+    )
+    output = gh.get_requests(
+        ["lab1", "lab2"], True, cache_dir=str(tmp_path), offline=True,
+        **gh.auth_config(offline=True)
+    )
+    assert [response[0]["assignment"] for response in output] == [
+        "lab1", "lab2"]
+    assert len(server.requests) == 2
+    with pytest.raises(Exception, match="No cached response for lab3"):
+        gh.get_request(
+            "lab3", True, cache_dir=str(tmp_path), offline=True,
+            endpoint=server.endpoint, **CONFIGS
+        )
+
+
+def test_fetch_course_streams_and_processes(server):
+    """Test that the asyncio pipeline fetches, parses and processes."""
+    pytest.importorskip("aiohttp")
+    server.delay = 0.3
+    assignments = [f"lab{number}" for number in range(4)]
+
+    def process(report):
+        return {**report, "processed": True}
+
+    start = time.perf_counter()
+    output = gh.fetch_course(
+        assignments, True, endpoint=server.endpoint, process=process,
+        **CONFIGS
+    )
+    elapsed = time.perf_counter() - start
+    assert [reports[0]["assignment"] for reports in output] == assignments
+    assert output[0][0]["header"] == "text "
+    assert output[0][0]["processed"]
+    assert server.requests[0]["x-api-key"] == "api-key"
+    assert elapsed < 4 * server.delay
+
+
+def test_fetch_course_retries_failures(server):
+    """Test that the asyncio client retries server errors."""
+    pytest.importorskip("aiohttp")
+    server.failures = [503]
+    output = gh.fetch_course(
+        ["lab1"], True, endpoint=server.endpoint, **CONFIGS)
+    assert output[0][0]["assignment"] == "lab1"
+    assert len(server.requests) == 2
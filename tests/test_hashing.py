@@ -0,0 +1,56 @@
+"""Test module for hashing.py."""
+from collections import Counter
+
+import numpy as np
+import pytest
+import src.hashing as hs
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+DOCUMENTS = [
+    ["test", "code", "test", "review"],
+    ["code", "merge", "code"],
+    [],
+    ["review", "test", "branch"],
+]
+
+
+def test_chunks():
+    """Test that a generator is cut in lists of a size."""
+    assert list(hs.chunks(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(hs.chunks([], 2)) == []
+
+
+def test_frequency_matches_counter():
+    """Test that the stream counts are the ones of Counter."""
+    stats = hs.HashingStats().fit(iter(DOCUMENTS), chunk_size=3)
+    tokens = [token for document in DOCUMENTS for token in document]
+    assert stats.documents == 4
+    assert dict(stats.most_common()) == Counter(tokens)
+    assert stats.document_frequency[stats.feature("merge")] == 1
+    assert stats.document_frequency[stats.feature("test")] == 2
+
+
+def test_collisions_share_a_feature():
+    """Test that colliding tokens are counted and named together."""
+    stats = hs.HashingStats(n_features=1).fit(DOCUMENTS)
+    assert stats.most_common() == [("test/code/review", 10)]
+    assert stats.term_counts.nbytes == 8
+
+
+def test_tfidf_matches_sklearn():
+    """Test the idf and normalized tfidf against TfidfVectorizer."""
+    stats = hs.HashingStats().fit(DOCUMENTS)
+    vectorizer = TfidfVectorizer(analyzer=lambda tokens: tokens)
+    expected = vectorizer.fit_transform(DOCUMENTS).toarray()
+    # scikit-learn 0.24 only has get_feature_names, 1.2 only the new name
+    get_feature_names = (getattr(vectorizer, "get_feature_names_out", None)
+                         or vectorizer.get_feature_names)
+    feature_names = list(get_feature_names())
+    columns = [stats.feature(token) for token in feature_names]
+    matrix = stats.tfidf(DOCUMENTS)
+    assert matrix.shape == (4, hs.N_FEATURES)
+    assert np.allclose(matrix[:, columns].toarray(), expected)
+    assert matrix.nnz == np.count_nonzero(expected)
+    assert stats.top_tfidf(1)[0] == (
+        "code", pytest.approx(3 * vectorizer.idf_[
+            feature_names.index("code")]))
@@ -0,0 +1,86 @@
+"""Test module for jobs.py."""
+import threading
+
+import pytest
+import src.jobs as jb
+
+
+def blocking_job(started, release, results=None):
+    """Job that reports progress until it is released."""
+    def run(job):
+        job.report(0.5, "halfway")
+        started.set()
+        while not release.wait(0.01):
+            job.check()
+        if results is not None:
+            results.append(job.key)
+        return job.key
+    return run
+
+
+def test_identical_jobs_run_once():
+    """Test that identical in-flight jobs are shared by their waiters."""
+    runner = jb.JobRunner()
+    started, release = threading.Event(), threading.Event()
+    results = []
+    first = runner.submit("topics", blocking_job(started, release, results),
+                          waiter="session 1")
+    started.wait(1)
+    second = runner.submit("topics", blocking_job(started, release, results),
+                           waiter="session 2")
+    assert first is second
+    assert first.progress == 0.5
+    assert first.message == "halfway"
+    release.set()
+    assert first.result(1) == "topics"
+    assert results == ["topics"]
+    assert first.progress == 1.0
+    # the finished job is kept until its waiters are released
+    assert runner.submit("topics", lambda job: None, "session 2") is first
+    runner.release("session 1")
+    runner.release("session 2")
+    assert runner.submit("topics", lambda job: "again").result(1) == "again"
+
+
+def test_stale_job_is_cancelled():
+    """Test that a job nobody waits on anymore is cancelled."""
+    runner = jb.JobRunner()
+    started, release = threading.Event(), threading.Event()
+    stale = runner.submit(
+        ("topics", 5), blocking_job(started, release), waiter="session")
+    started.wait(1)
+    fresh = runner.submit(("topics", 6), lambda job: 6, waiter="session")
+    assert fresh.result(1) == 6
+    with pytest.raises(jb.JobCancelled):
+        stale.result(1)
+    assert stale.cancelled
+    assert runner.running() == 0
+
+
+def test_shared_job_survives_one_waiter_leaving():
+    """Test that a job keeps running while another session waits on it."""
+    runner = jb.JobRunner()
+    started, release = threading.Event(), threading.Event()
+    shared = runner.submit(
+        "summary", blocking_job(started, release), waiter="session 1")
+    runner.submit("summary", blocking_job(started, release), "session 2")
+    started.wait(1)
+    runner.submit("topics", lambda job: None, waiter="session 1")
+    assert not shared.cancelled
+    release.set()
+    assert shared.result(1) == "summary"
+
+
+def test_failed_job_is_submitted_again():
+    """Test that a failed job is not reused."""
+    runner = jb.JobRunner()
+
+    def fail(job):
+        raise ValueError(f"{job.key} failed")
+
+    failed = runner.submit("similarity", fail, waiter="session")
+    with pytest.raises(ValueError):
+        failed.result(1)
+    retried = runner.submit("similarity", lambda job: "ok", waiter="session")
+    assert retried is not failed
+    assert retried.result(1) == "ok"
@@ -1,5 +1,10 @@
 """Test cases for json util."""
 
+import io
+import json
+
+import pandas as pd
+import pytest
 import src.json_util as js
 
 
@@ -48,3 +53,83 @@ Hello World.""",
     assert "uuidid" not in clean_json_lst[0].keys()
     assert "header1" in clean_json_lst[0].keys()
     assert "reflection by" in clean_json_lst[0].keys()
+
+
+REFLECTION = "# Reflection by\nuser {}\n## Header1\nHello World."
+
+
+def make_report(user):
+    """Make a raw report of a user."""
+    return {
+        "assignment": "java-assignment",
+        "reflection": REFLECTION.format(user),
+        "report": "A report" * 100,
+        "userId": f"user{user}",
+    }
+
+
+def test_iter_json_values_streams_arrays_and_ndjson():
+    """Test that json values are decoded across small chunks."""
+    reports = [make_report(user) for user in range(20)]
+    array_text = json.dumps(reports, indent=4)
+    output = list(js.iter_json_values(io.StringIO(array_text), chunk_size=7))
+    assert output == reports
+    ndjson_text = "\n".join(json.dumps(report) for report in reports)
+    output = list(js.iter_json_values(io.StringIO(ndjson_text), 5))
+    assert output == reports
+    output = list(js.iter_json_values(io.StringIO("[1, 22, 333]"), 1))
+    assert output == [1, 22, 333]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64])
+def test_iter_json_values_keeps_nested_arrays(chunk_size):
+    """Test that only the top level arrays are split into their values."""
+    text = '[[1, 2], [3]] {"a": "x\\\\\\"]}", "b": [[]]} "end" true'
+    output = list(js.iter_json_values(io.StringIO(text), chunk_size))
+    assert output == [[1, 2], [3], {"a": 'x\\"]}', "b": [[]]}, "end", True]
+
+
+@pytest.mark.parametrize(
+    "text", [']]{"a": 1}', '{"a": 1}]', "1, 2", "[1, 2", '{"a": [1}'])
+def test_iter_json_values_rejects_stray_brackets(text):
+    """Test that malformed streams raise instead of being skipped."""
+    with pytest.raises(ValueError):
+        list(js.iter_json_values(io.StringIO(text), 2))
+
+
+@pytest.mark.parametrize(
+    "text", ["[1,,2]", "[1 2]", "[1,]", "[,1]", '[{"a": 1} {"b": 2}]'])
+def test_iter_json_values_rejects_missing_separators(text):
+    """Test that array elements need exactly one separator, like json."""
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(text)
+    for chunk_size in (1, 64):
+        with pytest.raises(json.JSONDecodeError):
+            list(js.iter_json_values(io.StringIO(text), chunk_size))
+    assert list(js.iter_json_values(io.StringIO("[] [ ] [1]"), 1)) == [1]
+
+
+def test_stream_reports(tmp_path):
+    """Test that reports are streamed from json and ndjson files."""
+    directory = tmp_path / "sub"
+    directory.mkdir()
+    reports = [make_report(user) for user in range(6)]
+    (directory / "a.json").write_text(json.dumps(reports[0]))
+    (directory / "b.json").write_text(json.dumps(reports[1:3]))
+    (directory / "c.ndjson").write_text(
+        "\n".join(json.dumps(report) for report in reports[3:]) + "\n"
+    )
+    (directory / "notes.md").write_text("# notes")
+    assert not js.is_report_path(directory)
+    (directory / "notes.md").unlink()
+    assert js.is_report_path(directory)
+    assert list(js.iter_report_files(directory)) == reports
+    output = js.stream_reports(directory)
+    assert not isinstance(output, list)
+    assert list(output) == js.clean_report(reports)
+    assert list(js.stream_reports(directory, fast_json=False)) == \
+        js.clean_report(reports)
+    frame = js.reports_frame(js.stream_reports(directory), chunk_size=4)
+    pd.testing.assert_frame_equal(
+        frame, pd.DataFrame(js.clean_report(reports)))
+    assert js.reports_frame(iter([])).empty
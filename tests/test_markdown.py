@@ -1,8 +1,11 @@
 """Test module for markdown.py."""
 import pytest
 import src.markdown as md
+import glob
 import io
 import os
+import tarfile
+import zipfile
 
 
 def test_merge_dict():
@@ -147,3 +150,231 @@ def test_import_uploaded_files():
     json_lst = []
     json_lst.append(md.import_uploaded_files(uploaded_files))
     assert json_lst is not []
+
+
+SAMPLE_REFLECTIONS = sorted(
+    glob.glob("resources/sample_md_reflections/**/*.md", recursive=True)
+)
+
+
+@pytest.mark.parametrize(
+    "path", ["resources/reflection_template.md"] + SAMPLE_REFLECTIONS
+)
+@pytest.mark.parametrize("is_clean", [True, False])
+def test_md_scanner_conforms_to_md_parser(path, is_clean):
+    """Test that the line scanner produces the same dict as md parser."""
+    input_md = md.read_file(path)
+    expected = md.md_parser(input_md, is_clean)
+    output = md.md_scanner(input_md, is_clean)
+    assert expected == output
+
+
+@pytest.mark.parametrize(
+    "input_text",
+    [
+        "# heading\n```\nregular code block\n```",
+        "# heading\n```\ntype\nblock1\n```\ntext\n```\ntype\nblock2\n```",
+        "# heading\ntext with\n```multiple line\nfenced code block\n```",
+        "# heading\n[linkname](url)![]()",
+        "# heading\n![imgname](path)",
+        "# heading *em*\ntext with `code`, **strong** and _under_score_",
+        "# heading\n> quote\n\n* item1\n* item2\n\n    indented code",
+        "# heading\n<div>\nhtml\n</div>\n\n<http://url.com> &amp; [ref]\n\n"
+        "[ref]: /url",
+        "Setext heading\n===\ntext  \nhard break\\\nend ##",
+    ],
+)
+@pytest.mark.parametrize("is_clean", [True, False])
+def test_md_scanner_conforms_on_markdown_syntax(input_text, is_clean):
+    """Test that the line scanner handles markdown syntax like md parser."""
+    expected = md.md_parser(input_text, is_clean)
+    output = md.md_scanner(input_text, is_clean)
+    assert expected == output
+
+
+def test_collect_md_fast(tmp_path):
+    """Test that the fast md pipeline matches the commonmark one."""
+    directory = tmp_path / "sub"
+    directory.mkdir()
+    p_1 = directory / "hello.md"
+    p_2 = directory / "world.md"
+    p_1.write_text("# Reflection by\nuser one\n## header1\n`code` text\n")
+    p_2.write_text("# Reflection by\nuser two\n## header1\n*more* text\n")
+    expected = md.collect_md(directory)
+    output = md.collect_md(directory, fast=True)
+    assert expected == output
+
+
+def test_collect_md_incremental(tmp_path, monkeypatch):
+    """Test that incremental collection only parses new or changed files."""
+    monkeypatch.setattr(md.cts, "CACHE_DIR", str(tmp_path / "cache"))
+    directory = tmp_path / "sub"
+    directory.mkdir()
+    p_1 = directory / "hello.md"
+    p_2 = directory / "world.md"
+    p_1.write_text("# Reflection by\nuser one\n## header1\nHello.")
+    p_2.write_text("# Reflection by\nuser two\n## header1\nWorld.")
+    expected = md.collect_md(directory)
+    assert expected == md.collect_md_incremental(directory)
+    # the manifest is kept in the cache, not with the submissions
+    assert os.path.exists(md.default_manifest_path(directory))
+    assert sorted(os.listdir(directory)) == ["hello.md", "world.md"]
+    parsed = []
+    md_parser = md.md_parser
+
+    def counting_parser(input_md, is_clean=True):
+        parsed.append(input_md)
+        return md_parser(input_md, is_clean)
+
+    monkeypatch.setattr(md, "md_parser", counting_parser)
+    # unchanged directory reuses every parsed file
+    assert expected == md.collect_md_incremental(directory)
+    assert not parsed
+    # a late submission is the only parsed file
+    p_3 = directory / "late.md"
+    p_3.write_text("# Reflection by\nuser three\n## header1\nLate.")
+    output = md.collect_md_incremental(directory)
+    assert len(parsed) == 1
+    assert "user three " in output["reflection by"]
+    # deleted files are dropped
+    p_1.unlink()
+    output = md.collect_md_incremental(directory)
+    assert "user one " not in output["reflection by"]
+    assert len(output["reflection by"]) == 2
+    assert len(parsed) == 1
+
+
+def test_update_manifest_reuses_unchanged_content(tmp_path):
+    """Test that a touched file with the same content keeps its entry."""
+    directory = tmp_path / "sub"
+    directory.mkdir()
+    p_1 = directory / "hello.md"
+    p_1.write_text("# header1\nHello.")
+    manifest, changed = md.update_manifest(directory, {})
+    assert changed
+    os.utime(p_1, ns=(0, 0))
+    manifest, changed = md.update_manifest(directory, manifest)
+    assert changed
+    assert manifest["files"]["hello.md"]["mtime_ns"] == 0
+    assert manifest["files"]["hello.md"]["md_dict"] == {"header1": "Hello. "}
+    manifest, changed = md.update_manifest(directory, manifest)
+    assert not changed
+
+
+def test_update_manifest_records_the_parser(tmp_path, monkeypatch):
+    """Test that the files of the other parser are parsed again."""
+    (tmp_path / "hello.md").write_text("# header1\nHello.")
+    manifest, _ = md.update_manifest(tmp_path, {})
+    assert not manifest["fast"]
+    parsed = []
+    md_scanner = md.md_scanner
+
+    def counting_scanner(input_md, is_clean=True):
+        parsed.append(input_md)
+        return md_scanner(input_md, is_clean)
+
+    monkeypatch.setattr(md, "md_scanner", counting_scanner)
+    manifest, changed = md.update_manifest(tmp_path, manifest, fast=True)
+    assert changed and manifest["fast"]
+    assert len(parsed) == 1
+    manifest, changed = md.update_manifest(tmp_path, manifest, fast=True)
+    assert not changed and len(parsed) == 1
+
+
+@pytest.mark.parametrize("archive_name", ["reports.zip", "reports.tar.gz"])
+def test_collect_md_archive(tmp_path, archive_name):
+    """Test that md files in an archive are collected like a directory."""
+    directory = tmp_path / "sub"
+    directory.mkdir()
+    p_1 = directory / "hello.md"
+    p_2 = directory / "world.txt"
+    p_1.write_text("# Reflection by\nuser one\n## header1\nHello.")
+    p_2.write_text("# Reflection by\nuser two\n## header1\nWorld.")
+    (directory / "notes.json").write_text("{}")
+    archive_path = tmp_path / archive_name
+    if archive_name.endswith(".zip"):
+        with zipfile.ZipFile(archive_path, "w") as archive:
+            for path in sorted(directory.iterdir()):
+                archive.write(path, f"lab1/{path.name}")
+            archive.writestr("__MACOSX/lab1/._hello.md", "binary")
+    else:
+        with tarfile.open(archive_path, "w:gz") as archive:
+            for path in sorted(directory.iterdir()):
+                archive.add(path, f"lab1/{path.name}")
+    assert md.is_archive(archive_path)
+    assert not md.is_archive(directory)
+    names = [name for name, _ in md.iter_archive(archive_path)]
+    assert names == ["lab1/hello.md", "lab1/world.txt"]
+    expected = {
+        "reflection by": ["user one ", "user two "],
+        "header1": ["Hello. ", "World. "],
+    }
+    assert expected == md.collect_md_archive(archive_path)
+
+
+def test_scan_md_files_recursive_with_globs(tmp_path):
+    """Test that scanning walks the tree and applies the glob filters."""
+    for folder in ["lab1", "lab2", "lab2/drafts", ".hidden"]:
+        (tmp_path / folder).mkdir()
+    for path in [
+        "top.md", "lab1/a.md", "lab1/b.txt", "lab1/c.json",
+        "lab2/a.md", "lab2/drafts/a.md", ".hidden/a.md",
+    ]:
+        (tmp_path / path).write_text("# header\ntext")
+    relative = [
+        os.path.relpath(entry.path, tmp_path).replace(os.path.sep, "/")
+        for entry in md.scan_md_files(tmp_path)
+    ]
+    assert relative == [
+        "top.md", "lab1/a.md", "lab1/b.txt", "lab2/a.md", "lab2/drafts/a.md"
+    ]
+    filtered = [
+        os.path.relpath(entry.path, tmp_path).replace(os.path.sep, "/")
+        for entry in md.scan_md_files(
+            tmp_path, include=["lab*/*.md"], exclude=["*/drafts"])
+    ]
+    assert filtered == ["lab1/a.md", "lab2/a.md"]
+    flat = list(md.scan_md_files(tmp_path, recursive=False))
+    assert [entry.name for entry in flat] == ["top.md"]
+
+
+def test_scan_md_files_follows_symlink_loops_once(tmp_path):
+    """Test that a link to a parent directory does not recurse forever."""
+    (tmp_path / "lab1").mkdir()
+    (tmp_path / "lab1" / "a.md").write_text("# header\ntext")
+    (tmp_path / "lab1" / "up").symlink_to(tmp_path, target_is_directory=True)
+    (tmp_path / "linked").symlink_to(
+        tmp_path / "lab1", target_is_directory=True)
+    names = [
+        os.path.relpath(entry.path, tmp_path).replace(os.path.sep, "/")
+        for entry in md.scan_md_files(tmp_path)
+    ]
+    assert names == ["lab1/a.md"]
+
+
+def test_collect_md_tree(tmp_path, monkeypatch):
+    """Test that a course tree is collected to one dict per assignment."""
+    monkeypatch.setattr(md.cts, "CACHE_DIR", str(tmp_path / "cache"))
+    course = tmp_path / "course"
+    for folder in ["lab1", "lab2"]:
+        (course / folder).mkdir(parents=True)
+        for user in ["one", "two"]:
+            (course / folder / f"{user}.md").write_text(
+                f"# Reflection by\nuser {user}\n## {folder}\ntext"
+            )
+    output = md.collect_md_tree(course, assignment_from_dir=True)
+    assert output == [
+        {
+            "assignment": ["lab1", "lab1"],
+            "reflection by": ["user one ", "user two "],
+            "lab1": ["text ", "text "],
+        },
+        {
+            "assignment": ["lab2", "lab2"],
+            "reflection by": ["user one ", "user two "],
+            "lab2": ["text ", "text "],
+        },
+    ]
+    assert md.collect_md_tree(course / "lab1") == [
+        md.collect_md(course / "lab1")
+    ]
@@ -0,0 +1,178 @@
+"""Test module for model_server.py."""
+import os
+import socket
+import stat
+import threading
+
+import pytest
+import src.model_server as ms
+
+
+class FakeToken:
+    """Token with the attributes read by the model service."""
+
+    def __init__(self, text):
+        """Lemma is the lowercase text, short words are stop words."""
+        self.text = text
+        self.lemma_ = text.lower()
+        self.is_stop = len(text) < 3
+
+
+class FakeSpan:
+    """Named entity of a fake document."""
+
+    def __init__(self, start_char, end_char, label_):
+        """Store the offsets and the label."""
+        self.start_char = start_char
+        self.end_char = end_char
+        self.label_ = label_
+
+
+class FakeVector(list):
+    """List with the tolist method of a numpy vector."""
+
+    def tolist(self):
+        """Return the plain list."""
+        return list(self)
+
+
+class FakeDoc:
+    """Document made of whitespace separated tokens."""
+
+    def __init__(self, text):
+        """Tokenize and find the capitalized words as entities."""
+        self.text = text
+        self.tokens = [FakeToken(word) for word in text.split()]
+        self.ents = []
+        start = 0
+        for word in text.split():
+            start = text.index(word, start)
+            if word[0].isupper():
+                self.ents.append(FakeSpan(start, start + len(word), "ORG"))
+            start += len(word)
+        self.vector = FakeVector([float(len(self.tokens))])
+
+    def __iter__(self):
+        """Iterate over the tokens."""
+        return iter(self.tokens)
+
+    def similarity(self, other):
+        """Share of the words of both documents."""
+        words = {token.lemma_ for token in self}
+        other_words = {token.lemma_ for token in other}
+        return len(words & other_words) / len(words | other_words)
+
+
+class FakeNLP:
+    """Model that counts the documents it processes."""
+
+    def __init__(self):
+        """Start without processed documents."""
+        self.processed = 0
+
+    def pipe(self, texts, batch_size=1):  # pylint: disable=unused-argument
+        """Process the texts."""
+        for text in texts:
+            self.processed += 1
+            yield FakeDoc(text)
+
+
+@pytest.fixture(name="server")
+def fixture_server(tmp_path):
+    """Run a model server with fake models in a background thread."""
+    loaded = {}
+
+    def loader(name):
+        loaded[name] = FakeNLP()
+        return loaded[name]
+
+    address = str(tmp_path / "models.sock")
+    server = ms.create_server(
+        address, ["fake_sm"], authkey=b"secret", loader=loader)
+
+    def serve():
+        try:
+            server.serve_forever()
+        except SystemExit:
+            # raised by the manager server once it is stopped
+            pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    server.loaded = loaded
+    server.address = address
+    yield server
+    server.stop_event.set()
+
+
+def test_remote_model_serves_batched_requests(server):
+    """Test lemma, entity and vector requests over the socket."""
+    model = ms.connect(server.address, "fake_sm", authkey=b"secret")
+    texts = ["Gator reads the Reflections", "an essay"]
+    assert model.lemmas(texts) == [
+        [("gator", False), ("reads", False), ("the", False),
+         ("reflections", False)],
+        [("an", True), ("essay", False)],
+    ]
+    assert model.entities(texts) == [[(0, 5, "ORG"), (16, 27, "ORG")], []]
+    assert model.vectors(texts) == [[4.0], [2.0]]
+    assert server.loaded["fake_sm"].processed == 6
+
+
+def test_remote_model_loads_each_model_once(server):
+    """Test that models are loaded once and shared by all the clients."""
+    first = ms.connect(server.address, "fake_md", authkey=b"secret")
+    second = ms.connect(server.address, "fake_md", authkey=b"secret")
+    pairs = [("one two", "one three"), ("one two", "one two")]
+    assert first.similarities(pairs) == [1 / 3, 1.0]
+    assert second.similarities(pairs[:1]) == [1 / 3]
+    assert sorted(server.loaded) == ["fake_md", "fake_sm"]
+    # the shared texts of the pairs are processed only once per request
+    assert server.loaded["fake_md"].processed == 4
+    assert sorted(first.service.models()) == ["fake_md", "fake_sm"]
+
+
+def test_remote_model_without_server(monkeypatch, tmp_path):
+    """Test that the models are local without a reachable server."""
+    monkeypatch.delenv(ms.ADDRESS_ENV, raising=False)
+    assert ms.remote_model() is None
+    monkeypatch.setenv(ms.ADDRESS_ENV, str(tmp_path / "missing.sock"))
+    assert ms.remote_model("fake_sm") is None
+
+
+def test_socket_is_private(server):
+    """Test that only the owner can use the socket of the server."""
+    assert stat.S_IMODE(os.stat(server.address).st_mode) == 0o600
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    """Test that only a socket without a server is removed."""
+    address = str(tmp_path / "models.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(address)
+    listener.listen(1)
+    with pytest.raises(FileExistsError):
+        ms.remove_stale_socket(address)
+    listener.close()
+    ms.remove_stale_socket(address)
+    assert not os.path.exists(address)
+    other = tmp_path / "notes.txt"
+    other.write_text("not a socket")
+    with pytest.raises(FileExistsError):
+        ms.remove_stale_socket(str(other))
+    assert other.exists()
+
+
+def test_generated_authkey(monkeypatch, tmp_path):
+    """Test that the server writes a random key readable by its owner."""
+    monkeypatch.delenv(ms.AUTHKEY_ENV, raising=False)
+    monkeypatch.setattr(ms, "RUNTIME_DIR", str(tmp_path / "run"))
+    monkeypatch.setattr(ms, "KEY_FILE", str(tmp_path / "run" / "key"))
+    assert ms.get_authkey() is None
+    key = ms.get_authkey(create=True)
+    assert len(key) == 64
+    assert ms.get_authkey() == key
+    assert stat.S_IMODE(os.stat(ms.KEY_FILE).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(ms.RUNTIME_DIR).st_mode) == 0o700
+    monkeypatch.setenv(ms.AUTHKEY_ENV, "shared")
+    assert ms.get_authkey() == b"shared"
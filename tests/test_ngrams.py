@@ -0,0 +1,96 @@
+"""Test module for ngrams.py."""
+import math
+from collections import Counter
+
+import pytest
+import src.ngrams as ng
+import src.vocabulary as vb
+
+DOCUMENTS = [
+    ["git", "merge", "conflict", "git", "merge"],
+    ["git", "merge"],
+    ["merge", "conflict", "is", "hard"],
+    ["pull", "request"],
+    [],
+]
+
+
+def make_counts(min_count=ng.MIN_COUNT):
+    """N-gram counts of the documents with their own vocabulary."""
+    vocabulary = vb.Vocabulary()
+    return ng.NgramCounts(
+        vocabulary.encode_many(DOCUMENTS), min_count=min_count,
+        vocabulary=vocabulary,
+    )
+
+
+def test_ngram_frequency_matches_counter():
+    """Test that unpruned n-gram counts are the ones of Counter."""
+    counts = make_counts(min_count=1)
+    for order in (1, 2, 3):
+        expected = Counter(
+            " ".join(document[start:start + order])
+            for document in DOCUMENTS
+            for start in range(len(document) - order + 1)
+        )
+        assert dict(counts.top(range(len(DOCUMENTS)), order, 100)) == \
+            expected
+    assert counts.top([3], 2) == [("pull request", 1)]
+    assert counts.top([4], 2) == []
+
+
+def test_min_count_prunes_rare_ngrams():
+    """Test that rare n-grams of several words are pruned."""
+    counts = make_counts()
+    rows = range(len(DOCUMENTS))
+    assert counts.top(rows, 2) == [("git merge", 3), ("merge conflict", 2)]
+    assert counts.top(rows, 3) == []
+    assert len(counts.top(rows, 1, 100)) == 7
+    assert len(counts) == len(DOCUMENTS)
+
+
+def test_collocation_scores():
+    """Test pmi and likelihood ratio against their definitions."""
+    counts = make_counts()
+    rows = range(len(DOCUMENTS))
+    # 13 words, "git" 3 times, "merge" 4 times, "git merge" 3 times
+    pmi = dict(counts.top(rows, 2, measure="pmi"))
+    assert pmi["git merge"] == pytest.approx(math.log2(3 * 13 / (3 * 4)))
+    table = [3, 0, 1, 9]
+    expected = [3 * 4 / 13, 3 * 9 / 13, 10 * 4 / 13, 10 * 9 / 13]
+    likelihood = dict(counts.top(rows, 2, measure="likelihood"))
+    assert likelihood["git merge"] == pytest.approx(2 * sum(
+        observed * math.log(observed / mean)
+        for observed, mean in zip(table, expected) if observed
+    ))
+    assert list(likelihood) == ["git merge", "merge conflict"]
+    with pytest.raises(ValueError):
+        counts.top(rows, 2, measure="chi2")
+
+
+def test_phrase_df():
+    """Test the dataframe of the phrases of groups of rows."""
+    phrase_df = ng.phrase_df(
+        make_counts(), {"lab1": [0, 1], "lab2": [2, 3]}, "assignments", 2)
+    assert list(phrase_df.columns) == ["word", "freq", "assignments"]
+    assert phrase_df.values.tolist() == [
+        ["git merge", 3, "lab1"],
+        ["merge conflict", 1, "lab1"],
+        ["merge conflict", 1, "lab2"],
+    ]
+    assert ng.phrase_df(make_counts(), {}, "question", 2).empty
+
+
+def test_keys_beyond_int64(monkeypatch):
+    """Test that n-grams too long for int64 keys are counted as well."""
+    expected = make_counts(min_count=1)
+    # 7 distinct words, the keys of the 3-grams do not fit
+    monkeypatch.setattr(ng, "KEY_LIMIT", 7 ** 3)
+    counts = make_counts(min_count=1)
+    assert counts.keys[2].dtype == "int64"
+    assert counts.keys[3].dtype == object
+    rows = range(len(DOCUMENTS))
+    for measure in ng.MEASURES:
+        for order in (2, 3):
+            assert counts.top(rows, order, 100, measure) == \
+                expected.top(rows, order, 100, measure)
@@ -0,0 +1,95 @@
+"""Test module for profiling.py."""
+import json
+
+import pytest
+import src.profiling as pr
+
+
+@pr.stage("test.lengths", documents=pr.first_count)
+def lengths(texts):
+    """Length of every text."""
+    return [len(text) for text in texts]
+
+
+@pr.stage("test.split", result_documents=len)
+def split(text):
+    """Words of a text, which fail on an empty text."""
+    if not text:
+        raise ValueError("empty text")
+    return text.split()
+
+
+@pr.stage("test.first", documents=lambda texts: len(texts[0]))
+def first(texts):
+    """First text, which fails without texts, like its counter."""
+    if not texts:
+        raise ValueError("no texts")
+    return texts[0]
+
+
+@pytest.fixture(name="profile")
+def fixture_profile():
+    """Shared profile, enabled and emptied for a test."""
+    pr.PROFILE.reset()
+    yield pr.PROFILE
+    pr.PROFILE.disable()
+    pr.PROFILE.reset()
+
+
+def test_disabled_profile_records_nothing(profile):
+    """Test that stages run untimed until the profile is enabled."""
+    assert lengths(["ab", "c"]) == [2, 1]
+    assert profile.summary() == []
+
+
+def test_stage_calls_and_documents(profile):
+    """Test the calls, documents and errors of the stages."""
+    profile.enable()
+    lengths(["ab", "c"])
+    lengths(iter(["ab", "c", "d"]))
+    split("git merge branch")
+    with pytest.raises(ValueError):
+        split("")
+    totals = {row["stage"]: row for row in profile.summary()}
+    assert totals["test.lengths"]["calls"] == 2
+    # the documents of an iterator are not counted
+    assert totals["test.lengths"]["documents"] == 2
+    assert totals["test.split"]["calls"] == 2
+    assert totals["test.split"]["documents"] == 3
+    assert "test.split" in profile.format()
+
+
+def test_failed_call_keeps_its_error(profile):
+    """Test that the documents of a failed call are not counted."""
+    profile.enable()
+    # the counter raises IndexError on the arguments
+    with pytest.raises(ValueError, match="no texts"):
+        first([])
+    assert first(["abc"]) == "abc"
+    totals = {row["stage"]: row for row in profile.summary()}
+    assert totals["test.first"]["calls"] == 2
+    assert totals["test.first"]["documents"] == 3
+
+
+def test_log_file(profile, tmp_path):
+    """Test that every call is logged as a line of JSON."""
+    log_path = tmp_path / "profile.jsonl"
+    profile.enable(str(log_path))
+    lengths(["ab"])
+    split("a b")
+    profile.disable()
+    lines = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [(line["stage"], line["documents"]) for line in lines] == [
+        ("test.lengths", 1), ("test.split", 2)]
+    assert all(line["seconds"] >= 0 for line in lines)
+
+
+def test_enable_from_env(profile, monkeypatch):
+    """Test that the profile is enabled by the environment."""
+    monkeypatch.delenv(pr.LOG_ENV, raising=False)
+    monkeypatch.setenv(pr.PROFILE_ENV, "0")
+    pr.enable_from_env()
+    assert not profile.enabled
+    monkeypatch.setenv(pr.PROFILE_ENV, "1")
+    pr.enable_from_env()
+    assert profile.enabled
@@ -0,0 +1,116 @@
+"""Test module for search.py."""
+import pandas as pd
+import src.constants as cts
+import src.search as sr
+import src.vocabulary as vb
+
+
+STOP_WORDS = {"i", "a", "and", "with", "was"}
+LEMMAS = {"learned": "learn", "merged": "merge"}
+
+
+def lemmatize(words):
+    """Lemmas without the stop words, a stand-in for the spacy tokenizer."""
+    lemmatize.calls += len(words)
+    return [
+        "" if word in STOP_WORDS else LEMMAS.get(word, word) for word in words
+    ]
+
+
+lemmatize.calls = 0
+
+
+def make_corpus():
+    """Raw and processed corpus of two assignments."""
+    raw_df = pd.DataFrame({
+        "assignment": ["lab1", "lab1", "lab2"],
+        "reflection by": ["a", "b", "a"],
+        "learned": [
+            "I learned Git, branch and merged!",
+            "Testing with pytest.",
+            None,
+        ],
+        "challenge": [
+            "A merge conflict (2 files)",
+            None,
+            "git rebase was hard",
+        ],
+    })
+    main_df = raw_df.fillna("")
+    main_df[cts.TOKEN] = [
+        ["learn", "git", "branch", "merge", "merge", "conflict", "files"],
+        ["testing", "pytest"],
+        ["git", "rebase"],
+    ]
+    vb.add_token_ids(main_df)
+    return raw_df, main_df
+
+
+def test_search_postings_and_snippets():
+    """Test the hits and keyword-in-context snippets of terms."""
+    index = sr.InvertedIndex()
+    raw_df, main_df = make_corpus()
+    assert index.build(raw_df, main_df, "assignment", "reflection by",
+                       lemmatize) == 3
+    assert len(index) == 4
+    hits = index.search(["merge"])
+    assert [(hit["student"], hit["question"]) for hit in hits] == [
+        ("a", "learned"), ("a", "challenge")]
+    # the snippets are cut from the text as it was written
+    assert hits[0]["snippets"] == [
+        ("I learned Git, branch and", "merged", "")]
+    assert hits[1]["snippets"] == [("A", "merge", "conflict (2 files")]
+    assert index.search(["merge"], window=1)[0]["snippets"] == [
+        ("and", "merged", "")]
+    assert len(index.search(["git"])) == 2
+    assert len(index.search(["git"], assignments=["lab2"])) == 1
+    assert index.search(["git", "merge"])[0]["question"] == "learned"
+    # "hard" is not one of the tokens of the reflection
+    assert index.search(["hard"]) == []
+    assert index.search(["unknown"]) == []
+    assert index.students("git") == [("lab1", "a"), ("lab2", "a")]
+
+
+def test_incremental_update_and_persistence(tmp_path):
+    """Test that only new or changed reflections are indexed again."""
+    path = str(tmp_path / "index.json")
+    raw_df, main_df = make_corpus()
+    lemmatize.calls = 0
+    index = sr.update_index(raw_df, main_df, "assignment", "reflection by",
+                            path, lemmatize)
+    assert lemmatize.calls == 16
+    loaded = sr.load_index(path)
+    assert loaded.lemmas == index.lemmas
+    assert loaded.reflections == index.reflections
+    assert len(loaded) == 0
+    # an unchanged corpus is searched from the saved offsets and terms
+    assert loaded.build(raw_df, main_df, "assignment", "reflection by",
+                        lemmatize) == 0
+    assert loaded.search(["merge"]) == index.search(["merge"])
+    raw_df.loc[1, "learned"] = "Testing with hypothesis"
+    main_df.at[1, cts.TOKEN] = ["testing", "hypothesis"]
+    main_df.at[1, cts.TOKEN_IDS] = vb.VOCABULARY.encode(
+        ["testing", "hypothesis"])
+    raw_df, main_df = raw_df.drop(index=2), main_df.drop(index=2)
+    before = dict(loaded.reflections)
+    loaded = sr.update_index(raw_df, main_df, "assignment", "reflection by",
+                             path, lemmatize)
+    assert lemmatize.calls == 17
+    # the changed reflection is indexed again, the deleted one dropped
+    assert len(loaded.reflections) == 2
+    assert len(before.keys() & loaded.reflections.keys()) == 1
+    assert loaded.search(["pytest"]) == []
+    assert loaded.search(["rebase"]) == []
+    assert loaded.search(["hypothesis"])[0]["student"] == "b"
+    assert len(loaded) == 3
+
+
+def test_index_path(tmp_path, monkeypatch):
+    """Test that indexes are kept in the cache directory."""
+    monkeypatch.chdir(tmp_path)
+    path = sr.index_path(("Path input", ("lab1",), ()))
+    assert path.startswith(sr.cts.CACHE_DIR)
+    assert path == sr.index_path(
+        ("Path input", (str(tmp_path / "lab1"),), ()))
+    aws = sr.index_path(("AWS", ("lab1",), ()))
+    assert aws.startswith(sr.cts.CACHE_DIR) and aws != path
@@ -0,0 +1,182 @@
+"""Test module for session.py."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import src.session as ss
+import src.vocabulary as vb
+
+
+def make_context():
+    """Context with a small loaded corpus."""
+    context = ss.AnalysisContext()
+    main_df = pd.DataFrame({
+        "assignment": ["lab1", "lab1", "lab2"],
+        "reflection by": ["a", "b", "a"],
+        "text": ["one", "two", "three"],
+    })
+    context.load("source", main_df, main_df)
+    context.select("assignment", "reflection by", ["lab1"])
+    return context
+
+
+def test_view_is_memoized_per_selection():
+    """Test that views are computed once for each selection."""
+    context = make_context()
+    calls = []
+
+    def compute():
+        calls.append(context.assignments)
+        return len(calls)
+
+    assert context.view("count", compute) == 1
+    assert context.view("count", compute) == 1
+    context.select("assignment", "reflection by", ["lab2"])
+    assert context.view("count", compute) == 2
+    context.select("assignment", "reflection by", ["lab1"])
+    assert context.view("count", compute) == 1
+    assert context.view("count", compute, "param") == 3
+    assert context.view("corpus", compute, selected=False) == 4
+    context.select("assignment", "reflection by", ["lab2"])
+    assert context.view("corpus", compute, selected=False) == 4
+    assert calls == [("lab1",), ("lab2",), ("lab1",), ("lab1",)]
+
+
+def test_invalidate_and_load_drop_views():
+    """Test the explicit invalidation of views."""
+    context = make_context()
+    context.view("first", lambda: 1)
+    context.view("second", lambda: 2)
+    context.invalidate("first")
+    assert context.view("first", lambda: 3) == 3
+    assert context.view("second", lambda: 4) == 2
+    assert context.is_loaded("source")
+    assert context.corpus_key == "source"
+    context.load("other", context.raw_df, context.main_df, ("other", "hash"))
+    assert len(context) == 0
+    assert context.corpus_key == ("other", "hash")
+    assert not context.is_loaded("source")
+    context.reset()
+    assert not context.is_loaded(None)
+    assert context.main_df.empty
+
+
+def test_views_share_the_corpus():
+    """Test that views are derived without copying the corpus."""
+    context = make_context()
+    main_df = context.main_df
+    selected = context.view(
+        "selected", lambda: main_df[main_df["assignment"] == "lab1"])
+    assert context.main_df is main_df
+    assert context.view("selected", lambda: None) is selected
+    assert context.assignment_string == "lab1"
+
+
+def test_least_recently_used_views_are_dropped():
+    """Test that the number of memoized views is bounded."""
+    context = ss.AnalysisContext(max_views=2)
+    context.view("first", lambda: 1)
+    context.view("second", lambda: 2)
+    context.view("first", lambda: None)
+    context.view("third", lambda: 3)
+    assert len(context) == 2
+    assert context.view("first", lambda: None) == 1
+    assert context.view("second", lambda: 5) == 5
+
+
+def test_corpus_cache_hits_and_misses():
+    """Test that a corpus is loaded once and then shared."""
+    cache = ss.CorpusCache()
+    frame = pd.DataFrame({"text": ["one", "two"]})
+    loads = []
+
+    def load():
+        loads.append(1)
+        return frame, frame
+
+    key = (("Path input", ("lab1",), ()), ss.content_hash([{"a": "b"}]))
+    assert cache.get_or_load(key, load)[0] is frame
+    assert cache.get_or_load(key, load)[0] is frame
+    assert len(loads) == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["size"] == ss.frame_size((frame, frame))
+    # nothing imported is not cached
+    assert cache.get_or_load("empty", lambda: None) is None
+    assert len(cache) == 1
+
+
+def test_corpus_cache_evicts_under_budget():
+    """Test the least recently used eviction under the memory budget."""
+    cache = ss.CorpusCache(budget=25, sizeof=len)
+    cache.put("first", "1" * 10)
+    cache.put("second", "2" * 10)
+    assert cache.get_or_load("first", lambda: None) == "1" * 10
+    cache.put("third", "3" * 10)
+    assert len(cache) == 2
+    assert cache.get_or_load("second", lambda: "reloaded") == "reloaded"
+    assert cache.stats()["evictions"] == 2
+    # a corpus larger than the budget is returned but not kept
+    assert cache.get_or_load("huge", lambda: "h" * 30) == "h" * 30
+    assert len(cache) == 2
+    stats = cache.stats()
+    assert stats["size"] <= 25
+    assert stats["evictions"] == 2
+    assert stats["misses"] == 2
+
+
+def test_corpus_cache_resets_vocabulary_over_budget(monkeypatch):
+    """Test that the vocabulary is reset with the cache over its budget."""
+    vocabulary = vb.Vocabulary()
+    monkeypatch.setattr(ss.vb, "VOCABULARY", vocabulary)
+    monkeypatch.setattr(ss.vb, "VOCABULARY_BUDGET", 2)
+    cache = ss.CorpusCache(sizeof=len)
+    cache.get_or_load("first", lambda: vocabulary.encode(["a", "b"]))
+    assert len(vocabulary) == 2 and len(cache) == 1
+    cache.get_or_load("second", lambda: vocabulary.encode(["c", "d", "e"]))
+    assert vocabulary.generation == 0 and len(cache) == 2
+    cache.get_or_load("third", lambda: vocabulary.encode(["f"]))
+    assert vocabulary.generation == 1
+    assert vocabulary.words == ["f"]
+    assert len(cache) == 1
+
+
+def test_corpus_cache_loads_once_for_concurrent_sessions():
+    """Test that concurrent sessions wait for a corpus being loaded."""
+    cache = ss.CorpusCache(sizeof=len)
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.1)
+        return "corpus"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(
+            lambda _: cache.get_or_load("course", load), range(4)))
+    assert results == ["corpus"] * 4
+    assert len(loads) == 1
+
+
+def test_content_hash_depends_on_content():
+    """Test that changed documents get another hash."""
+    first = ss.content_hash([{"assignment": "lab1", "text": "one"}])
+    same = ss.content_hash([{"text": "one", "assignment": "lab1"}])
+    other = ss.content_hash([{"assignment": "lab1", "text": "two"}])
+    assert first == same
+    assert first != other
+
+
+def test_query_selected_assignments():
+    """Test that queries use the selection and follow the columns."""
+    context = make_context()
+    assert context.query()["text"].tolist() == ["one", "two"]
+    assert context.query(students=["b"], columns=["text"]).shape == (1, 1)
+    store = context.store
+    assert context.store is store
+    context.select("reflection by", "assignment", ["a"])
+    assert context.store is not store
+    assert context.query()["text"].tolist() == ["one", "three"]
+    assert context.headings() == ["assignment", "reflection by", "text"]
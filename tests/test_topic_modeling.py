@@ -1,4 +1,5 @@
 """Test module for topic_modeling.py."""
+import pytest
 import src.topic_modeling as tm
 
 
@@ -7,3 +8,18 @@ def test_topic_modeling_produce_output():
     input_text = [["This", "is", "a", "sentence"]]
     output = tm.topic_model(input_text)
     assert output is not None
+
+
+def test_topic_model_stops_between_passes():
+    """Test that an exception of the pass callback stops the training."""
+    passes = []
+
+    def on_pass(done):
+        passes.append(done)
+        if done == 2:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        tm.topic_model(
+            [["git", "merge"], ["merge", "branch"]], on_pass=on_pass)
+    assert passes == [1, 2]
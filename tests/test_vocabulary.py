@@ -0,0 +1,98 @@
+"""Test module for vocabulary.py."""
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+import src.constants as cts
+import src.doc_similarity as ds
+import src.vocabulary as vb
+
+DOCUMENTS = [
+    ["test", "code", "test", "review"],
+    ["code", "merge", "code"],
+    [],
+    ["review", "test", "branch"],
+]
+
+
+def test_encode_and_decode():
+    """Test that tokens are interned with stable ids."""
+    vocabulary = vb.Vocabulary()
+    ids = vocabulary.encode_many(DOCUMENTS)
+    assert ids[0].dtype == np.int32
+    assert ids[0].tolist() == [0, 1, 0, 2]
+    assert ids[2].tolist() == []
+    assert len(vocabulary) == 5
+    assert vocabulary.encode(["merge", "code"]).tolist() == [3, 1]
+    assert vocabulary.decode(ids[3]) == DOCUMENTS[3]
+
+
+def test_most_common_matches_counter():
+    """Test that the frequency of ids is the one of Counter."""
+    vocabulary = vb.Vocabulary()
+    ids = vocabulary.encode_many(DOCUMENTS)
+    tokens = [token for document in DOCUMENTS for token in document]
+    for amount in (1, 3, 10):
+        assert vb.most_common(ids, amount, vocabulary) == \
+            Counter(tokens).most_common(amount)
+    assert vb.most_common([], 5, vocabulary) == []
+
+
+def test_add_token_ids():
+    """Test that the corpus keeps interned tokens and their ids."""
+    main_df = pd.DataFrame({cts.TOKEN: DOCUMENTS}, index=[3, 4, 5, 6])
+    vb.add_token_ids(main_df)
+    assert main_df[cts.TOKEN].tolist() == DOCUMENTS
+    assert main_df[cts.TOKEN][3][0] is main_df[cts.TOKEN][6][1]
+    assert [ids.tolist() for ids in vb.token_ids(main_df)] == [
+        ids.tolist() for ids in vb.VOCABULARY.encode_many(DOCUMENTS)]
+
+
+def test_reset_encodes_older_ids_again():
+    """Test that the ids of a reset vocabulary are not decoded."""
+    vocabulary = vb.Vocabulary()
+    main_df = pd.DataFrame({cts.TOKEN: DOCUMENTS})
+    vb.add_token_ids(main_df, vocabulary)
+    assert not vocabulary.trim(5)
+    assert vocabulary.trim(4)
+    assert len(vocabulary) == 0
+    vocabulary.encode(["branch"])
+    ids = vb.token_ids(main_df, vocabulary)
+    assert [vocabulary.decode(document) for document in ids] == DOCUMENTS
+    assert vocabulary.decode(ids[3]) == ["review", "test", "branch"]
+    assert ids[3][2] == 0
+    with pytest.raises(ValueError):
+        vocabulary.decode(main_df[cts.TOKEN_IDS][0], 0)
+    # the ids of a frame without a generation are not trusted
+    del main_df.attrs[vb.GENERATION]
+    vocabulary.reset()
+    assert vocabulary.decode(vb.token_ids(main_df, vocabulary)[1], 2) == \
+        DOCUMENTS[1]
+
+
+def test_local_ids_and_bag_of_words():
+    """Test the renumbered ids and the bag of words of documents."""
+    vocabulary = vb.Vocabulary()
+    vocabulary.encode(["unused"] * 3)
+    unique, local = vb.local_ids(vocabulary.encode_many(DOCUMENTS))
+    assert vocabulary.decode(unique) == [
+        "test", "code", "review", "merge", "branch"]
+    assert [ids.tolist() for ids in local] == [
+        [0, 1, 0, 2], [1, 3, 1], [], [2, 0, 4]]
+    assert vb.bag_of_words(local)[0] == [(0, 2), (1, 1), (2, 1)]
+    counts = vb.count_matrix(local, len(unique)).toarray()
+    assert counts[1].tolist() == [0, 2, 0, 1, 0]
+    assert vb.local_ids([])[1] == []
+
+
+def test_tfidf_pair_similarities_match_pairs():
+    """Test the similarities of all pairs against the pair by pair ones."""
+    _, local = vb.local_ids(vb.Vocabulary().encode_many(DOCUMENTS))
+    matrix = ds.tfidf_pair_similarities(vb.count_matrix(local, 5))
+    assert matrix[2, 0] == 0
+    for first, second in ((0, 1), (0, 3), (1, 3)):
+        expected = ds.tfidf_cosine_similarity(
+            (" ".join(DOCUMENTS[first]), " ".join(DOCUMENTS[second])))
+        assert matrix[first, second] == pytest.approx(expected)
+        assert matrix[second, first] == pytest.approx(expected)
@@ -1,15 +1,70 @@
 """CLI Entry point."""
+import re
 import sys
 
 from src import analyzer as az
+from src import batch
+from src import constants as cts
+from src import corpus_file as cf
+from src import get_handler as gh
+from src import profiling as pr
 from src import summarizer as sz
+from src import utils as ut
 from src import arguments
 
 if __name__ == "__main__":
     tm_arguments = arguments.parse(sys.argv[1:])
+    if tm_arguments.profile or tm_arguments.profile_log:
+        pr.PROFILE.enable(tm_arguments.profile_log)
     directory = tm_arguments.directory
     function = tm_arguments.function
     if function == "frequency":
-        print(az.dir_frequency(directory))
+        if tm_arguments.hashing:
+            print(az.hashed_dir_frequency(directory))
+        else:
+            print(az.dir_frequency(directory))
     elif function == "summary":
         print(sz.summarizer(directory))
+    elif function == "course":
+        # fetch, parse and tokenize all the assignments in one pipeline
+        assignments = re.split(r"[;,\s]\s*", tm_arguments.assignment)
+        configs = gh.auth_config()
+        course = gh.fetch_course(
+            assignments,
+            tm_arguments.passBuild,
+            process=az.preprocess_report,
+            **configs,
+        )
+        for assignment, reports in zip(assignments, course):
+            tokens = [
+                token for report in reports for token in report[cts.TOKEN]]
+            print(assignment, az.compute_frequency(tokens))
+    elif function in ("batch", "export"):
+        # analyze directories, or assignments from aws, for later loading
+        if directory:
+            sources = re.split(r"[;,]\s*", directory)
+            documents = batch.ingest_paths(sources)
+        else:
+            sources = re.split(r"[;,\s]\s*", tm_arguments.assignment)
+            documents = batch.ingest_aws(sources, tm_arguments.passBuild)
+    if function == "export":
+        # preprocess once into a corpus file the web app memory-maps
+        raw_df, main_df = ut.make_corpus(documents)
+        path = cf.write_corpus(raw_df, main_df, tm_arguments.output)
+        print(f"{len(main_df)} documents exported to {path}")
+    elif function == "batch":
+        manifest = batch.run_batch(
+            documents,
+            tm_arguments.output,
+            re.split(r"[;,\s]\s*", tm_arguments.analyses),
+            jobs=tm_arguments.jobs,
+            file_format=tm_arguments.format,
+            sources=sources,
+        )
+        for result in manifest["assignments"]:
+            print(
+                f"{result['name']}: {result['documents']} documents "
+                f"in {result['seconds']}s"
+            )
+    if tm_arguments.profile:
+        print(pr.PROFILE.format(), file=sys.stderr)